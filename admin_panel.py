@@ -1,17 +1,121 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import asyncio
 import bcrypt
-from sqlalchemy import select, delete
+import queue
+import threading
+from concurrent.futures import Future
+from sqlalchemy import select, delete, func, or_, literal_column, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.config import async_session_factory, init_db
+from app.core.config import async_session_factory, init_db, cleanup_db
+from app.core.passwords import hash_password
 from app.models.models import User, Shop, users_shops
+from app.db.auth_version import bump_auth_version, bump_shop_users_auth_version
+from app.db.bulk_import import IMPORT_KINDS, ImportReport, import_csv, write_errors
 import sys
 from functools import partial
+from typing import Any, Callable, Coroutine, Iterable, List, Optional
 
 
-class LoginWindow:
+def check_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode(), hashed.encode())
+
+
+async def run_blocking(func: Callable, *args) -> Any:
+    """bcrypt и другая тяжелая синхронная работа - в пуле потоков, чтобы цикл продолжал обслуживать запросы"""
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+
+class AsyncWorker:
+    """Event loop в фоновом потоке для всей работы с базой из Tk.
+
+    submit() ставит корутину в цикл и сразу возвращает Future. Результаты
+    складываются в очередь, которую Tk-поток разбирает через root.after:
+    tkinter нельзя трогать из других потоков.
+    """
+    POLL_MS = 20
+
     def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._results: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._root: Optional[tk.Tk] = None
+        self._thread = threading.Thread(target=self._run_loop, name='admin-db-loop', daemon=True)
+        self._thread.start()
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def attach(self, root: tk.Tk) -> None:
+        """Доставлять результаты в главный цикл этого окна"""
+        self._root = root
+        root.after(self.POLL_MS, partial(self._poll, root))
+
+    def _poll(self, root: tk.Tk) -> None:
+        if root is not self._root:
+            return
+        while True:
+            try:
+                callback, args = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in admin panel callback: {e}")
+        # Колбэк мог закрыть окно
+        if root is self._root:
+            root.after(self.POLL_MS, partial(self._poll, root))
+
+    def submit(
+            self,
+            coro: Coroutine,
+            on_success: Optional[Callable[[Any], None]] = None,
+            on_error: Optional[Callable[[BaseException], None]] = None,
+            on_finally: Optional[Callable[[], None]] = None
+    ) -> Future:
+        """Запустить корутину в фоновом цикле; колбэки вызываются в потоке Tk.
+
+        on_finally вызывается всегда, в том числе после отмены Future.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+        def done(f: Future) -> None:
+            if on_finally:
+                self._results.put((on_finally, ()))
+            if f.cancelled():
+                return
+            error = f.exception()
+            if error is not None:
+                if on_error:
+                    self._results.put((on_error, (error,)))
+            elif on_success:
+                self._results.put((on_success, (f.result(),)))
+
+        future.add_done_callback(done)
+        return future
+
+    def post(self, callback: Callable, *args) -> None:
+        """Вызвать callback в потоке Tk (можно из корутин фонового цикла)"""
+        self._results.put((callback, args))
+
+    def detach(self) -> None:
+        self._root = None
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Дождаться корутины (только при запуске и завершении, до и после окон)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self) -> None:
+        self._root = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        if not self.loop.is_running():
+            self.loop.close()
+
+
+class LoginWindow:
+    def __init__(self, worker: AsyncWorker):
         self.root = tk.Tk()
         self.root.title("Login")
         self.root.geometry("300x150")
@@ -34,10 +138,12 @@ class LoginWindow:
         self.password.grid(row=1, column=1, pady=5)
 
         # Login button
-        ttk.Button(frame, text="Login", command=self.login).grid(row=2, column=0, columnspan=2, pady=10)
+        self.login_button = ttk.Button(frame, text="Login", command=self.login)
+        self.login_button.grid(row=2, column=0, columnspan=2, pady=10)
 
-        # Initialize event loop
-        self.loop = asyncio.get_event_loop()
+        self.worker = worker
+        self.worker.attach(self.root)
+        self.authenticated = False
 
     async def verify_credentials(self, username: str, password: str) -> bool:
         async with async_session_factory() as session:
@@ -45,30 +151,156 @@ class LoginWindow:
             result = await session.execute(query)
             user = result.scalar_one_or_none()
 
-            if user and user.is_superuser and bcrypt.checkpw(password.encode(), user.password.encode()):
-                return True
-            return False
+        if user and user.is_superuser and await run_blocking(check_password, password, user.password):
+            return True
+        return False
 
     def login(self):
         username = self.username.get()
         password = self.password.get()
 
-        if self.loop.run_until_complete(self.verify_credentials(username, password)):
-            self.root.destroy()
-            app = MainApplication()
-            app.run()
-        else:
-            messagebox.showerror("Error", "Invalid credentials")
+        def on_verified(valid: bool):
+            if valid:
+                # mainloop() в main() завершится, и откроется основное окно
+                self.authenticated = True
+                self.worker.detach()
+                self.root.destroy()
+            else:
+                messagebox.showerror("Error", "Invalid credentials")
+
+        def on_finally():
+            if self.root.winfo_exists():
+                self.login_button.state(['!disabled'])
+                self.root.config(cursor='')
+
+        self.login_button.state(['disabled'])
+        self.root.config(cursor='watch')
+        self.worker.submit(
+            self.verify_credentials(username, password),
+            on_success=on_verified,
+            on_error=lambda e: messagebox.showerror("Error", f"Login failed: {e}"),
+            on_finally=on_finally
+        )
+
+
+class PagedTree:
+    """Treeview, который заполняется страницами по мере прокрутки.
+
+    fetch(search, after_id, limit) - корутина, возвращающая до limit строк
+    (id, ...) с id больше after_id по возрастанию id. Поиск выполняется на
+    сервере: текст из поля поиска передается в fetch после паузы в наборе.
+    """
+    PAGE_SIZE = 200
+    # Следующая страница загружается, когда видна эта доля списка
+    PREFETCH = 0.8
+    SEARCH_DELAY_MS = 300
+
+    def __init__(self, app: 'MainApplication', parent: ttk.Frame, columns: Iterable[tuple],
+                 fetch: Callable[[str, Optional[int], int], Coroutine], busy_key: str):
+        self.app = app
+        self.fetch = fetch
+        self.busy_key = busy_key
+        self.loaded = False
+        self._last_id: Optional[int] = None
+        self._has_more = False
+        self._future: Optional[Future] = None
+        self._generation = 0
+        self._search_job = None
+
+        self.frame = ttk.Frame(parent)
+        self.frame.pack(fill='both', expand=True)
+
+        search_frame = ttk.Frame(self.frame)
+        search_frame.pack(fill='x', pady=(0, 3))
+        ttk.Label(search_frame, text="Search:").pack(side='left')
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', self._on_search_changed)
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side='left', fill='x', expand=True, padx=5)
+
+        columns = list(columns)
+        self.tree = ttk.Treeview(self.frame, columns=[name for name, _ in columns], show='headings')
+        for name, width in columns:
+            self.tree.heading(name, text=name)
+            if width:
+                self.tree.column(name, width=width, stretch=False)
+        scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.tree.yview)
+        self._scrollbar = scrollbar
+        self.tree.configure(yscrollcommand=self._on_scroll)
+        scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+
+    def reload(self) -> None:
+        """Очистить список и загрузить первую страницу с текущим поиском"""
+        self._generation += 1
+        if self._future is not None and not self._future.done():
+            self._future.cancel()
+        self._future = None
+        self.tree.delete(*self.tree.get_children())
+        self._last_id = None
+        self._has_more = True
+        self.loaded = True
+        self.load_more()
+
+    def load_more(self) -> None:
+        if not self._has_more or (self._future is not None and not self._future.done()):
+            return
+        generation = self._generation
+        self._future = self.app.run_async(
+            self.fetch(self.search_var.get().strip(), self._last_id, self.PAGE_SIZE),
+            on_success=lambda rows: self._on_page(generation, rows),
+            error_message="Failed to load data",
+            busy=(self.busy_key,)
+        )
+
+    def _on_page(self, generation: int, rows: list) -> None:
+        if generation != self._generation:
+            return
+        for values in rows:
+            self.tree.insert('', 'end', values=values)
+        if rows:
+            self._last_id = rows[-1][0]
+        self._has_more = len(rows) >= self.PAGE_SIZE
+        # Первая страница может не заполнить окно: тогда прокрутки не будет
+        if self._has_more:
+            self.tree.after_idle(self._load_if_short)
+
+    def _load_if_short(self) -> None:
+        if self.tree.yview()[1] >= self.PREFETCH:
+            self.load_more()
+
+    def _on_scroll(self, first: str, last: str) -> None:
+        self._scrollbar.set(first, last)
+        if self._has_more and float(last) >= self.PREFETCH:
+            self.load_more()
+
+    def _on_search_changed(self, *args) -> None:
+        if self._search_job is not None:
+            self.tree.after_cancel(self._search_job)
+        self._search_job = self.tree.after(self.SEARCH_DELAY_MS, self._search)
+
+    def _search(self) -> None:
+        self._search_job = None
+        self.reload()
 
 
 class MainApplication:
-    def __init__(self):
+    def __init__(self, worker: AsyncWorker):
         self.root = tk.Tk()
         self.root.title("Shop Management System")
         self.root.geometry("800x600")
 
-        # Initialize event loop
-        self.loop = asyncio.get_event_loop()
+        # Запросы к базе выполняются в фоновом цикле, окно не блокируется
+        self.worker = worker
+        self.worker.attach(self.root)
+        # Число незавершенных операций и индикатор по каждой вкладке
+        self._busy = {}
+        self._busy_indicators = {}
+
+        menubar = tk.Menu(self.root)
+        file_menu = tk.Menu(menubar, tearoff=False)
+        file_menu.add_command(label="Import CSV...", command=self.show_import_dialog)
+        menubar.add_cascade(label="File", menu=file_menu)
+        self.root.config(menu=menubar)
 
         # Create main notebook
         self.notebook = ttk.Notebook(self.root)
@@ -87,43 +319,117 @@ class MainApplication:
         self.setup_shops_tab()
         self.setup_assignments_tab()
 
+        # Списки вкладки загружаются при первом ее открытии
+        self._tab_lists = {
+            str(self.users_tab): (self.users_list,),
+            str(self.shops_tab): (self.shops_list,),
+            str(self.assignments_tab): (self.assign_users_list, self.assign_shops_list),
+        }
+        self.notebook.bind('<<NotebookTabChanged>>', self._on_tab_changed)
+
         # Initial data load
         self.refresh_all_data()
 
-    def setup_users_tab(self):
-        # Users list
-        self.users_tree = ttk.Treeview(self.users_tab, columns=('ID', 'Login', 'Email', 'Is Admin'), show='headings')
-        self.users_tree.heading('ID', text='ID')
-        self.users_tree.heading('Login', text='Login')
-        self.users_tree.heading('Email', text='Email')
-        self.users_tree.heading('Is Admin', text='Is Admin')
-        self.users_tree.pack(fill='both', expand=True, padx=5, pady=5)
+    def run(self):
+        self.root.mainloop()
+
+    # --- фоновые операции ------------------------------------------------------
+
+    def _add_busy_indicator(self, key: str, parent: ttk.Frame) -> None:
+        indicator = ttk.Progressbar(parent, mode='indeterminate', length=100)
+        self._busy_indicators[key] = indicator
+        self._busy[key] = 0
+
+    def _set_busy(self, key: str, delta: int) -> None:
+        count = self._busy[key] = max(0, self._busy[key] + delta)
+        indicator = self._busy_indicators[key]
+        if count and not indicator.winfo_ismapped():
+            indicator.pack(side='right', padx=5)
+            indicator.start(15)
+        elif not count:
+            indicator.stop()
+            indicator.pack_forget()
+        self.root.config(cursor='watch' if any(self._busy.values()) else '')
+
+    def run_async(
+            self,
+            coro: Coroutine,
+            on_success: Optional[Callable[[Any], None]] = None,
+            error_message: str = "Operation failed",
+            busy: Iterable[str] = (),
+            on_error: Optional[Callable[[BaseException], None]] = None
+    ) -> Future:
+        """Выполнить корутину в фоне, показывая индикаторы вкладок из busy"""
+        busy = tuple(busy)
+        for key in busy:
+            self._set_busy(key, 1)
+
+        def on_finally():
+            for key in busy:
+                self._set_busy(key, -1)
+
+        def show_error(error: BaseException):
+            if on_error:
+                on_error(error)
+            messagebox.showerror("Error", f"{error_message}: {error}")
+
+        return self.worker.submit(coro, on_success=on_success, on_error=show_error, on_finally=on_finally)
+
+    def _on_tab_changed(self, event=None) -> None:
+        for paged in self._tab_lists.get(self.notebook.select(), ()):
+            if not paged.loaded:
+                paged.reload()
 
+    def setup_users_tab(self):
         # Buttons frame
         btn_frame = ttk.Frame(self.users_tab)
-        btn_frame.pack(fill='x', padx=5, pady=5)
+        btn_frame.pack(side='bottom', fill='x', padx=5, pady=5)
 
         ttk.Button(btn_frame, text="Add User", command=self.show_add_user_dialog).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Delete User", command=self.delete_user).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Refresh", command=self.refresh_users).pack(side='left', padx=5)
+        self._add_busy_indicator('users', btn_frame)
 
-    def setup_shops_tab(self):
-        # Shops list
-        self.shops_tree = ttk.Treeview(self.shops_tab, columns=('ID', 'Name', 'Is Active'), show='headings')
-        self.shops_tree.heading('ID', text='ID')
-        self.shops_tree.heading('Name', text='Name')
-        self.shops_tree.heading('Is Active', text='Is Active')
-        self.shops_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        # Users list
+        list_frame = ttk.Frame(self.users_tab)
+        list_frame.pack(fill='both', expand=True, padx=5, pady=5)
+        self.users_list = PagedTree(
+            self, list_frame,
+            (('ID', 60), ('Login', None), ('Email', None), ('Is Admin', 80)),
+            self._get_users_page, 'users'
+        )
+        self.users_tree = self.users_list.tree
 
+    def setup_shops_tab(self):
         # Buttons frame
         btn_frame = ttk.Frame(self.shops_tab)
-        btn_frame.pack(fill='x', padx=5, pady=5)
+        btn_frame.pack(side='bottom', fill='x', padx=5, pady=5)
 
         ttk.Button(btn_frame, text="Add Shop", command=self.show_add_shop_dialog).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Delete Shop", command=self.delete_shop).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Refresh", command=self.refresh_shops).pack(side='left', padx=5)
+        self._add_busy_indicator('shops', btn_frame)
+
+        # Shops list
+        list_frame = ttk.Frame(self.shops_tab)
+        list_frame.pack(fill='both', expand=True, padx=5, pady=5)
+        self.shops_list = PagedTree(
+            self, list_frame,
+            (('ID', 60), ('Name', None), ('Is Active', 80)),
+            self._get_shops_page, 'shops'
+        )
+        self.shops_tree = self.shops_list.tree
 
     def setup_assignments_tab(self):
+        # Buttons frame
+        btn_frame = ttk.Frame(self.assignments_tab)
+        btn_frame.pack(side='bottom', fill='x', padx=5, pady=5)
+
+        ttk.Button(btn_frame, text="Assign User to Shop", command=self.assign_user_to_shop).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Remove Assignment", command=self.remove_assignment).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Refresh", command=self.refresh_assignments).pack(side='left', padx=5)
+        self._add_busy_indicator('assignments', btn_frame)
+
         # Create frames
         left_frame = ttk.Frame(self.assignments_tab)
         right_frame = ttk.Frame(self.assignments_tab)
@@ -133,35 +439,21 @@ class MainApplication:
 
         # Users list with assignments
         ttk.Label(left_frame, text="Users").pack()
-        self.assign_users_tree = ttk.Treeview(
-            left_frame,
-            columns=('ID', 'Login', 'Assigned Shops'),
-            show='headings'
+        self.assign_users_list = PagedTree(
+            self, left_frame,
+            (('ID', 50), ('Login', 120), ('Shops', 50), ('Assigned Shops', None)),
+            self._get_user_assignments_page, 'assignments'
         )
-        self.assign_users_tree.heading('ID', text='ID')
-        self.assign_users_tree.heading('Login', text='Login')
-        self.assign_users_tree.heading('Assigned Shops', text='Assigned Shops')
-        self.assign_users_tree.pack(fill='both', expand=True)
+        self.assign_users_tree = self.assign_users_list.tree
 
         # Shops list with assignments
         ttk.Label(right_frame, text="Shops").pack()
-        self.assign_shops_tree = ttk.Treeview(
-            right_frame,
-            columns=('ID', 'Name', 'Assigned Users'),
-            show='headings'
+        self.assign_shops_list = PagedTree(
+            self, right_frame,
+            (('ID', 50), ('Name', 120), ('Users', 50), ('Assigned Users', None)),
+            self._get_shop_assignments_page, 'assignments'
         )
-        self.assign_shops_tree.heading('ID', text='ID')
-        self.assign_shops_tree.heading('Name', text='Name')
-        self.assign_shops_tree.heading('Assigned Users', text='Assigned Users')
-        self.assign_shops_tree.pack(fill='both', expand=True)
-
-        # Buttons frame
-        btn_frame = ttk.Frame(self.assignments_tab)
-        btn_frame.pack(side='bottom', fill='x', padx=5, pady=5)
-
-        ttk.Button(btn_frame, text="Assign User to Shop", command=self.assign_user_to_shop).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Remove Assignment", command=self.remove_assignment).pack(side='left', padx=5)
-        ttk.Button(btn_frame, text="Refresh", command=self.refresh_assignments).pack(side='left', padx=5)
+        self.assign_shops_tree = self.assign_shops_list.tree
 
     async def _add_user(self, login: str, password: str, email: str, is_admin: bool):
         async with async_session_factory() as session:
@@ -171,7 +463,7 @@ class MainApplication:
             if existing_user.scalar_one_or_none():
                 raise ValueError("User with this login already exists")
 
-            hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+            hashed_password = await run_blocking(hash_password, password)
             new_user = User(
                 login=login,
                 password=hashed_password,
@@ -201,20 +493,28 @@ class MainApplication:
         is_admin_var = tk.BooleanVar()
         ttk.Checkbutton(dialog, text="Is Admin", variable=is_admin_var).pack(pady=5)
 
+        def on_added(result):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            self.refresh_users()
+
         def add_user():
-            try:
-                self.loop.run_until_complete(self._add_user(
+            add_button.state(['disabled'])
+            self.run_async(
+                self._add_user(
                     login_entry.get(),
                     password_entry.get(),
                     email_entry.get(),
                     is_admin_var.get()
-                ))
-                dialog.destroy()
-                self.refresh_users()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+                ),
+                on_success=on_added,
+                error_message="Failed to add user",
+                busy=('users',),
+                on_error=lambda e: add_button.state(['!disabled']) if dialog.winfo_exists() else None
+            )
 
-        ttk.Button(dialog, text="Add", command=add_user).pack(pady=10)
+        add_button = ttk.Button(dialog, text="Add", command=add_user)
+        add_button.pack(pady=10)
 
     async def _delete_user(self, user_id: int):
         async with async_session_factory() as session:
@@ -229,11 +529,12 @@ class MainApplication:
 
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this user?"):
             user_id = self.users_tree.item(selected[0])['values'][0]
-            try:
-                self.loop.run_until_complete(self._delete_user(user_id))
-                self.refresh_users()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            self.run_async(
+                self._delete_user(user_id),
+                on_success=lambda result: self.refresh_users(),
+                error_message="Failed to delete user",
+                busy=('users',)
+            )
 
     async def _add_shop(self, name: str):
         async with async_session_factory() as session:
@@ -250,18 +551,28 @@ class MainApplication:
         name_entry = ttk.Entry(dialog)
         name_entry.pack(pady=5)
 
-        def add_shop():
-            try:
-                self.loop.run_until_complete(self._add_shop(name_entry.get()))
+        def on_added(result):
+            if dialog.winfo_exists():
                 dialog.destroy()
-                self.refresh_shops()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            self.refresh_shops()
 
-        ttk.Button(dialog, text="Add", command=add_shop).pack(pady=10)
+        def add_shop():
+            add_button.state(['disabled'])
+            self.run_async(
+                self._add_shop(name_entry.get()),
+                on_success=on_added,
+                error_message="Failed to add shop",
+                busy=('shops',),
+                on_error=lambda e: add_button.state(['!disabled']) if dialog.winfo_exists() else None
+            )
+
+        add_button = ttk.Button(dialog, text="Add", command=add_shop)
+        add_button.pack(pady=10)
 
     async def _delete_shop(self, shop_id: int):
         async with async_session_factory() as session:
+            # Токены пользователей магазина отзываются до каскадного удаления привязок
+            await session.execute(bump_shop_users_auth_version(shop_id))
             await session.execute(delete(Shop).where(Shop.id == shop_id))
             await session.commit()
 
@@ -273,11 +584,12 @@ class MainApplication:
 
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this shop?"):
             shop_id = self.shops_tree.item(selected[0])['values'][0]
-            try:
-                self.loop.run_until_complete(self._delete_shop(shop_id))
-                self.refresh_shops()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            self.run_async(
+                self._delete_shop(shop_id),
+                on_success=lambda result: self.refresh_shops(),
+                error_message="Failed to delete shop",
+                busy=('shops',)
+            )
 
     async def _assign_user_to_shop(self, user_id: int, shop_id: int):
         async with async_session_factory() as session:
@@ -296,7 +608,9 @@ class MainApplication:
                 shop_id=shop_id
             )
             await session.execute(stmt)
+            await session.execute(bump_auth_version([user_id]))
             await session.commit()
+
     def assign_user_to_shop(self):
         selected_user = self.assign_users_tree.selection()
         selected_shop = self.assign_shops_tree.selection()
@@ -308,11 +622,12 @@ class MainApplication:
         user_id = self.assign_users_tree.item(selected_user[0])['values'][0]
         shop_id = self.assign_shops_tree.item(selected_shop[0])['values'][0]
 
-        try:
-            self.loop.run_until_complete(self._assign_user_to_shop(user_id, shop_id))
-            self.refresh_assignments()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.run_async(
+            self._assign_user_to_shop(user_id, shop_id),
+            on_success=lambda result: self.refresh_assignments(),
+            error_message="Failed to assign user",
+            busy=('assignments',)
+        )
 
     async def _remove_assignment(self, user_id: int, shop_id: int):
         async with async_session_factory() as session:
@@ -322,6 +637,7 @@ class MainApplication:
                     users_shops.c.shop_id == shop_id
                 )
             )
+            await session.execute(bump_auth_version([user_id]))
             await session.commit()
 
     def remove_assignment(self):
@@ -336,122 +652,226 @@ class MainApplication:
             user_id = self.assign_users_tree.item(selected_user[0])['values'][0]
             shop_id = self.assign_shops_tree.item(selected_shop[0])['values'][0]
 
-            try:
-                self.loop.run_until_complete(self._remove_assignment(user_id, shop_id))
-                self.refresh_assignments()
-            except Exception as e:
-                messagebox.showerror("Error", str(e))
+            self.run_async(
+                self._remove_assignment(user_id, shop_id),
+                on_success=lambda result: self.refresh_assignments(),
+                error_message="Failed to remove assignment",
+                busy=('assignments',)
+            )
 
-    async def _get_shops(self):
-        """Получение списка магазинов из базы данных"""
-        async with async_session_factory() as session:
-            result = await session.execute(select(Shop))
-            return result.scalars().all()
+    # --- массовый импорт -----------------------------------------------------------
 
-    async def _get_users(self):
-        """Получение списка пользователей из базы данных"""
-        async with async_session_factory() as session:
-            result = await session.execute(select(User))
-            return result.scalars().all()
+    def show_import_dialog(self):
+        """Импорт магазинов, пользователей и назначений из CSV (см. app/db/bulk_import.py)"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Import CSV")
+        dialog.geometry("560x420")
+
+        files = {}
+        form = ttk.Frame(dialog, padding=5)
+        form.pack(fill='x')
+        for row, kind in enumerate(IMPORT_KINDS):
+            files[kind] = tk.StringVar()
+            ttk.Label(form, text=f"{kind.capitalize()}:").grid(row=row, column=0, sticky='w', pady=2)
+            ttk.Entry(form, textvariable=files[kind], width=50).grid(row=row, column=1, padx=5, pady=2)
+            ttk.Button(
+                form, text="...", width=3,
+                command=lambda var=files[kind]: var.set(
+                    filedialog.askopenfilename(parent=dialog, filetypes=[("CSV", "*.csv"), ("All files", "*")])
+                    or var.get()
+                )
+            ).grid(row=row, column=2, pady=2)
 
-    async def _get_user_shops(self):
-        """Получение списка связей пользователей и магазинов"""
-        async with async_session_factory() as session:
-            result = await session.execute(
-                select(users_shops)
-                .join(User, users_shops.c.user_id == User.id)
-                .join(Shop, users_shops.c.shop_id == Shop.id)
+        progress = ttk.Progressbar(dialog, mode='determinate', maximum=1.0)
+        progress.pack(fill='x', padx=5, pady=5)
+        status = ttk.Label(dialog, text="Files are imported in order: shops, users, assignments")
+        status.pack(fill='x', padx=5)
+        errors_text = tk.Text(dialog, height=12, state='disabled')
+        errors_text.pack(fill='both', expand=True, padx=5, pady=5)
+
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(fill='x', padx=5, pady=5)
+        start_button = ttk.Button(btn_frame, text="Start")
+        start_button.pack(side='left', padx=5)
+        save_button = ttk.Button(btn_frame, text="Save errors...", state='disabled')
+        save_button.pack(side='left', padx=5)
+        reports: List[ImportReport] = []
+
+        def show_progress(kind: str, fraction: float, text: str) -> None:
+            if dialog.winfo_exists():
+                progress['value'] = fraction
+                status.config(text=f"{kind}: {text}")
+
+        def on_progress(report: ImportReport) -> None:
+            # Вызывается в фоновом цикле: в Tk передаются только значения
+            self.worker.post(show_progress, report.kind, report.fraction,
+                             f"{report.rows} rows, {report.inserted} inserted, {len(report.errors)} errors")
+
+        async def run_import(selected):
+            for kind, path in selected:
+                reports.append(await import_csv(kind, path, progress=on_progress))
+            return reports
+
+        def on_done(result) -> None:
+            self.refresh_all_data()
+            if not dialog.winfo_exists():
+                return
+            start_button.state(['!disabled'])
+            status.config(text="; ".join(report.summary() for report in reports))
+            errors_text.config(state='normal')
+            errors_text.delete('1.0', 'end')
+            for report in reports:
+                for line, message in report.errors:
+                    errors_text.insert('end', f"{report.kind} line {line}: {message}\n")
+            errors_text.config(state='disabled')
+            if any(report.errors for report in reports):
+                save_button.state(['!disabled'])
+
+        def start():
+            selected = [(kind, files[kind].get().strip()) for kind in IMPORT_KINDS if files[kind].get().strip()]
+            if not selected:
+                messagebox.showwarning("Warning", "Please choose at least one CSV file", parent=dialog)
+                return
+            reports.clear()
+            start_button.state(['disabled'])
+            save_button.state(['disabled'])
+            self.run_async(
+                run_import(selected),
+                on_success=on_done,
+                error_message="Import failed",
+                busy=('users', 'shops', 'assignments'),
+                on_error=lambda e: start_button.state(['!disabled']) if dialog.winfo_exists() else None
             )
+
+        def save_errors():
+            path = filedialog.asksaveasfilename(parent=dialog, defaultextension='.csv',
+                                                initialfile='import_errors.csv')
+            if path:
+                write_errors(reports, path)
+
+        start_button.config(command=start)
+        save_button.config(command=save_errors)
+
+    # --- постраничные запросы (см. PagedTree) ------------------------------------
+
+    # Сколько имен показывать в колонке списка привязок; остальные - маркером "… (+N)"
+    ASSIGNMENT_NAMES_SHOWN = 20
+    # Разделитель GROUP_CONCAT, которого не бывает в именах
+    NAMES_SEPARATOR = '\x1f'
+
+    @classmethod
+    def _names_concat(cls, column):
+        """GROUP_CONCAT(column ORDER BY column) с разделителем NAMES_SEPARATOR"""
+        name = f"{column.table.name}.{column.name}"
+        return func.group_concat(literal_column(f"{name} ORDER BY {name} SEPARATOR '{cls.NAMES_SEPARATOR}'"))
+
+    @classmethod
+    def _names_cell(cls, names: Optional[str], total: int) -> str:
+        """Первые ASSIGNMENT_NAMES_SHOWN имен и явный маркер, если показаны не все"""
+        if not total:
+            return 'No assignments'
+        parts = (names or '').split(cls.NAMES_SEPARATOR)
+        if len(parts) < total:
+            # GROUP_CONCAT обрезан по group_concat_max_len: последнее имя может быть неполным
+            parts = parts[:-1]
+        shown = parts[:cls.ASSIGNMENT_NAMES_SHOWN]
+        cell = ', '.join(shown)
+        if len(shown) < total:
+            cell += f", … (+{total - len(shown)})"
+        return cell
+
+    async def _execute_grouped(self, query):
+        async with async_session_factory() as session:
+            # По умолчанию GROUP_CONCAT молча обрезается до 1024 байт; места хватает на
+            # показываемые имена (до 100 символов, до 4 байт на символ)
+            await session.execute(text("SET SESSION group_concat_max_len = :length"),
+                                  {"length": (self.ASSIGNMENT_NAMES_SHOWN + 1) * 404})
+            result = await session.execute(query)
             return result.all()
 
+    @staticmethod
+    def _page(query, id_column, search_filter, search: str, after_id: Optional[int], limit: int):
+        query = query.order_by(id_column).limit(limit)
+        if after_id is not None:
+            query = query.where(id_column > after_id)
+        if search:
+            query = query.where(search_filter)
+        return query
+
+    async def _get_users_page(self, search: str, after_id: Optional[int], limit: int):
+        """Страница пользователей; поиск по логину и email"""
+        query = self._page(
+            select(User.id, User.login, User.email, User.is_superuser), User.id,
+            or_(User.login.contains(search, autoescape=True), User.email.contains(search, autoescape=True)),
+            search, after_id, limit
+        )
+        async with async_session_factory() as session:
+            result = await session.execute(query)
+            return [(row.id, row.login, row.email, 'Yes' if row.is_superuser else 'No') for row in result]
+
+    async def _get_shops_page(self, search: str, after_id: Optional[int], limit: int):
+        """Страница магазинов; поиск по названию"""
+        query = self._page(
+            select(Shop.id, Shop.name, Shop.is_active), Shop.id,
+            Shop.name.contains(search, autoescape=True),
+            search, after_id, limit
+        )
+        async with async_session_factory() as session:
+            result = await session.execute(query)
+            return [(row.id, row.name, 'Yes' if row.is_active else 'No') for row in result]
+
+    async def _get_user_assignments_page(self, search: str, after_id: Optional[int], limit: int):
+        """Пользователи с числом и списком магазинов, сгруппированные в одном запросе"""
+        query = self._page(
+            select(User.id, User.login, func.count(Shop.id).label('total'), self._names_concat(Shop.name).label('names'))
+            .select_from(User)
+            .outerjoin(users_shops, users_shops.c.user_id == User.id)
+            .outerjoin(Shop, Shop.id == users_shops.c.shop_id)
+            .group_by(User.id, User.login),
+            User.id, User.login.contains(search, autoescape=True),
+            search, after_id, limit
+        )
+        rows = await self._execute_grouped(query)
+        return [(row.id, row.login, row.total, self._names_cell(row.names, row.total)) for row in rows]
+
+    async def _get_shop_assignments_page(self, search: str, after_id: Optional[int], limit: int):
+        """Магазины с числом и списком пользователей, сгруппированные в одном запросе"""
+        query = self._page(
+            select(Shop.id, Shop.name, func.count(User.id).label('total'), self._names_concat(User.login).label('names'))
+            .select_from(Shop)
+            .outerjoin(users_shops, users_shops.c.shop_id == Shop.id)
+            .outerjoin(User, User.id == users_shops.c.user_id)
+            .group_by(Shop.id, Shop.name),
+            Shop.id, Shop.name.contains(search, autoescape=True),
+            search, after_id, limit
+        )
+        rows = await self._execute_grouped(query)
+        return [(row.id, row.name, row.total, self._names_cell(row.names, row.total)) for row in rows]
+
+    def _reload_if_loaded(self, *lists: PagedTree) -> None:
+        """Открытые списки перезагружаются сразу, остальные - при открытии вкладки"""
+        current = self._tab_lists.get(self.notebook.select(), ())
+        for paged in lists:
+            if paged in current:
+                paged.reload()
+            else:
+                paged.loaded = False
+
     def refresh_shops(self):
         """Обновление списка магазинов в интерфейсе"""
-        # Clear existing items
-        for item in self.shops_tree.get_children():
-            self.shops_tree.delete(item)
-
-        try:
-            # Fetch and display shops
-            shops = self.loop.run_until_complete(self._get_shops())
-            for shop in shops:
-                self.shops_tree.insert('', 'end', values=(
-                    shop.id,
-                    shop.name,
-                    'Yes' if shop.is_active else 'No'
-                ))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to refresh shops: {str(e)}")
+        self._reload_if_loaded(self.shops_list, self.assign_shops_list, self.assign_users_list)
 
     def refresh_users(self):
         """Обновление списка пользователей в интерфейсе"""
-        # Clear existing items
-        for item in self.users_tree.get_children():
-            self.users_tree.delete(item)
-
-        try:
-            # Fetch and display users
-            users = self.loop.run_until_complete(self._get_users())
-            for user in users:
-                self.users_tree.insert('', 'end', values=(
-                    user.id,
-                    user.login,
-                    user.email,
-                    'Yes' if user.is_superuser else 'No'
-                ))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to refresh users: {str(e)}")
+        self._reload_if_loaded(self.users_list, self.assign_users_list, self.assign_shops_list)
 
     def refresh_assignments(self):
         """Обновление списка назначений в интерфейсе"""
-        # Clear existing items
-        for item in self.assign_users_tree.get_children():
-            self.assign_users_tree.delete(item)
-        for item in self.assign_shops_tree.get_children():
-            self.assign_shops_tree.delete(item)
-
-        try:
-            # Fetch data
-            users = self.loop.run_until_complete(self._get_users())
-            shops = self.loop.run_until_complete(self._get_shops())
-            assignments = self.loop.run_until_complete(self._get_user_shops())
-
-            # Create a set of tuples for quick lookup
-            assigned_pairs = {(a.user_id, a.shop_id) for a in assignments}
-
-            # Display users with their assignments
-            for user in users:
-                shop_names = [
-                    s.name for s in shops
-                    if (user.id, s.id) in assigned_pairs
-                ]
-                self.assign_users_tree.insert('', 'end', values=(
-                    user.id,
-                    user.login,
-                    ', '.join(shop_names) if shop_names else 'No assignments'
-                ))
-
-            # Display shops with their assignments
-            for shop in shops:
-                user_names = [
-                    u.login for u in users
-                    if (u.id, shop.id) in assigned_pairs
-                ]
-                self.assign_shops_tree.insert('', 'end', values=(
-                    shop.id,
-                    shop.name,
-                    ', '.join(user_names) if user_names else 'No assignments'
-                ))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to refresh assignments: {str(e)}")
+        self._reload_if_loaded(self.assign_users_list, self.assign_shops_list)
 
     def refresh_all_data(self):
-        """Обновление всех данных в интерфейсе"""
-        try:
-            self.refresh_users()
-            self.refresh_shops()
-            self.refresh_assignments()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to refresh data: {str(e)}")
+        """Обновление данных: списки текущей вкладки сразу, остальных - при открытии"""
+        self._reload_if_loaded(*(paged for lists in self._tab_lists.values() for paged in lists))
 
 
 async def create_admin_if_not_exists():
@@ -464,7 +884,7 @@ async def create_admin_if_not_exists():
 
         if not admin:
             # Create admin user
-            hashed_password = bcrypt.hashpw('admin'.encode(), bcrypt.gensalt()).decode()
+            hashed_password = await run_blocking(hash_password, 'admin')
             admin = User(
                 login='admin',
                 password=hashed_password,
@@ -480,25 +900,35 @@ def main():
     if sys.platform.startswith('win'):
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-    loop = asyncio.get_event_loop()
+    # Все обращения к базе идут через один цикл в фоновом потоке:
+    # соединения пула привязаны к циклу, в котором созданы
+    worker = AsyncWorker()
 
     try:
         # Initialize database
-        loop.run_until_complete(init_db())
+        worker.run(init_db())
 
         # Create admin user if it doesn't exist
-        loop.run_until_complete(create_admin_if_not_exists())
+        worker.run(create_admin_if_not_exists())
 
         # Start application
-        login_window = LoginWindow()
+        login_window = LoginWindow(worker)
         login_window.root.mainloop()
 
+        if login_window.authenticated:
+            app = MainApplication(worker)
+            app.run()
+
     except Exception as e:
         messagebox.showerror("Error", f"Failed to start application: {str(e)}")
         sys.exit(1)
     finally:
-        loop.close()
+        try:
+            worker.run(cleanup_db(), timeout=10)
+        except Exception as e:
+            print(f"Error during cleanup: {e}")
+        worker.stop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,15 +1,19 @@
+import hashlib
 import os
+import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy import select, or_
+from sqlalchemy import select, or_, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import get_db
-from app.models.models import User
-from ..schemas.schemas import UserResponse, UserCreate, TokenData, Token
+from app.db.auth_version import bump_auth_version
+from app.models.models import User, RefreshToken, users_shops
+from ..schemas.schemas import UserResponse, UserCreate, TokenData, Token, RefreshRequest
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 
@@ -25,6 +29,9 @@ DB_PORT: int = int(os.environ["DB_PORT"])  # Convert to int
 SECRET_KEY: str = os.environ["SECRET_KEY"]
 ALGORITHM: str = os.environ["ALGORITHM"]
 ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"])  # Convert to int
+REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# How long a checked auth_version is trusted without asking the database, seconds
+AUTH_VERSION_TTL: float = float(os.environ.get("AUTH_VERSION_TTL", "5"))
 # --- Pydantic models ---
 
 
@@ -44,12 +51,28 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
-def create_access_token(user: User, expires_delta: Optional[timedelta] = None) -> str:
-    """Create JWT token with user data"""
+async def fetch_user_shop_ids(session: AsyncSession, user_id: int) -> List[int]:
+    """Shop ids written into the user's access token"""
+    result = await session.execute(
+        select(users_shops.c.shop_id).where(users_shops.c.user_id == user_id)
+    )
+    return sorted(result.scalars())
+
+
+def create_access_token(user: User, shop_ids: List[int], expires_delta: Optional[timedelta] = None) -> str:
+    """Create JWT token with user data.
+
+    The token carries everything the access checks need (shops, active flag,
+    superuser flag), so requests are authorized without loading the user.
+    "ver" is the user's auth_version at issue time.
+    """
     to_encode = {
         "user_id": user.id,
         "is_superuser": user.is_superuser,
-        "sub": user.login  # сохраняем для совместимости
+        "sub": user.login,  # сохраняем для совместимости
+        "active": user.is_active,
+        "shops": list(shop_ids),
+        "ver": user.auth_version or 0
     }
 
     if expires_delta:
@@ -61,6 +84,56 @@ def create_access_token(user: User, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def hash_refresh_token(token: str) -> str:
+    """Refresh tokens are random, so an unsalted SHA-256 is enough for storage"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(session: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """Add a new refresh token to the session; a new family starts at login"""
+    token = secrets.token_urlsafe(32)
+    session.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+
+async def issue_tokens(session: AsyncSession, user: User, family_id: Optional[str] = None) -> dict:
+    """Access and refresh token pair; commits the session"""
+    access_token = create_access_token(
+        user=user,  # Передаем весь объект пользователя
+        shop_ids=await fetch_user_shop_ids(session, user.id),
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    if family_id is None:
+        # Новый вход - заодно удаляем истекшие токены пользователя
+        await session.execute(delete(RefreshToken).where(
+            RefreshToken.user_id == user.id,
+            RefreshToken.expires_at < datetime.utcnow()
+        ))
+    refresh_token = issue_refresh_token(session, user.id, family_id)
+    await session.commit()
+
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+
+async def revoke_refresh_tokens(session: AsyncSession, *criteria) -> None:
+    """Mark matching, not yet revoked refresh tokens as revoked (no commit)"""
+    await session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.revoked_at.is_(None), *criteria)
+        .values(revoked_at=datetime.utcnow())
+    )
+
+
 async def authenticate_user(session: AsyncSession, login: str, password: str) -> Optional[User]:
     """Authenticate user by login and password"""
     query = select(User).where(User.login == login)
@@ -74,16 +147,59 @@ async def authenticate_user(session: AsyncSession, login: str, password: str) ->
     return user
 
 
+def user_id_from_token(token: str) -> Optional[int]:
+    """User id of a validly signed, unexpired access token, without touching the database"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("user_id")
+
+
+# user_id -> (auth_version, is_active, время проверки)
+_auth_versions: Dict[int, Tuple[int, bool, float]] = {}
+
+
+async def fetch_auth_state(session: AsyncSession, user_id: int, use_cache: bool = True) -> Optional[Tuple[int, bool]]:
+    """Current (auth_version, is_active) of a user, None if the user is gone.
+
+    A single primary-key lookup of two columns, cached for AUTH_VERSION_TTL
+    seconds; revocations take effect within that time.
+    """
+    now = time.monotonic()
+    cached = _auth_versions.get(user_id)
+    if use_cache and cached is not None and now - cached[2] < AUTH_VERSION_TTL:
+        return cached[0], cached[1]
+
+    result = await session.execute(
+        select(User.auth_version, User.is_active).where(User.id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        _auth_versions.pop(user_id, None)
+        return None
+    _auth_versions[user_id] = (row.auth_version, row.is_active, now)
+    return row.auth_version, row.is_active
+
+
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
         session: AsyncSession = Depends(get_db)
-) -> User:
-    """Get current user from JWT token"""
+) -> TokenData:
+    """Get current user from JWT token.
+
+    Tokens with a "ver" claim are authorized from their claims plus the
+    auth_version check; older tokens load the user from the database.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    inactive_exception = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Inactive user"
+    )
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -93,27 +209,64 @@ async def get_current_user(
         if user_id is None:
             raise credentials_exception
 
-        token_data = TokenData(user_id=user_id, is_superuser=is_superuser)
-    except JWTError:
+        token_data = TokenData(
+            user_id=user_id,
+            is_superuser=is_superuser,
+            login=payload.get("sub"),
+            is_active=payload.get("active", True),
+            shop_ids=payload.get("shops"),
+            auth_version=payload.get("ver")
+        )
+    except (JWTError, ValueError):
         raise credentials_exception
 
-    query = select(User).where(User.id == token_data.user_id)
-    result = await session.execute(query)
-    user = result.scalar_one_or_none()
+    if token_data.auth_version is None or token_data.shop_ids is None:
+        query = select(User).where(User.id == token_data.user_id)
+        result = await session.execute(query)
+        user = result.scalar_one_or_none()
 
-    if user is None:
+        if user is None:
+            raise credentials_exception
+        if not user.is_active:
+            raise inactive_exception
+        return TokenData(user_id=user.id, is_superuser=user.is_superuser, login=user.login)
+
+    state = await fetch_auth_state(session, token_data.user_id)
+    if state is not None and state[0] != token_data.auth_version:
+        # Кэш мог устареть раньше токена (новый вход после изменения прав)
+        state = await fetch_auth_state(session, token_data.user_id, use_cache=False)
+    if state is None:
         raise credentials_exception
-    if not user.is_active:
+    version, is_active = state
+    if version != token_data.auth_version:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not (is_active and token_data.is_active):
+        raise inactive_exception
+    return token_data
+
+
+async def get_current_user_record(
+        current_user: TokenData = Depends(get_current_user),
+        session: AsyncSession = Depends(get_db)
+) -> User:
+    """Full User row for endpoints that need more than the token claims"""
+    user = await session.get(User, current_user.user_id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
         )
     return user
 
 
 async def get_current_active_admin(
-        current_user: User = Depends(get_current_user)
-) -> User:
+        current_user: TokenData = Depends(get_current_user)
+) -> TokenData:
     """Check if current user is admin"""
     if not current_user.is_superuser:
         raise HTTPException(
@@ -142,13 +295,64 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        user=user,  # Передаем весь объект пользователя
-        expires_delta=access_token_expires
+    return await issue_tokens(session, user)
+
+
+@auth_router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+        request: RefreshRequest,
+        session: AsyncSession = Depends(get_db)
+):
+    """Exchange a refresh token for a new token pair (no password check).
+
+    The presented token is revoked; reusing a revoked token revokes its
+    whole family, so a stolen token stops working for both parties.
+    """
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    query = select(RefreshToken).where(
+        RefreshToken.token_hash == hash_refresh_token(request.refresh_token)
+    ).with_for_update()
+    result = await session.execute(query)
+    stored = result.scalar_one_or_none()
+    if stored is None:
+        raise invalid_exception
+
+    if stored.revoked_at is not None:
+        await revoke_refresh_tokens(session, RefreshToken.family_id == stored.family_id)
+        await session.commit()
+        raise invalid_exception
+    if stored.expires_at <= datetime.utcnow():
+        raise invalid_exception
+
+    user = await session.get(User, stored.user_id)
+    if user is None or not user.is_active:
+        raise invalid_exception
+
+    stored.revoked_at = datetime.utcnow()
+    return await issue_tokens(session, user, family_id=stored.family_id)
+
+
+@auth_router.post("/logout")
+async def logout(
+        request: RefreshRequest,
+        session: AsyncSession = Depends(get_db)
+):
+    """Revoke the refresh token and everything rotated from it"""
+    query = select(RefreshToken.family_id).where(
+        RefreshToken.token_hash == hash_refresh_token(request.refresh_token)
+    )
+    result = await session.execute(query)
+    family_id = result.scalar_one_or_none()
+    if family_id is not None:
+        await revoke_refresh_tokens(session, RefreshToken.family_id == family_id)
+        await session.commit()
+
+    return {"message": "Logged out"}
 
 
 # Обновляем register_user
@@ -174,20 +378,14 @@ async def register_user(
     await session.refresh(new_user)
 
     # Create and return token с обновленной функцией
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        user=new_user,  # Передаем весь объект пользователя
-        expires_delta=access_token_expires
-    )
-
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await issue_tokens(session, new_user)
 
 # Optional: Password change endpoint
 @auth_router.post("/change-password")
 async def change_password(
         old_password: str,
         new_password: str,
-        current_user: User = Depends(get_current_user),
+        current_user: User = Depends(get_current_user_record),
         session: AsyncSession = Depends(get_db)
 ):
     """Change user password"""
@@ -198,13 +396,17 @@ async def change_password(
         )
 
     current_user.password = get_password_hash(new_password)
+    # Входы с других устройств больше не продлеваются, выданные access-токены отзываются
+    await revoke_refresh_tokens(session, RefreshToken.user_id == current_user.id)
+    await session.execute(bump_auth_version([current_user.id]))
     await session.commit()
+    _auth_versions.pop(current_user.id, None)
 
     return {"message": "Password updated successfully"}
 
 
 # Optional: User profile endpoint
 @auth_router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user_record)):
     """Get current user profile"""
     return current_user
\ No newline at end of file
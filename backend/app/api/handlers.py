@@ -1,29 +1,36 @@
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Query  # добавляем status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response  # добавляем status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select, func, case, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 
 from app.core.config import get_db
+from app.core.encoding import conditional_model_response
 from app.api.auth_handlers import get_current_user
 from app.crud import crud
-from app.models.models import User, Invoice
-from app.schemas.schemas import InvoiceCreate, InvoiceResponse, InvoiceFilter, InvoiceUpdate
+from app.pdf.service import pdf_service
+from app.pdf.export import stream_invoices_zip
+from app.models.models import Invoice, ArchivedInvoice
+from app.schemas.schemas import InvoiceCreate, InvoiceResponse, InvoiceFilter, InvoiceUpdate, AnalyticsSeries, TokenData
 
 router = APIRouter(prefix="/api/v1")
 
+# Самый длинный период, который отдает /analytics/series (около 10 лет по дням)
+MAX_SERIES_DAYS = 3660
+
 
 # Добавьте этот эндпоинт в ваш существующий router
 
 @router.get("/invoices/next-invoice-id", response_model=Dict[str, Any])
 async def get_next_invoice_id(
         shop_id: int,
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
     try:
         # Проверяем доступ к магазину
-        has_access = await crud.check_user_shop_access(session, current_user.id, shop_id)
+        has_access = await crud.user_has_shop_access(session, current_user, shop_id)
         if not has_access:
             raise HTTPException(status_code=403, detail="No access to this shop")
 
@@ -38,10 +45,11 @@ async def get_next_invoice_id(
         result = await session.execute(query)
         current_max_id = result.scalar()
 
-        # Получаем общий максимальный ID
+        # Получаем общий максимальный ID (архив хранит исходные ID)
         query_total = select(func.coalesce(func.max(Invoice.id), 0))
         result_total = await session.execute(query_total)
-        total_max_id = result_total.scalar()
+        archive_total = await session.execute(select(func.coalesce(func.max(ArchivedInvoice.id), 0)))
+        total_max_id = max(result_total.scalar(), archive_total.scalar())
 
         next_id = total_max_id + 1
 
@@ -72,10 +80,45 @@ async def get_next_invoice_id(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/invoices/export", response_class=StreamingResponse)
+async def export_invoices(
+        shop_id: Optional[int] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        current_user: TokenData = Depends(get_current_user),
+        session: AsyncSession = Depends(get_db)
+):
+    """Stream PDFs of all matching invoices as a ZIP archive while they render"""
+    filters = InvoiceFilter(
+        shop_id=shop_id,
+        created_after=created_after,
+        created_before=created_before
+    )
+    try:
+        invoice_refs = await crud.fetch_export_invoice_refs(session, current_user, filters)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if not invoice_refs:
+        raise HTTPException(status_code=404, detail="No invoices match the filter")
+
+    filename = f"invoices_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        stream_invoices_zip(invoice_refs),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Invoice-Count": str(len(invoice_refs))
+        }
+    )
+
+
 @router.post("/invoices/", response_model=InvoiceResponse, status_code=201)
 async def create_invoice(
         invoice_data: InvoiceCreate,
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
     try:
@@ -99,15 +142,19 @@ async def create_invoice(
 
 @router.get("/invoices/", response_model=List[InvoiceResponse])
 async def list_invoices(
+        request: Request,
         shop_id: Optional[int] = None,
         is_paid: Optional[bool] = None,
         created_after: Optional[datetime] = None,
         created_before: Optional[datetime] = None,
         min_amount: Optional[float] = None,
         max_amount: Optional[float] = None,
+        contact: Optional[str] = None,
+        number: Optional[str] = None,
+        updated_after: Optional[datetime] = None,
         skip: int = Query(default=0, ge=0),
         limit: int = Query(default=100, le=100),
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
 
@@ -117,7 +164,10 @@ async def list_invoices(
         created_after=created_after,
         created_before=created_before,
         min_amount=min_amount,
-        max_amount=max_amount
+        max_amount=max_amount,
+        contact=contact,
+        number=number,
+        updated_after=updated_after
     )
     try:
         invoices = await crud.fetch_invoices_with_filters(
@@ -127,7 +177,9 @@ async def list_invoices(
             skip,
             limit
         )
-        return invoices
+        return conditional_model_response(
+            request, [InvoiceResponse.model_validate(invoice) for invoice in invoices]
+        )
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -137,13 +189,39 @@ async def list_invoices(
 @router.get("/invoices/{invoice_id}", response_model=InvoiceResponse)
 async def get_invoice(
         invoice_id: int,
-        current_user: User = Depends(get_current_user),
+        request: Request,
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
 
     try:
         invoice = await crud.fetch_invoice(session, invoice_id, current_user)
-        return invoice
+        return conditional_model_response(request, InvoiceResponse.model_validate(invoice))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/invoices/{invoice_id}/pdf", response_class=Response)
+async def get_invoice_pdf(
+        invoice_id: int,
+        request: Request,
+        current_user: TokenData = Depends(get_current_user),
+        session: AsyncSession = Depends(get_db)
+):
+    """Render the invoice PDF on the server, reusing a cached copy when unchanged"""
+    try:
+        invoice = await crud.fetch_invoice(session, invoice_id, current_user)
+
+        etag = f'"{invoice_id}-{pdf_service.version_of(invoice)}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        pdf, _ = await pdf_service.get_pdf(invoice)
+        headers["Content-Disposition"] = f'inline; filename="invoice_{invoice_id}.pdf"'
+        return Response(content=pdf, media_type="application/pdf", headers=headers)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -154,7 +232,7 @@ async def get_invoice(
 async def update_invoice(
         invoice_id: int,
         invoice_data: InvoiceUpdate,
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
 
@@ -165,6 +243,7 @@ async def update_invoice(
             invoice_data,
             current_user
         )
+        pdf_service.invalidate(invoice_id)
         return invoice
     except HTTPException as e:
         raise e
@@ -175,12 +254,13 @@ async def update_invoice(
 @router.delete("/invoices/{invoice_id}", status_code=204)
 async def delete_invoice(
         invoice_id: int,
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
 
     try:
         await crud.delete_invoice(session, invoice_id, current_user)
+        pdf_service.invalidate(invoice_id)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -192,7 +272,7 @@ async def delete_invoice(
 async def update_invoice_status(
         invoice_id: int,
         is_paid: bool,
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
 
@@ -204,6 +284,7 @@ async def update_invoice_status(
             update_data,
             current_user
         )
+        pdf_service.invalidate(invoice_id)
         return invoice
     except HTTPException as e:
         raise e
@@ -217,41 +298,46 @@ async def get_invoice_stats(
         shop_id: Optional[int] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        current_user: User = Depends(get_current_user),
+        current_user: TokenData = Depends(get_current_user),
         session: AsyncSession = Depends(get_db)
 ):
 
     try:
-        # Create base query
-        query = select(
-            func.count(Invoice.id).label('total_invoices'),
-            func.sum(Invoice.total_amount).label('total_amount'),
-            func.avg(Invoice.total_amount).label('average_amount'),
-            func.sum(case((Invoice.is_paid, 1), else_=0)).label('paid_invoices'),
-        )
-
         # Apply filters
         if shop_id:
-            has_access = await crud.check_user_shop_access(session, current_user.id, shop_id)
+            has_access = await crud.user_has_shop_access(session, current_user, shop_id)
             if not has_access:
                 raise HTTPException(status_code=403, detail="No access to this shop")
-            query = query.where(Invoice.shop_id == shop_id)
-
-        if start_date:
-            query = query.where(Invoice.created_at >= start_date)
 
-        if end_date:
-            query = query.where(Invoice.created_at <= end_date)
+        def build_stats_query(model):
+            query = select(
+                func.count(model.id).label('total_invoices'),
+                func.sum(model.total_amount).label('total_amount'),
+                func.sum(case((model.is_paid, 1), else_=0)).label('paid_invoices'),
+            )
+            if shop_id:
+                query = query.where(model.shop_id == shop_id)
+            if start_date:
+                query = query.where(model.created_at >= start_date)
+            if end_date:
+                query = query.where(model.created_at <= end_date)
+            return query
 
         # Execute query
-        result = await session.execute(query)
-        stats = result.first()
+        result = await session.execute(build_stats_query(Invoice))
+        stats = [result.first()]
+
+        # Архив читаем только если период его затрагивает
+        horizon = await crud.get_archive_horizon(session)
+        if crud.reaches_archive(horizon, start_date):
+            result = await session.execute(build_stats_query(ArchivedInvoice))
+            stats.append(result.first())
 
         # Безопасное получение значений с обработкой NULL
-        total_invoices = stats.total_invoices or 0
-        total_amount = float(stats.total_amount or 0)
-        average_amount = float(stats.average_amount or 0)
-        paid_invoices = stats.paid_invoices or 0
+        total_invoices = sum(row.total_invoices or 0 for row in stats)
+        total_amount = sum(float(row.total_amount or 0) for row in stats)
+        average_amount = total_amount / total_invoices if total_invoices else 0.0
+        paid_invoices = sum(row.paid_invoices or 0 for row in stats)
 
         return {
             "total_invoices": total_invoices,
@@ -264,3 +350,47 @@ async def get_invoice_stats(
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/analytics/series", response_model=AnalyticsSeries)
+async def get_analytics_series(
+        request: Request,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        shop_id: Optional[int] = None,
+        current_user: TokenData = Depends(get_current_user),
+        session: AsyncSession = Depends(get_db)
+):
+    """Daily revenue, invoice counts and paid totals per shop for charts (last year by default)"""
+    end = end or date.today()
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days >= MAX_SERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"Period is limited to {MAX_SERIES_DAYS} days")
+
+    try:
+        rows = await crud.fetch_daily_series(
+            session,
+            current_user,
+            datetime.combine(start, time.min),
+            datetime.combine(end + timedelta(days=1), time.min),
+            shop_id
+        )
+        columns = list(zip(*rows)) if rows else [[] for _ in range(6)]
+        series = AnalyticsSeries(
+            start=start,
+            end=end,
+            day=columns[0],
+            shop_id=columns[1],
+            revenue=columns[2],
+            invoices=columns[3],
+            paid_invoices=columns[4],
+            paid_amount=columns[5]
+        )
+        return conditional_model_response(request, series)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
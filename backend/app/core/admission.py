@@ -0,0 +1,172 @@
+# admission.py
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Сколько корзин пользователей держать в памяти; самые давние вытесняются
+MAX_TRACKED_CLIENTS = 10000
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second up to `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 on success, otherwise seconds until they are available"""
+        cost = min(cost, self.capacity)
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RouteLimit:
+    """Concurrency limit shared by a group of expensive routes.
+
+    At most `concurrency` requests of the group run at once; up to
+    `max_queue` more wait for a slot, each for at most `queue_timeout`
+    seconds. `cost` is how many bucket tokens one request of the group takes.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            pattern: str,
+            concurrency: int,
+            queue_timeout: float = 2.0,
+            max_queue: Optional[int] = None,
+            methods: Sequence[str] = ("GET",),
+            cost: float = 1.0
+    ):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.concurrency = concurrency
+        self.queue_timeout = queue_timeout
+        self.max_queue = concurrency * 4 if max_queue is None else max_queue
+        self.cost = cost
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.pattern.fullmatch(path) is not None
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; False if the queue is full or the wait timed out"""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class AdmissionControlMiddleware:
+    """Reject requests early instead of letting them queue for a database connection.
+
+    Every client gets a token bucket (keyed by user id from the bearer
+    token, or by address for anonymous requests); an empty bucket answers
+    429, rate <= 0 switches the buckets off. Routes matching a RouteLimit
+    additionally need a concurrency slot; when none frees up within the
+    queue timeout the answer is 503. Both carry Retry-After. The slot is
+    held until the response, including a streamed body, is fully sent.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            rate: float = 10.0,
+            burst: float = 40.0,
+            limits: Sequence[RouteLimit] = (),
+            identify: Optional[Callable[[str], Optional[int]]] = None,
+            exempt_prefixes: Tuple[str, ...] = ("/health",)
+    ) -> None:
+        self.app = app
+        self.rate = rate
+        self.burst = burst
+        self.limits = list(limits)
+        self.identify = identify
+        self.exempt_prefixes = exempt_prefixes
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def client_key(self, scope: Scope) -> str:
+        authorization = Headers(scope=scope).get("authorization", "")
+        if self.identify is not None and authorization[:7].lower() == "bearer ":
+            user_id = self.identify(authorization[7:])
+            if user_id is not None:
+                return f"user:{user_id}"
+        client = scope.get("client")
+        return f"addr:{client[0] if client else 'unknown'}"
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, status_code: int,
+                      detail: str, retry_after: float) -> None:
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        # Preflight-запросы CORS не расходуют лимиты
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or path.startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        limit = next((limit for limit in self.limits if limit.matches(method, path)), None)
+
+        wait = self._bucket(self.client_key(scope)).take(limit.cost if limit else 1.0) if self.rate > 0 else 0.0
+        if wait:
+            await self._reject(scope, receive, send, 429, "Too many requests", wait)
+            return
+
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limit.acquire():
+            await self._reject(scope, receive, send, 503,
+                               f"Server is busy ({limit.name}), try again later", limit.queue_timeout)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
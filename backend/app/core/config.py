@@ -1,6 +1,6 @@
 # config.py
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from pydantic_settings import BaseSettings
@@ -15,6 +15,21 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_PORT: int
 
+    # Server-side PDF rendering
+    PDF_RENDER_WORKERS: int = 2
+    PDF_CACHE_MAX_MB: int = 64
+    # TTF with Cyrillic glyphs; by default the client's front/fonts/DejaVuSans.ttf
+    PDF_FONT_PATH: Optional[str] = None
+
+    # Admission control: per-user token bucket and concurrency of expensive routes.
+    # Sum of the *_CONCURRENCY values should stay below the SQLAlchemy pool size (5 + 10 overflow).
+    RATE_LIMIT_PER_SECOND: float = 10.0
+    RATE_LIMIT_BURST: int = 40
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+    STATS_CONCURRENCY: int = 4
+    LIST_CONCURRENCY: int = 6
+    EXPORT_CONCURRENCY: int = 2
+
     @property
     def DATABASE_URL(self) -> str:
         return f"mysql+aiomysql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
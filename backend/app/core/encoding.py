@@ -0,0 +1,166 @@
+# encoding.py
+import gzip
+import hashlib
+import json
+from typing import List, Optional, Sequence, Union
+
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON is always available
+    msgpack = None
+
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+# Already compressed payloads gain nothing from a second pass
+INCOMPRESSIBLE_TYPES = ("application/pdf", "application/zip", "image/")
+
+
+def _parse_accept_encoding(value: str) -> List[str]:
+    """Return accepted codings ordered by q-value, dropping q=0 entries"""
+    codings = []
+    for position, part in enumerate(value.split(",")):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            codings.append((-quality, position, token))
+    return [token for _, _, token in sorted(codings)]
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best content coding supported by both sides"""
+    for coding in _parse_accept_encoding(accept_encoding):
+        if coding == "br" and brotli is not None:
+            return "br"
+        if coding == "gzip":
+            return "gzip"
+    return None
+
+
+def compress_body(body: bytes, coding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+class CompressionMiddleware:
+    """Compress complete responses with brotli or gzip above a size threshold.
+
+    Streaming responses (more than one body message) are passed through
+    untouched, so archives and other large downloads are never buffered.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 1024,
+            gzip_level: int = 6,
+            brotli_quality: int = 4
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+
+            if (
+                    message.get("more_body", False)
+                    or "content-encoding" in headers
+                    or len(body) < self.minimum_size
+                    or content_type.startswith(INCOMPRESSIBLE_TYPES)
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress_body(body, coding, self.gzip_level, self.brotli_quality)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Check whether the client asked for MessagePack and the server can produce it"""
+    return msgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _dump_models(payload: Union[BaseModel, Sequence[BaseModel]]):
+    if isinstance(payload, BaseModel):
+        return payload.model_dump(mode="json")
+    return [model.model_dump(mode="json") for model in payload]
+
+
+def conditional_model_response(request: Request, payload: Union[BaseModel, Sequence[BaseModel]]) -> Response:
+    """Serialize models as MessagePack or JSON with an ETag of the body.
+
+    Answers 304 without a body when If-None-Match already holds that ETag, so
+    clients revalidating a cached copy skip the download.
+    """
+    data = _dump_models(payload)
+    if wants_msgpack(request):
+        body = msgpack.packb(data, use_bin_type=True)
+        media_type = MSGPACK_MEDIA_TYPE
+    else:
+        body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        media_type = "application/json"
+
+    # Weak: the compression middleware may re-encode the body
+    etag = f'W/"{hashlib.sha256(body).hexdigest()[:20]}"'
+    headers = {"ETag": etag, "Vary": "Accept", "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
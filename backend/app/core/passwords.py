@@ -0,0 +1,19 @@
+# passwords.py
+"""
+bcrypt hashing for bulk operations.
+
+Kept free of application imports so process-pool workers can load it
+without pulling in the database engine or settings.
+"""
+from typing import List, Sequence
+
+import bcrypt
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def hash_passwords(passwords: Sequence[str]) -> List[str]:
+    """Hash a chunk of passwords; one call per pool task keeps pickling overhead low"""
+    return [hash_password(password) for password in passwords]
@@ -0,0 +1,35 @@
+# timing.py
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class ServerTimingMiddleware:
+    """Add a Server-Timing header with the time spent producing the response.
+
+    The duration runs until the response headers are sent, so for complete
+    (possibly compressed) responses it covers handler, database and
+    encoding time. Clients subtract it from their time-to-first-byte to
+    separate network latency from server work.
+    """
+
+    def __init__(self, app: ASGIApp, metric: str = "app") -> None:
+        self.app = app
+        self.metric = metric
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                duration = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append("Server-Timing", f"{self.metric};dur={duration:.1f}")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,66 +1,86 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException, Depends
-from sqlalchemy import select, and_, or_, delete
+from sqlalchemy import select, and_, or_, delete, func, cast, case, String
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 from pydantic import BaseModel
 
-from app.models.models import users_shops, User, Invoice, InvoiceItem, Shop
-from app.schemas.schemas import InvoiceCreate, InvoiceUpdate, InvoiceFilter
+from app.models.models import users_shops, Invoice, InvoiceItem, Shop, ArchivedInvoice
+from app.schemas.schemas import InvoiceCreate, InvoiceUpdate, InvoiceFilter, TokenData
 
 
 # --- Helper functions ---
 async def insert_invoice(
         session: AsyncSession,
         invoice_data: InvoiceCreate,
-        current_user: User
+        current_user: TokenData
 ) -> Invoice:
-    """Create new invoice with proper relationship loading"""
-    async with session.begin_nested():
-        # Проверяем доступ к магазину
-        has_access = await check_user_shop_access(
-            session,
-            current_user.id,
-            invoice_data.shop_id
-        )
-        if not has_access:
-            raise HTTPException(status_code=403, detail="No access to this shop")
-
-        # Получаем магазин для проверки
-        shop_query = select(Shop).where(Shop.id == invoice_data.shop_id)
-        shop_result = await session.execute(shop_query)
-        shop = shop_result.scalar_one_or_none()
-
-        if not shop:
-            raise HTTPException(status_code=404, detail="Shop not found")
-
-        # Создаем инвойс
-        new_invoice = Invoice(
-            shop_id=invoice_data.shop_id,
-            user_id=current_user.id,
-            contact_info=invoice_data.contact_info,
-            additional_info=invoice_data.additional_info,
-            total_amount=invoice_data.total_amount,
-            is_paid=invoice_data.is_paid
-        )
-
-        session.add(new_invoice)
-        await session.flush()
-
-        # Создаем items если они есть
-        if hasattr(invoice_data, 'items'):
-            for item_data in invoice_data.items:
-                item = InvoiceItem(
-                    invoice_id=new_invoice.id,
-                    name=item_data.name,
-                    quantity=item_data.quantity,
-                    price=item_data.price,
-                    total=item_data.total
-                )
-                session.add(item)
+    """Create new invoice with proper relationship loading.
+
+    A repeated client_key returns the invoice the first request created.
+    """
+    if invoice_data.client_key:
+        existing = await _fetch_by_client_key(session, invoice_data.client_key, current_user)
+        if existing is not None:
+            return existing
+
+    try:
+        async with session.begin_nested():
+            # Проверяем доступ к магазину
+            has_access = await user_has_shop_access(
+                session,
+                current_user,
+                invoice_data.shop_id
+            )
+            if not has_access:
+                raise HTTPException(status_code=403, detail="No access to this shop")
+
+            # Получаем магазин для проверки
+            shop_query = select(Shop).where(Shop.id == invoice_data.shop_id)
+            shop_result = await session.execute(shop_query)
+            shop = shop_result.scalar_one_or_none()
+
+            if not shop:
+                raise HTTPException(status_code=404, detail="Shop not found")
+
+            # Создаем инвойс
+            new_invoice = Invoice(
+                shop_id=invoice_data.shop_id,
+                user_id=current_user.id,
+                contact_info=invoice_data.contact_info,
+                additional_info=invoice_data.additional_info,
+                total_amount=invoice_data.total_amount,
+                is_paid=invoice_data.is_paid,
+                client_key=invoice_data.client_key
+            )
 
-    await session.commit()
+            session.add(new_invoice)
+            await session.flush()
+
+            # Создаем items если они есть
+            if hasattr(invoice_data, 'items'):
+                for item_data in invoice_data.items:
+                    item = InvoiceItem(
+                        invoice_id=new_invoice.id,
+                        name=item_data.name,
+                        quantity=item_data.quantity,
+                        price=item_data.price,
+                        total=item_data.total
+                    )
+                    session.add(item)
+
+        await session.commit()
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел создать накладную первым
+        await session.rollback()
+        existing = None
+        if invoice_data.client_key:
+            existing = await _fetch_by_client_key(session, invoice_data.client_key, current_user)
+        if existing is None:
+            raise
+        return existing
 
     # Загружаем полные данные для ответа
     query = select(Invoice).options(
@@ -76,6 +96,24 @@ async def insert_invoice(
     return invoice
 
 
+async def _fetch_by_client_key(
+        session: AsyncSession,
+        client_key: str,
+        current_user: TokenData
+) -> Optional[Invoice]:
+    """Invoice created earlier with this client_key, loaded like insert_invoice's result"""
+    query = select(Invoice).options(
+        selectinload(Invoice.shop),
+        selectinload(Invoice.items)
+    ).where(Invoice.client_key == client_key)
+    result = await session.execute(query)
+    invoice = result.unique().scalar_one_or_none()
+
+    if invoice is not None and invoice.user_id != current_user.id:
+        raise HTTPException(status_code=409, detail="client_key is already used")
+    return invoice
+
+
 async def check_user_shop_access(
         session: AsyncSession,
         user_id: int,
@@ -92,11 +130,19 @@ async def check_user_shop_access(
     return result.first() is not None
 
 
+async def user_has_shop_access(session: AsyncSession, current_user: TokenData, shop_id: int) -> bool:
+    """Shop access check that uses the shop ids from the access token when it has them"""
+    shop_ids = current_user.shop_ids
+    if shop_ids is not None:
+        return shop_id in shop_ids
+    return await check_user_shop_access(session, current_user.id, shop_id)
+
+
 async def update_invoice(
         session: AsyncSession,
         invoice_id: int,
         invoice_data: InvoiceUpdate,
-        current_user: User
+        current_user: TokenData
 ) -> Invoice:
     """Update existing invoice"""
     async with session.begin_nested():
@@ -110,7 +156,7 @@ async def update_invoice(
         invoice = result.scalar_one_or_none()
 
         if not invoice:
-            raise HTTPException(status_code=404, detail="Invoice not found")
+            await _raise_missing_invoice(session, invoice_id)
 
         # Проверяем права
         if not current_user.is_superuser:
@@ -148,6 +194,9 @@ async def update_invoice(
             # Обновляем общую сумму
             invoice.total_amount = total_amount
 
+        # Замена позиций не меняет саму строку, поэтому время изменения ставим явно
+        invoice.updated_at = func.now()
+
     # Коммитим изменения
     await session.commit()
 
@@ -166,7 +215,7 @@ async def update_invoice(
 async def delete_invoice(
         session: AsyncSession,
         invoice_id: int,
-        current_user: User
+        current_user: TokenData
 ) -> bool:
     """Delete invoice"""
     # Get invoice
@@ -175,7 +224,7 @@ async def delete_invoice(
     invoice = result.scalar_one_or_none()
 
     if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+        await _raise_missing_invoice(session, invoice_id)
 
     # Check permissions
     if not current_user.is_superuser:
@@ -189,7 +238,7 @@ async def delete_invoice(
 async def fetch_invoice(
         session: AsyncSession,
         invoice_id: int,
-        current_user: User
+        current_user: TokenData
 ) -> Invoice:
     """Fetch single invoice with all related data"""
     query = select(Invoice).options(
@@ -201,76 +250,273 @@ async def fetch_invoice(
     result = await session.execute(query)
     invoice = result.unique().scalar_one_or_none()
 
+    if not invoice:
+        # Closed periods live in the archive table under the same id
+        archive_query = select(ArchivedInvoice).options(
+            joinedload(ArchivedInvoice.items),
+            joinedload(ArchivedInvoice.shop),
+            joinedload(ArchivedInvoice.user)
+        ).where(ArchivedInvoice.id == invoice_id)
+
+        result = await session.execute(archive_query)
+        invoice = result.unique().scalar_one_or_none()
+
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
     # Check if user has access to the shop
-    has_access = await check_user_shop_access(session, current_user.id, invoice.shop_id)
+    has_access = await user_has_shop_access(session, current_user, invoice.shop_id)
     if not has_access:
         raise HTTPException(status_code=403, detail="No access to this invoice")
 
     return invoice
 
 
-async def fetch_invoices_with_filters(
-        session: AsyncSession,
-        current_user: User,
-        filters: InvoiceFilter,
-        skip: int = 0,
-        limit: int = 100
-) -> List[Invoice]:
-    """Fetch invoices with filters"""
-    # Start building query
-    query = select(Invoice).options(
-        joinedload(Invoice.items),
-        joinedload(Invoice.shop),
-        joinedload(Invoice.user)
-    )
-
-    # Get all shops user has access to
-    shops_query = select(users_shops.c.shop_id).where(
-        users_shops.c.user_id == current_user.id
-    )
-    result = await session.execute(shops_query)
-    accessible_shops = [row[0] for row in result.fetchall()]
-
-    # Base filter by accessible shops
-    query = query.where(Invoice.shop_id.in_(accessible_shops))
+def _apply_invoice_filters(query, model, filters: InvoiceFilter, accessible_shops: List[int]):
+    """Apply list filters to a query over Invoice or ArchivedInvoice"""
+    query = query.where(model.shop_id.in_(accessible_shops))
 
-    # Apply filters
     if filters.shop_id:
-        if filters.shop_id not in accessible_shops:
-            raise HTTPException(status_code=403, detail="No access to this shop")
-        query = query.where(Invoice.shop_id == filters.shop_id)
+        query = query.where(model.shop_id == filters.shop_id)
 
     if filters.is_paid is not None:
-        query = query.where(Invoice.is_paid == filters.is_paid)
+        query = query.where(model.is_paid == filters.is_paid)
 
     if filters.created_after:
-        query = query.where(Invoice.created_at >= filters.created_after)
+        query = query.where(model.created_at >= filters.created_after)
 
     if filters.created_before:
-        query = query.where(Invoice.created_at <= filters.created_before)
+        query = query.where(model.created_at <= filters.created_before)
 
     if filters.min_amount is not None:
-        query = query.where(Invoice.total_amount >= filters.min_amount)
+        query = query.where(model.total_amount >= filters.min_amount)
 
     if filters.max_amount is not None:
-        query = query.where(Invoice.total_amount <= filters.max_amount)
+        query = query.where(model.total_amount <= filters.max_amount)
 
-    # Add sorting by date
-    query = query.order_by(Invoice.created_at.desc())
+    # Substring search, case-insensitive like the client's filter panel
+    if filters.contact:
+        query = query.where(
+            func.lower(model.contact_info).contains(filters.contact.strip().lower(), autoescape=True)
+        )
+
+    if filters.number:
+        query = query.where(cast(model.id, String).contains(filters.number.strip(), autoescape=True))
+
+    return query
+
+
+async def get_archive_horizon(session: AsyncSession) -> Optional[datetime]:
+    """Return the newest created_at in the archive, or None if nothing is archived.
+
+    Every hot invoice is newer than this value, so a query starting after it
+    never needs to read the archive.
+    """
+    result = await session.execute(select(func.max(ArchivedInvoice.created_at)))
+    return result.scalar()
+
+
+def reaches_archive(horizon: Optional[datetime], created_after: Optional[datetime]) -> bool:
+    """Check whether a period starting at created_after overlaps archived data"""
+    if horizon is None:
+        return False
+    if created_after is None:
+        return True
+    return created_after.replace(tzinfo=None) <= horizon.replace(tzinfo=None)
+
+
+async def _raise_missing_invoice(session: AsyncSession, invoice_id: int) -> None:
+    """Raise 409 for invoices from archived periods and 404 otherwise"""
+    query = select(ArchivedInvoice.id).where(ArchivedInvoice.id == invoice_id)
+    result = await session.execute(query)
+    if result.first() is not None:
+        raise HTTPException(status_code=409, detail="Invoice belongs to an archived period")
+    raise HTTPException(status_code=404, detail="Invoice not found")
+
+
+async def fetch_accessible_shop_ids(session: AsyncSession, user_id: int) -> List[int]:
+    """Get all shops user has access to"""
+    shops_query = select(users_shops.c.shop_id).where(
+        users_shops.c.user_id == user_id
+    )
+    result = await session.execute(shops_query)
+    return [row[0] for row in result.fetchall()]
+
+
+async def user_accessible_shop_ids(session: AsyncSession, current_user: TokenData) -> List[int]:
+    """Accessible shops from the access token, or from the database for older tokens"""
+    shop_ids = current_user.shop_ids
+    if shop_ids is not None:
+        return sorted(shop_ids)
+    return await fetch_accessible_shop_ids(session, current_user.id)
+
+
+async def fetch_invoices_with_filters(
+        session: AsyncSession,
+        current_user: TokenData,
+        filters: InvoiceFilter,
+        skip: int = 0,
+        limit: int = 100
+) -> List[Invoice]:
+    """Fetch invoices with filters.
+
+    Recent invoices are served from the hot table alone. Archived invoices are
+    only read once the requested page runs past the end of the hot rows.
+    With updated_after only invoices changed since then are returned, oldest
+    change first; archived invoices never change and are not included.
+    """
+    accessible_shops = await user_accessible_shop_ids(session, current_user)
 
-    # Add pagination
+    if filters.shop_id and filters.shop_id not in accessible_shops:
+        raise HTTPException(status_code=403, detail="No access to this shop")
+
+    # Hot table, sorted by date
+    query = select(Invoice).options(
+        joinedload(Invoice.items),
+        joinedload(Invoice.shop),
+        joinedload(Invoice.user)
+    )
+    query = _apply_invoice_filters(query, Invoice, filters, accessible_shops)
+    if filters.updated_after:
+        query = query.where(Invoice.updated_at >= filters.updated_after)
+        query = query.order_by(Invoice.updated_at, Invoice.id)
+    else:
+        # id breaks ties so that pages do not overlap or skip rows
+        query = query.order_by(Invoice.created_at.desc(), Invoice.id.desc())
     query = query.offset(skip).limit(limit)
 
-    # Execute query
     result = await session.execute(query)
-    invoices = result.unique().scalars().all()
+    invoices = list(result.unique().scalars().all())
+
+    if len(invoices) < limit and not filters.updated_after:
+        horizon = await get_archive_horizon(session)
+        if reaches_archive(horizon, filters.created_after):
+            # Archived rows are all older than hot rows, so they continue the page
+            if invoices:
+                archive_skip = 0
+            else:
+                count_query = _apply_invoice_filters(
+                    select(func.count(Invoice.id)), Invoice, filters, accessible_shops
+                )
+                result = await session.execute(count_query)
+                archive_skip = max(skip - (result.scalar() or 0), 0)
+
+            archive_query = select(ArchivedInvoice).options(
+                joinedload(ArchivedInvoice.items),
+                joinedload(ArchivedInvoice.shop),
+                joinedload(ArchivedInvoice.user)
+            )
+            archive_query = _apply_invoice_filters(archive_query, ArchivedInvoice, filters, accessible_shops)
+            archive_query = archive_query.order_by(
+                ArchivedInvoice.created_at.desc(), ArchivedInvoice.id.desc()
+            ).offset(archive_skip).limit(limit - len(invoices))
+
+            result = await session.execute(archive_query)
+            invoices.extend(result.unique().scalars().all())
 
     # Add formatted dates
     for invoice in invoices:
         if hasattr(invoice, 'created_at') and invoice.created_at:
             invoice.formatted_date = invoice.created_at.strftime("%d-%m-%y %H:%M")
 
-    return invoices
\ No newline at end of file
+    return invoices
+
+
+async def fetch_daily_series(
+        session: AsyncSession,
+        current_user: TokenData,
+        start: datetime,
+        end: datetime,
+        shop_id: Optional[int] = None
+) -> List[Tuple]:
+    """Return (day, shop_id, revenue, invoices, paid_invoices, paid_amount) rows for [start, end).
+
+    Aggregation happens in the database, one row per day and shop, so the
+    response size depends on the period length and not on the invoice count.
+    """
+    accessible_shops = await user_accessible_shop_ids(session, current_user)
+
+    if shop_id and shop_id not in accessible_shops:
+        raise HTTPException(status_code=403, detail="No access to this shop")
+    shop_ids = [shop_id] if shop_id else accessible_shops
+    if not shop_ids:
+        return []
+
+    def build_series_query(model):
+        day = func.date(model.created_at).label('day')
+        return select(
+            day,
+            model.shop_id,
+            func.sum(model.total_amount).label('revenue'),
+            func.count(model.id).label('invoices'),
+            func.sum(case((model.is_paid, 1), else_=0)).label('paid_invoices'),
+            func.sum(case((model.is_paid, model.total_amount), else_=0)).label('paid_amount'),
+        ).where(
+            model.shop_id.in_(shop_ids),
+            model.created_at >= start,
+            model.created_at < end
+        ).group_by(day, model.shop_id)
+
+    models = [Invoice]
+    horizon = await get_archive_horizon(session)
+    if reaches_archive(horizon, start):
+        models.append(ArchivedInvoice)
+
+    # День на границе архива может встретиться в обеих таблицах: складываем
+    totals: Dict[Tuple, List] = {}
+    for model in models:
+        result = await session.execute(build_series_query(model))
+        for row in result.fetchall():
+            values = totals.setdefault((row.day, row.shop_id), [0.0, 0, 0, 0.0])
+            values[0] += float(row.revenue or 0)
+            values[1] += row.invoices or 0
+            values[2] += int(row.paid_invoices or 0)
+            values[3] += float(row.paid_amount or 0)
+
+    return [(day, shop, *values) for (day, shop), values in sorted(totals.items())]
+
+
+async def fetch_export_invoice_refs(
+        session: AsyncSession,
+        current_user: TokenData,
+        filters: InvoiceFilter
+) -> List[Tuple[bool, int]]:
+    """Return (is_archived, invoice_id) for every invoice matching filters, oldest first.
+
+    Only ids are loaded here; the export streams full invoices in batches.
+    """
+    accessible_shops = await user_accessible_shop_ids(session, current_user)
+
+    if filters.shop_id and filters.shop_id not in accessible_shops:
+        raise HTTPException(status_code=403, detail="No access to this shop")
+
+    refs: List[Tuple[bool, int]] = []
+
+    horizon = await get_archive_horizon(session)
+    if reaches_archive(horizon, filters.created_after):
+        archive_query = _apply_invoice_filters(
+            select(ArchivedInvoice.id), ArchivedInvoice, filters, accessible_shops
+        ).order_by(ArchivedInvoice.created_at, ArchivedInvoice.id)
+        result = await session.execute(archive_query)
+        refs.extend((True, row[0]) for row in result.fetchall())
+
+    query = _apply_invoice_filters(
+        select(Invoice.id), Invoice, filters, accessible_shops
+    ).order_by(Invoice.created_at, Invoice.id)
+    result = await session.execute(query)
+    refs.extend((False, row[0]) for row in result.fetchall())
+
+    return refs
+
+
+async def fetch_invoices_by_ids(
+        session: AsyncSession,
+        invoice_ids: List[int],
+        archived: bool = False
+) -> List[Invoice]:
+    """Load invoices with items, preserving the order of invoice_ids"""
+    model = ArchivedInvoice if archived else Invoice
+    query = select(model).options(selectinload(model.items)).where(model.id.in_(invoice_ids))
+    result = await session.execute(query)
+    by_id = {invoice.id: invoice for invoice in result.scalars().all()}
+    return [by_id[invoice_id] for invoice_id in invoice_ids if invoice_id in by_id]
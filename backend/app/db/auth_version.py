@@ -0,0 +1,38 @@
+# auth_version.py
+"""
+Statements that bump users.auth_version.
+
+Access tokens carry the user's shop ids and the auth_version they were
+issued with. Whatever changes a user's rights outside the API (the admin
+panel, bulk imports) must bump the version, so tokens issued before the
+change stop being accepted.
+"""
+from typing import Iterable
+
+from sqlalchemy import Update, select, update
+
+from app.models.models import User, users_shops
+
+
+def bump_auth_version(user_ids: Iterable[int]) -> Update:
+    """UPDATE that invalidates the tokens of the given users"""
+    return (
+        update(User)
+        .where(User.id.in_(list(user_ids)))
+        .values(auth_version=User.auth_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bump_shop_users_auth_version(shop_id: int) -> Update:
+    """UPDATE that invalidates the tokens of everyone assigned to the shop.
+
+    Must run before the assignments are removed (e.g. before the shop is deleted).
+    """
+    assigned = select(users_shops.c.user_id).where(users_shops.c.shop_id == shop_id)
+    return (
+        update(User)
+        .where(User.id.in_(assigned))
+        .values(auth_version=User.auth_version + 1)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,314 @@
+# bulk_import.py
+"""
+Bulk import of users, shops and user-shop assignments from CSV files.
+
+Files are streamed and handled in batches. Each batch is validated,
+checked against existing rows with one query and written with a single
+multi-row INSERT. Passwords are hashed in a process pool, one chunk per
+worker. Inserts use INSERT IGNORE, so rows that appear concurrently (and
+assignment pairs that already exist) are skipped instead of failing the
+batch.
+
+CSV files need a header row:
+  users:       login, password, email [, phone, is_superuser]
+  shops:       name [, is_active, additional_info]
+  assignments: login and shop_id or shop (shop name)
+"""
+import asyncio
+import csv
+import math
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Update, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import engine
+from app.db.auth_version import bump_auth_version
+from app.core.passwords import hash_passwords
+from app.models.models import Shop, User, users_shops
+
+IMPORT_KINDS = ("shops", "users", "assignments")
+DEFAULT_BATCH_SIZE = 500
+TRUE_VALUES = frozenset({"1", "true", "yes", "y", "да"})
+
+REQUIRED_COLUMNS = {
+    "users": {"login", "password", "email"},
+    "shops": {"name"},
+    "assignments": {"login"},
+}
+
+Row = Tuple[int, Dict[str, str]]
+
+
+class ImportReport:
+    """Running totals of one import; the progress callback gets it after every batch"""
+
+    def __init__(self, kind: str, path: str):
+        self.kind = kind
+        self.path = path
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        self.rows = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.bytes_read / self.total_bytes) if self.total_bytes else 1.0
+
+    def error(self, line: int, message: str) -> None:
+        self.errors.append((line, message))
+
+    def summary(self) -> str:
+        return (f"{self.kind}: {self.rows} rows, {self.inserted} inserted, "
+                f"{self.skipped} skipped as existing, {len(self.errors)} errors")
+
+
+ProgressCallback = Callable[[ImportReport], None]
+
+
+def parse_bool(value: Optional[str], default: bool = False) -> bool:
+    return value.strip().lower() in TRUE_VALUES if value else default
+
+
+def read_batches(path: str, batch_size: int, report: ImportReport) -> Iterator[List[Row]]:
+    """Yield lists of (line number, row) with lower-cased column names"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        def lines():
+            for line in f:
+                report.bytes_read += len(line.encode("utf-8"))
+                yield line
+
+        reader = csv.DictReader(lines())
+        columns = {name.strip().lower() for name in reader.fieldnames or ()}
+        missing = REQUIRED_COLUMNS[report.kind] - columns
+        if report.kind == "assignments" and not columns & {"shop_id", "shop"}:
+            missing.add("shop_id or shop")
+        if missing:
+            raise ValueError(f"{path}: missing columns: {', '.join(sorted(missing))}")
+
+        batch: List[Row] = []
+        for row in reader:
+            batch.append((reader.line_num, {
+                key.strip().lower(): (value or "").strip()
+                for key, value in row.items() if key is not None
+            }))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        # Байты BOM и перевода строк при чтении текста не учитываются точно
+        report.bytes_read = report.total_bytes
+        if batch:
+            yield batch
+
+
+async def hash_all(passwords: Sequence[str], pool: Executor, workers: int) -> List[str]:
+    """Hash passwords in parallel chunks, preserving order"""
+    if not passwords:
+        return []
+    loop = asyncio.get_running_loop()
+    size = math.ceil(len(passwords) / workers)
+    chunks = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    results = await asyncio.gather(*(loop.run_in_executor(pool, hash_passwords, chunk) for chunk in chunks))
+    return [hashed for chunk in results for hashed in chunk]
+
+
+async def _insert_ignore(current_engine: AsyncEngine, table, values: List[dict], report: ImportReport,
+                         then: Optional[Update] = None) -> None:
+    """then - extra statement executed in the same transaction"""
+    if not values:
+        return
+    async with current_engine.begin() as conn:
+        result = await conn.execute(insert(table).prefix_with("IGNORE", dialect="mysql").values(values))
+        if then is not None:
+            await conn.execute(then)
+    inserted = result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(values)
+    report.inserted += inserted
+    report.skipped += len(values) - inserted
+
+
+async def _import_users(current_engine: AsyncEngine, batch: List[Row], report: ImportReport,
+                        pool: Executor, workers: int) -> None:
+    valid: List[Row] = []
+    logins, emails = set(), set()
+    for line, row in batch:
+        login, email = row.get("login", ""), row.get("email", "")
+        if not login or not row.get("password") or not email:
+            report.error(line, "login, password and email are required")
+        elif len(login) > 50 or len(email) > 100 or len(row.get("phone", "")) > 20:
+            report.error(line, "login, email or phone is too long")
+        elif "@" not in email:
+            report.error(line, f"invalid email: {email}")
+        elif login in logins or email in emails:
+            report.error(line, "duplicate login or email in the file")
+        else:
+            logins.add(login)
+            emails.add(email)
+            valid.append((line, row))
+    if not valid:
+        return
+
+    async with current_engine.connect() as conn:
+        result = await conn.execute(
+            select(User.login, User.email).where(or_(User.login.in_(logins), User.email.in_(emails)))
+        )
+        existing = result.all()
+    taken_logins = {row.login for row in existing}
+    taken_emails = {row.email for row in existing}
+
+    new: List[Row] = []
+    for line, row in valid:
+        if row["login"] in taken_logins or row["email"] in taken_emails:
+            report.error(line, "user with this login or email already exists")
+        else:
+            new.append((line, row))
+
+    # Хеширование - вне транзакции, чтобы не держать соединение
+    hashes = await hash_all([row["password"] for _, row in new], pool, workers)
+    await _insert_ignore(current_engine, User.__table__, [
+        {
+            "login": row["login"],
+            "password": hashed,
+            "email": row["email"],
+            "phone": row.get("phone") or None,
+            "is_active": True,
+            "is_superuser": parse_bool(row.get("is_superuser")),
+        }
+        for (_, row), hashed in zip(new, hashes)
+    ], report)
+
+
+async def _import_shops(current_engine: AsyncEngine, batch: List[Row], report: ImportReport) -> None:
+    valid: List[Row] = []
+    names = set()
+    for line, row in batch:
+        name = row.get("name", "")
+        if not name:
+            report.error(line, "name is required")
+        elif len(name) > 100:
+            report.error(line, "name is too long")
+        elif name in names:
+            report.error(line, "duplicate shop name in the file")
+        else:
+            names.add(name)
+            valid.append((line, row))
+    if not valid:
+        return
+
+    # Повторный запуск импорта не должен создавать магазины-дубликаты
+    async with current_engine.connect() as conn:
+        result = await conn.execute(select(Shop.name).where(Shop.name.in_(names)))
+        existing = set(result.scalars())
+
+    values = []
+    for line, row in valid:
+        if row["name"] in existing:
+            report.error(line, "shop with this name already exists")
+            continue
+        values.append({
+            "name": row["name"],
+            "is_active": parse_bool(row.get("is_active"), default=True),
+            "additional_info": row.get("additional_info") or None,
+        })
+    await _insert_ignore(current_engine, Shop.__table__, values, report)
+
+
+async def _import_assignments(current_engine: AsyncEngine, batch: List[Row], report: ImportReport) -> None:
+    logins = {row.get("login", "") for _, row in batch} - {""}
+    shop_ids = {int(row["shop_id"]) for _, row in batch if row.get("shop_id", "").isdigit()}
+    shop_names = {row.get("shop", "") for _, row in batch if not row.get("shop_id")} - {""}
+
+    async with current_engine.connect() as conn:
+        result = await conn.execute(select(User.login, User.id).where(User.login.in_(logins)))
+        user_ids = dict(result.all())
+        result = await conn.execute(
+            select(Shop.id, Shop.name).where(or_(Shop.id.in_(shop_ids), Shop.name.in_(shop_names)))
+        )
+        shops = result.all()
+    known_shop_ids = {row.id for row in shops}
+    ids_by_name: Dict[str, List[int]] = {}
+    for row in shops:
+        ids_by_name.setdefault(row.name, []).append(row.id)
+
+    pairs = set()
+    for line, row in batch:
+        user_id = user_ids.get(row.get("login", ""))
+        if user_id is None:
+            report.error(line, f"unknown user: {row.get('login', '')}")
+            continue
+
+        if row.get("shop_id"):
+            shop_id = int(row["shop_id"]) if row["shop_id"].isdigit() else None
+            if shop_id not in known_shop_ids:
+                report.error(line, f"unknown shop id: {row['shop_id']}")
+                continue
+        else:
+            matches = ids_by_name.get(row.get("shop", ""), [])
+            if len(matches) != 1:
+                report.error(line, f"{'ambiguous' if matches else 'unknown'} shop name: {row.get('shop', '')}")
+                continue
+            shop_id = matches[0]
+
+        if (user_id, shop_id) in pairs:
+            report.skipped += 1
+        pairs.add((user_id, shop_id))
+
+    # Выданные раньше токены не содержат новых магазинов
+    await _insert_ignore(current_engine, users_shops, [
+        {"user_id": user_id, "shop_id": shop_id} for user_id, shop_id in sorted(pairs)
+    ], report, then=bump_auth_version({user_id for user_id, _ in pairs}))
+
+
+async def import_csv(
+        kind: str,
+        path: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        workers: Optional[int] = None,
+        progress: Optional[ProgressCallback] = None,
+        engine_instance: Optional[AsyncEngine] = None
+) -> ImportReport:
+    """Import one CSV file of the given kind ("users", "shops" or "assignments").
+
+    Every batch is committed on its own, so a failure keeps the batches
+    already written. Invalid rows are reported in ImportReport.errors with
+    their line numbers and do not stop the import.
+    """
+    if kind not in IMPORT_KINDS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    current_engine = engine_instance or engine
+    report = ImportReport(kind, path)
+    workers = workers or os.cpu_count() or 1
+
+    pool: Optional[ProcessPoolExecutor] = None
+    if kind == "users":
+        # spawn: импорт запускается и из многопоточной панели администратора
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        for batch in read_batches(path, batch_size, report):
+            report.rows += len(batch)
+            if kind == "users":
+                await _import_users(current_engine, batch, report, pool, workers)
+            elif kind == "shops":
+                await _import_shops(current_engine, batch, report)
+            else:
+                await _import_assignments(current_engine, batch, report)
+            if progress:
+                progress(report)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return report
+
+
+def write_errors(reports: Sequence[ImportReport], path: str) -> None:
+    """Save per-row errors as CSV: file, line, message"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "line", "message"])
+        for report in reports:
+            for line, message in report.errors:
+                writer.writerow([report.path, line, message])
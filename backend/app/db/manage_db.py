@@ -1,11 +1,14 @@
 from sqlalchemy.ext.asyncio import AsyncEngine
+import argparse
 import asyncio
+from datetime import datetime
 from typing import Optional
-from sqlalchemy import text
+from sqlalchemy import text, select, insert, delete
 
 # Import your models and database configuration
-from app.models.models import Base, User, Shop, Invoice, InvoiceItem
+from app.models.models import Base, User, Shop, Invoice, InvoiceItem, ArchivedInvoice, ArchivedInvoiceItem
 from app.core.config import engine, init_db
+from app.db.bulk_import import DEFAULT_BATCH_SIZE, IMPORT_KINDS, ImportReport, import_csv, write_errors
 
 
 async def drop_all_tables_async(engine_instance: Optional[AsyncEngine] = None) -> None:
@@ -45,7 +48,10 @@ async def create_tables_async(engine_instance: Optional[AsyncEngine] = None) ->
 async def verify_tables_async(engine_instance: Optional[AsyncEngine] = None) -> None:
     """Verify that all required tables were created correctly"""
     current_engine = engine_instance or engine
-    expected_tables = {'users', 'shops', 'users_shops', 'invoices', 'invoice_items'}
+    expected_tables = {
+        'users', 'shops', 'users_shops', 'invoices', 'invoice_items',
+        'invoices_archive', 'invoice_items_archive', 'refresh_tokens'
+    }
 
     try:
         async with current_engine.connect() as conn:
@@ -108,12 +114,162 @@ async def initialize_database() -> None:
         await engine.dispose()
 
 
+def closed_period_cutoff(keep_months: int = 1, now: Optional[datetime] = None) -> datetime:
+    """Return the first day of the oldest month that stays in the hot tables"""
+    now = now or datetime.now()
+    month_index = now.year * 12 + (now.month - 1) - max(keep_months - 1, 0)
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+async def archive_closed_periods(
+        keep_months: int = 1,
+        batch_size: int = 1000,
+        engine_instance: Optional[AsyncEngine] = None
+) -> int:
+    """Move invoices of closed months and their items into the archive tables.
+
+    Each batch is copied and removed in one transaction, so an interrupted run
+    leaves every invoice in exactly one of the two tables.
+    """
+    current_engine = engine_instance or engine
+    cutoff = closed_period_cutoff(keep_months)
+
+    invoices = Invoice.__table__
+    items = InvoiceItem.__table__
+    # Служебные колонки синхронизации (updated_at, client_key) в архив не переносятся
+    archived = ArchivedInvoice.__table__
+    invoice_columns = [column.name for column in invoices.columns if column.name in archived.columns]
+    item_columns = [column.name for column in items.columns]
+
+    print(f"Archiving invoices created before {cutoff:%Y-%m-%d}...")
+    moved = 0
+
+    try:
+        while True:
+            async with current_engine.begin() as conn:
+                result = await conn.execute(
+                    select(invoices.c.id)
+                    .where(invoices.c.created_at < cutoff)
+                    .order_by(invoices.c.id)
+                    .limit(batch_size)
+                )
+                invoice_ids = [row[0] for row in result.fetchall()]
+                if not invoice_ids:
+                    break
+
+                await conn.execute(
+                    insert(ArchivedInvoice.__table__).from_select(
+                        invoice_columns,
+                        select(*[invoices.c[name] for name in invoice_columns])
+                        .where(invoices.c.id.in_(invoice_ids))
+                    )
+                )
+                await conn.execute(
+                    insert(ArchivedInvoiceItem.__table__).from_select(
+                        item_columns,
+                        select(*[items.c[name] for name in item_columns])
+                        .where(items.c.invoice_id.in_(invoice_ids))
+                    )
+                )
+                await conn.execute(delete(items).where(items.c.invoice_id.in_(invoice_ids)))
+                await conn.execute(delete(invoices).where(invoices.c.id.in_(invoice_ids)))
+
+            moved += len(invoice_ids)
+            print(f"- moved {moved} invoices")
+
+        print(f"Archival completed: {moved} invoices moved")
+        return moved
+    except Exception as e:
+        print(f"Error archiving invoices: {str(e)}")
+        raise
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Database management commands")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("init", help="Drop and recreate all tables (default)")
+
+    archive_parser = subparsers.add_parser("archive", help="Move closed months into the archive tables")
+    archive_parser.add_argument(
+        "--keep-months", type=int, default=1,
+        help="Number of most recent months to keep in the hot tables (default: 1, the current month)"
+    )
+    archive_parser.add_argument(
+        "--batch-size", type=int, default=1000,
+        help="Invoices moved per transaction (default: 1000)"
+    )
+
+    import_parser = subparsers.add_parser(
+        "import", help="Bulk import users, shops and assignments from CSV (shops, then users, then assignments)"
+    )
+    import_parser.add_argument("--users", help="CSV with login,password,email[,phone,is_superuser]")
+    import_parser.add_argument("--shops", help="CSV with name[,is_active,additional_info]")
+    import_parser.add_argument("--assignments", help="CSV with login and shop_id or shop (name)")
+    import_parser.add_argument(
+        "--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+        help=f"Rows per multi-row INSERT (default: {DEFAULT_BATCH_SIZE})"
+    )
+    import_parser.add_argument(
+        "--workers", type=int, default=None,
+        help="Processes for password hashing (default: number of CPUs)"
+    )
+    import_parser.add_argument("--errors-file", help="Write rejected rows (file, line, message) to this CSV")
+
+    args = parser.parse_args()
+    if args.command == "import" and not any(getattr(args, kind) for kind in IMPORT_KINDS):
+        parser.error("import: pass at least one of --users, --shops, --assignments")
+    return args
+
+
+async def run_archive(keep_months: int, batch_size: int) -> None:
+    try:
+        await archive_closed_periods(keep_months=keep_months, batch_size=batch_size)
+    finally:
+        await engine.dispose()
+
+
+def print_progress(report: ImportReport) -> None:
+    print(f"\r- {report.kind}: {report.fraction:6.1%}  {report.rows} rows, "
+          f"{report.inserted} inserted, {len(report.errors)} errors", end="", flush=True)
+
+
+async def run_import(files: dict, batch_size: int, workers: Optional[int], errors_file: Optional[str]) -> None:
+    reports = []
+    try:
+        # Порядок важен: назначения ссылаются на уже загруженных пользователей и магазины
+        for kind in IMPORT_KINDS:
+            if not files.get(kind):
+                continue
+            report = await import_csv(kind, files[kind], batch_size=batch_size, workers=workers,
+                                      progress=print_progress)
+            reports.append(report)
+            print()
+            print(report.summary())
+            for line, message in report.errors[:20]:
+                print(f"  line {line}: {message}")
+            if len(report.errors) > 20:
+                print(f"  ... and {len(report.errors) - 20} more")
+    finally:
+        if errors_file and reports:
+            write_errors(reports, errors_file)
+            print(f"Errors written to {errors_file}")
+        await engine.dispose()
+
+
 # Main execution
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        asyncio.run(initialize_database())
+        if args.command == "archive":
+            asyncio.run(run_archive(args.keep_months, args.batch_size))
+        elif args.command == "import":
+            files = {kind: getattr(args, kind) for kind in IMPORT_KINDS}
+            asyncio.run(run_import(files, args.batch_size, args.workers, args.errors_file))
+        else:
+            asyncio.run(initialize_database())
     except KeyboardInterrupt:
-        print("\nDatabase initialization cancelled by user")
+        print("\nOperation cancelled by user")
     except Exception as e:
         print(f"Fatal error: {str(e)}")
         exit(1)
\ No newline at end of file
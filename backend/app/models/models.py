@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Text, Table, Numeric, MetaData
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Text, Table, Numeric, MetaData, Index
 from sqlalchemy.orm import relationship, DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.sql import func
 
@@ -30,6 +30,8 @@ class User(Base):
     phone: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     is_superuser: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Растет при изменении прав и привязок к магазинам; токены со старой версией отклоняются
+    auth_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now()
@@ -49,6 +51,32 @@ class User(Base):
     )
 
 
+class RefreshToken(Base):
+    """Refresh token issued at login; only its SHA-256 is stored.
+
+    Every refresh revokes the presented token and issues a new one in the
+    same family. A revoked token presented again means the chain has leaked,
+    and the whole family is revoked.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    family_id: Mapped[str] = mapped_column(String(32), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    revoked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
 class Shop(Base):
     """Shop model representing business entities"""
     __tablename__ = "shops"
@@ -80,12 +108,27 @@ class Shop(Base):
 class Invoice(Base):
     """Invoice model representing sales documents"""
     __tablename__ = "invoices"
+    # Покрывает выборки по магазину и периоду (списки, аналитика по дням)
+    __table_args__ = (
+        Index("ix_invoices_shop_created", "shop_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        server_default=func.now()
+        server_default=func.now(),
+        index=True
     )
+    # Время последнего изменения: по нему клиенты забирают только изменившиеся накладные
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+        index=True
+    )
+    # Ключ, который клиент присылает при создании: повтор POST не создает вторую накладную
+    client_key: Mapped[Optional[str]] = mapped_column(String(36), nullable=True, unique=True)
     contact_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     additional_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     total_amount: Mapped[float] = mapped_column(
@@ -147,4 +190,85 @@ class InvoiceItem(Base):
     )
 
     # Relationship
-    invoice: Mapped["Invoice"] = relationship("Invoice", back_populates="items")
\ No newline at end of file
+    invoice: Mapped["Invoice"] = relationship("Invoice", back_populates="items")
+
+
+class ArchivedInvoice(Base):
+    """Invoice moved out of the hot table once its month is closed.
+
+    Rows keep their original ids, so an invoice number stays valid after archival.
+    """
+    __tablename__ = "invoices_archive"
+    __table_args__ = (
+        Index("ix_invoices_archive_shop_created", "shop_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        index=True
+    )
+    contact_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    additional_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    total_amount: Mapped[float] = mapped_column(
+        Numeric(10, 2),
+        nullable=False,
+        default=0
+    )
+    is_paid: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # Foreign Keys
+    shop_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("shops.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    # Relationships
+    shop: Mapped["Shop"] = relationship("Shop")
+    user: Mapped["User"] = relationship("User")
+    items: Mapped[List["ArchivedInvoiceItem"]] = relationship(
+        "ArchivedInvoiceItem",
+        back_populates="invoice",
+        cascade="all, delete-orphan"
+    )
+
+
+class ArchivedInvoiceItem(Base):
+    """Line item of an archived invoice"""
+    __tablename__ = "invoice_items_archive"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(255), nullable=False)
+    quantity: Mapped[float] = mapped_column(
+        Numeric(10, 3),
+        nullable=False,
+        default=1
+    )
+    price: Mapped[float] = mapped_column(
+        Numeric(10, 2),
+        nullable=False,
+        default=0
+    )
+    total: Mapped[float] = mapped_column(
+        Numeric(10, 2),
+        nullable=False,
+        default=0
+    )
+
+    # Foreign Key
+    invoice_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("invoices_archive.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+
+    # Relationship
+    invoice: Mapped["ArchivedInvoice"] = relationship("ArchivedInvoice", back_populates="items")
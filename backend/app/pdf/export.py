@@ -0,0 +1,119 @@
+# pdf/export.py
+"""
+Batch export of invoice PDFs as a streamed ZIP archive.
+
+Invoices are loaded from the database in small batches and rendered in the
+PDF worker pool with a bounded number of jobs in flight. Each finished PDF is
+written to the archive and sent to the client immediately. Memory therefore
+depends on the window size, not on how many invoices match.
+"""
+import asyncio
+import io
+import logging
+import zipfile
+from collections import deque
+from itertools import groupby
+from typing import AsyncIterator, Deque, List, Tuple
+
+from app.core.config import async_session_factory
+from app.crud import crud
+from app.pdf.renderer import render_invoice_pdf
+from app.pdf.service import pdf_service, invoice_to_pdf_data, pdf_version
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 50
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Unseekable sink for ZipFile that hands out what was written so far"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _iter_pdf_data(invoice_refs: List[Tuple[bool, int]]) -> AsyncIterator[dict]:
+    """Yield renderer input for each invoice, loading EXPORT_BATCH_SIZE rows per query"""
+    async with async_session_factory() as session:
+        for archived, group in groupby(invoice_refs, key=lambda ref: ref[0]):
+            invoice_ids = [invoice_id for _, invoice_id in group]
+            for start in range(0, len(invoice_ids), EXPORT_BATCH_SIZE):
+                batch = await crud.fetch_invoices_by_ids(
+                    session, invoice_ids[start:start + EXPORT_BATCH_SIZE], archived=archived
+                )
+                for invoice in batch:
+                    yield invoice_to_pdf_data(invoice)
+                # Отпускаем загруженные объекты, чтобы память не росла с каждым батчем
+                session.expunge_all()
+
+
+def _archive_name(pdf_data: dict) -> str:
+    date_part = pdf_data.get("created_at", "").split("T")[0].replace("-", "")
+    return f"invoice_{pdf_data['id']}_{date_part}.pdf"
+
+
+async def stream_invoices_zip(invoice_refs: List[Tuple[bool, int]]) -> AsyncIterator[bytes]:
+    """Render invoices in parallel and stream them as ZIP entries in request order"""
+    loop = asyncio.get_running_loop()
+    window = pdf_service.max_workers * 2
+    pending: Deque[Tuple[dict, asyncio.Future]] = deque()
+    failed: List[str] = []
+
+    sink = _ChunkBuffer()
+    # PDF уже сжат, поэтому ZIP_STORED: без лишней нагрузки на CPU
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    source = _iter_pdf_data(invoice_refs).__aiter__()
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    pdf_data = await source.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+
+                cached = pdf_service.cache.get((pdf_data["id"], pdf_version(pdf_data)))
+                if cached is not None:
+                    future = loop.create_future()
+                    future.set_result(cached)
+                else:
+                    future = loop.run_in_executor(pdf_service.executor, render_invoice_pdf, pdf_data)
+                pending.append((pdf_data, future))
+
+            if not pending:
+                break
+
+            pdf_data, future = pending.popleft()
+            try:
+                pdf = await future
+            except Exception as e:
+                logger.error(f"Failed to render invoice {pdf_data['id']}: {e}")
+                failed.append(f"{pdf_data['id']}: {e}")
+                continue
+
+            archive.writestr(_archive_name(pdf_data), pdf)
+            yield sink.drain()
+
+        if failed:
+            archive.writestr("errors.txt", "\n".join(failed))
+        archive.close()
+        yield sink.drain()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        await source.aclose()
@@ -0,0 +1,152 @@
+# pdf/renderer.py
+"""
+Server-side invoice PDF rendering.
+
+Produces the same layout as front/utils/pdf_generator.py. The module does not
+import the application config, so worker processes stay light: they only load
+reportlab and the font, once per process.
+"""
+import os
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+FONT_NAME = 'DejaVu'
+# Шрифт не копируется в backend: по умолчанию берется тот же файл, что у клиента
+DEFAULT_FONT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'front', 'fonts', 'DejaVuSans.ttf'
+)
+FONT_PATH = DEFAULT_FONT_PATH
+
+TABLE_HEADER = ['№', 'Наименование', 'Количество', 'Цена', 'Сумма']
+TABLE_COL_WIDTHS = [1 * cm, 8 * cm, 3 * cm, 3 * cm, 3 * cm]
+
+_styles: Dict[str, Any] = {}
+
+
+def configure_font(path: Optional[str]) -> None:
+    """Use another TTF file (settings.PDF_FONT_PATH); runs as the worker process initializer"""
+    global FONT_PATH
+    FONT_PATH = path or DEFAULT_FONT_PATH
+
+
+def _get_styles() -> Dict[str, Any]:
+    """Register the font and build styles on first use in this process"""
+    if _styles:
+        return _styles
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        if not os.path.exists(FONT_PATH):
+            raise FileNotFoundError(f"PDF font not found: {FONT_PATH} (set PDF_FONT_PATH)")
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+    sample = getSampleStyleSheet()
+    normal = ParagraphStyle(
+        'CustomNormal',
+        parent=sample['Normal'],
+        fontName=FONT_NAME,
+        fontSize=12,
+        spaceBefore=6,
+        spaceAfter=6
+    )
+    _styles.update({
+        'header': ParagraphStyle(
+            'CustomHeader',
+            parent=sample['Heading1'],
+            fontName=FONT_NAME,
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1
+        ),
+        'normal': normal,
+        'total': ParagraphStyle('Total', parent=normal, fontSize=14, alignment=2),
+        'payment': ParagraphStyle('PaymentStatus', parent=normal, fontSize=14, alignment=2),
+        'table': TableStyle([
+            ('FONT', (0, 0), (-1, -1), FONT_NAME),
+            ('FONTSIZE', (0, 0), (-1, -1), 12),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('BOX', (0, 0), (-1, -1), 2, colors.black),
+            ('LINEABOVE', (0, 1), (-1, 1), 2, colors.black),
+            ('LINEBEFORE', (1, 1), (1, -1), 1, colors.black),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+        ]),
+    })
+
+    # Single-line cells: measure the row height once instead of on every page split
+    sample = Table([TABLE_HEADER], colWidths=TABLE_COL_WIDTHS)
+    sample.setStyle(_styles['table'])
+    _styles['row_height'] = sample.wrap(0, 0)[1]
+    return _styles
+
+
+def render_invoice_pdf(invoice_data: Dict[str, Any]) -> bytes:
+    """Render an invoice to PDF bytes.
+
+    invoice_data uses the client generator's keys: id, created_at, contact,
+    additional_info, total, is_paid and items with name, quantity and price.
+    """
+    styles = _get_styles()
+    buffer = BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+
+    elements = [
+        Paragraph("НАКЛАДНАЯ", styles['header']),
+        Paragraph(f"Номер: {invoice_data.get('id', '')}", styles['normal']),
+        Paragraph(f"Дата: {invoice_data.get('created_at', '').split('T')[0]}", styles['normal']),
+        Paragraph(f"Контакт: {invoice_data.get('contact', '')}", styles['normal']),
+        Spacer(1, 0.5 * cm),
+    ]
+
+    if invoice_data.get('additional_info'):
+        elements.append(Paragraph("Дополнительная информация:", styles['normal']))
+        elements.append(Paragraph(invoice_data.get('additional_info', ''), styles['normal']))
+        elements.append(Spacer(1, 0.5 * cm))
+
+    table_data = [TABLE_HEADER]
+    for idx, item in enumerate(invoice_data.get('items', []), 1):
+        if item.get('name') and item.get('quantity') and item.get('price'):
+            table_data.append([
+                str(idx),
+                str(item.get('name', '')).replace('\n', ' '),
+                str(item.get('quantity', '')),
+                f"{float(item.get('price', 0)):.2f}",
+                f"{float(item.get('quantity', 0)) * float(item.get('price', 0)):.2f}"
+            ])
+
+    table = Table(
+        table_data,
+        colWidths=TABLE_COL_WIDTHS,
+        rowHeights=[styles['row_height']] * len(table_data),
+        repeatRows=1
+    )
+    table.setStyle(styles['table'])
+    elements.append(table)
+    elements.append(Spacer(1, 0.5 * cm))
+
+    elements.append(Paragraph(f"Итого: {invoice_data.get('total', 0):.2f}", styles['total']))
+    payment_status = "Оплачено" if invoice_data.get('is_paid', False) else "Не оплачено"
+    elements.append(Paragraph(f"Статус оплаты: {payment_status}", styles['payment']))
+
+    doc.build(elements)
+    return buffer.getvalue()
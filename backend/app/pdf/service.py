@@ -0,0 +1,150 @@
+# pdf/service.py
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.pdf.renderer import configure_font, render_invoice_pdf
+
+CacheKey = Tuple[int, str]
+
+
+def invoice_to_pdf_data(invoice: Any) -> Dict[str, Any]:
+    """Convert an Invoice / ArchivedInvoice row to the renderer's input format"""
+    return {
+        "id": invoice.id,
+        "created_at": invoice.created_at.isoformat() if invoice.created_at else "",
+        "contact": invoice.contact_info or "",
+        "additional_info": invoice.additional_info or "",
+        "total": float(invoice.total_amount or 0),
+        "is_paid": bool(invoice.is_paid),
+        "items": [
+            {
+                "name": item.name,
+                "quantity": float(item.quantity),
+                "price": float(item.price),
+            }
+            for item in invoice.items
+        ],
+    }
+
+
+def pdf_version(pdf_data: Dict[str, Any]) -> str:
+    """Version of a rendered document: a digest of everything the layout prints"""
+    payload = json.dumps(pdf_data, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+class RenderedPDFCache:
+    """LRU cache of rendered PDFs bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._versions: Dict[int, Set[str]] = {}
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        pdf = self._entries.get(key)
+        if pdf is not None:
+            self._entries.move_to_end(key)
+        return pdf
+
+    def put(self, key: CacheKey, pdf: bytes) -> None:
+        if len(pdf) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = pdf
+        self._versions.setdefault(key[0], set()).add(key[1])
+        self.current_bytes += len(pdf)
+        while self.current_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def invalidate(self, invoice_id: int) -> None:
+        """Drop every cached version of an invoice"""
+        for version in list(self._versions.get(invoice_id, ())):
+            self._remove((invoice_id, version))
+
+    def _remove(self, key: CacheKey) -> None:
+        pdf = self._entries.pop(key, None)
+        if pdf is None:
+            return
+        self.current_bytes -= len(pdf)
+        versions = self._versions.get(key[0])
+        if versions is not None:
+            versions.discard(key[1])
+            if not versions:
+                del self._versions[key[0]]
+
+
+class InvoicePDFService:
+    """Render invoice PDFs in a process pool and cache the results.
+
+    Concurrent requests for the same invoice version share one render.
+    """
+
+    def __init__(self, max_workers: int = 2, cache_max_bytes: int = 64 * 1024 * 1024,
+                 font_path: Optional[str] = None):
+        self.max_workers = max_workers
+        self.font_path = font_path
+        self.cache = RenderedPDFCache(cache_max_bytes)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight: Dict[CacheKey, asyncio.Future] = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=configure_font,
+                initargs=(self.font_path,)
+            )
+        return self._executor
+
+    @staticmethod
+    def version_of(invoice: Any) -> str:
+        return pdf_version(invoice_to_pdf_data(invoice))
+
+    async def get_pdf(self, invoice: Any) -> Tuple[bytes, str]:
+        """Return (pdf bytes, version) for an invoice, rendering it if needed"""
+        pdf_data = invoice_to_pdf_data(invoice)
+        version = pdf_version(pdf_data)
+        key = (invoice.id, version)
+
+        pdf = self.cache.get(key)
+        if pdf is not None:
+            return pdf, version
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending), version
+
+        loop = asyncio.get_running_loop()
+        pending = loop.run_in_executor(self.executor, render_invoice_pdf, pdf_data)
+        self._in_flight[key] = pending
+        try:
+            pdf = await asyncio.shield(pending)
+        finally:
+            self._in_flight.pop(key, None)
+
+        self.cache.put(key, pdf)
+        return pdf, version
+
+    def invalidate(self, invoice_id: int) -> None:
+        self.cache.invalidate(invoice_id)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pdf_service = InvoicePDFService(
+    max_workers=settings.PDF_RENDER_WORKERS,
+    cache_max_bytes=settings.PDF_CACHE_MAX_MB * 1024 * 1024,
+    font_path=settings.PDF_FONT_PATH
+)
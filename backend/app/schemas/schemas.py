@@ -1,6 +1,6 @@
-from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, EmailStr, ConfigDict
+from datetime import date, datetime
+from typing import FrozenSet, Optional, List
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
 
 
 # Base Models with shared configurations
@@ -56,11 +56,31 @@ class ShopResponse(ShopBase):
 class Token(BaseModelConfig):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None
+    # Время жизни access_token, секунды
+    expires_in: Optional[int] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModelConfig):
+    """Claims of an access token; handlers get it as current_user.
+
+    shop_ids is None for tokens issued before shop claims were added -
+    access checks then fall back to the database.
+    """
     user_id: int
     is_superuser: bool
+    login: Optional[str] = None
+    is_active: bool = True
+    shop_ids: Optional[FrozenSet[int]] = None
+    auth_version: Optional[int] = None
+
+    @property
+    def id(self) -> int:
+        return self.user_id
 
 
 # Invoice Related Models
@@ -98,6 +118,8 @@ class InvoiceCreate(BaseModel):
     total_amount: float
     is_paid: bool = False
     items: List[InvoiceItemCreate] = []  # Добавляем поле для items
+    # Повторный POST с тем же ключом возвращает уже созданную накладную
+    client_key: Optional[str] = Field(default=None, min_length=1, max_length=36)
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -109,6 +131,9 @@ class InvoiceFilter(BaseModelConfig):
     created_before: Optional[datetime] = None
     min_amount: Optional[float] = None
     max_amount: Optional[float] = None
+    contact: Optional[str] = None
+    number: Optional[str] = None
+    updated_after: Optional[datetime] = None
 
 
 class InvoiceResponse(BaseModel):
@@ -122,6 +147,9 @@ class InvoiceResponse(BaseModel):
     user_id: int
     shop: ShopBase
     items: List[InvoiceItemBase] = []
+    # У архивных накладных этих полей нет
+    updated_at: Optional[datetime] = None
+    client_key: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -141,3 +169,20 @@ class InvoiceUpdate(BaseModel):
     items: Optional[List[InvoiceItemUpdate]] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+# Analytics Related Models
+class AnalyticsSeries(BaseModel):
+    """Daily totals per shop, column-oriented: element i of every list is one (day, shop) row.
+
+    Days without invoices are omitted; the client fills the gaps.
+    """
+    start: date
+    end: date
+    day: List[date] = []
+    shop_id: List[int] = []
+    revenue: List[float] = []
+    invoices: List[int] = []
+    paid_invoices: List[int] = []
+    paid_amount: List[float] = []
+
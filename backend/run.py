@@ -2,9 +2,13 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from app.api.auth_handlers import auth_router
+from app.api.auth_handlers import auth_router, user_id_from_token
 from app.api.handlers import router as invoice_router
-from app.core.config import init_db, cleanup_db
+from app.core.admission import AdmissionControlMiddleware, RouteLimit
+from app.core.config import init_db, cleanup_db, settings
+from app.core.encoding import CompressionMiddleware
+from app.core.timing import ServerTimingMiddleware
+from app.pdf.service import pdf_service
 
 
 @asynccontextmanager
@@ -26,6 +30,7 @@ async def lifespan(app: FastAPI):
     # Shutdown
     try:
         print("Cleaning up database connections...")
+        pdf_service.shutdown()
         await cleanup_db()
         print("Cleanup completed!")
     except Exception as e:
@@ -39,7 +44,30 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS configuration
+# Сжатие ответов (brotli/gzip) для мобильных клиентов
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# Время обработки на сервере (Server-Timing) для клиентской телеметрии запросов
+app.add_middleware(ServerTimingMiddleware)
+
+# Контроль нагрузки: снаружи сжатия и Server-Timing, поэтому отказ (429/503) отдается до любой работы
+app.add_middleware(
+    AdmissionControlMiddleware,
+    rate=settings.RATE_LIMIT_PER_SECOND,
+    burst=settings.RATE_LIMIT_BURST,
+    identify=user_id_from_token,
+    limits=[
+        RouteLimit("stats", r"/api/v1/(invoices/stats/summary|analytics/series)",
+                   settings.STATS_CONCURRENCY, settings.ADMISSION_QUEUE_TIMEOUT, cost=2),
+        RouteLimit("list", r"/api/v1/invoices/?",
+                   settings.LIST_CONCURRENCY, settings.ADMISSION_QUEUE_TIMEOUT),
+        RouteLimit("export", r"/api/v1/invoices/(export|\d+/pdf)",
+                   settings.EXPORT_CONCURRENCY, settings.ADMISSION_QUEUE_TIMEOUT, cost=5),
+    ]
+)
+
+# CORS configuration: добавляется последним (самый внешний слой), чтобы preflight-запросы
+# не расходовали лимиты, а ответы 429/503 тоже получали CORS-заголовки
 origins = [
     "http://localhost:3000",  # React default port
     "http://localhost:8000",  # FastAPI default port
@@ -0,0 +1,151 @@
+# benchmarks/bench_client_startup.py
+"""
+Kivy client startup: time to the first drawn frame of the login screen and
+what the startup import path costs, compared with building every screen
+up front (--eager), as the app did before screens were created lazily.
+
+Each run starts a fresh interpreter, so the numbers include Python start-up.
+Needs a display (or a virtual one, e.g. xvfb-run).
+
+Run from the repository root: python benchmarks/bench_client_startup.py [--runs 5] [--eager]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRONT = os.path.join(ROOT, "front")
+
+# Modules the app now imports only on first use
+DEFERRED_MODULES = (
+    "front.views.invoice_view",
+    "front.views.history_view",
+    "front.utils.pdf_generator",
+    "plyer",
+)
+
+FIRST_FRAME_CODE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+os.chdir({front!r})
+from kivy.core.window import Window
+from front.run_kivy import InvoiceApp
+t_import = time.perf_counter()
+marks = {{}}
+app = InvoiceApp()
+
+def on_start(*args):
+    marks['build'] = time.perf_counter()
+    if {eager!r}:
+        for name in ('main', 'invoice', 'history', 'analytics'):
+            app.root.get_screen(name)
+
+def on_flip(*args):
+    Window.unbind(on_flip=on_flip)
+    now = time.perf_counter()
+    print('RESULT ' + json.dumps({{
+        'imports': t_import - t0,
+        'build': marks['build'] - t_import,
+        'first_frame': now - t0,
+    }}))
+    app.stop()
+
+app.bind(on_start=on_start)
+Window.bind(on_flip=on_flip)
+app.run()
+"""
+
+IMPORT_CODE = """
+import sys, time
+sys.path.insert(0, {root!r})
+import front.run_kivy
+start = time.perf_counter()
+try:
+    __import__({module!r})
+except ImportError as e:
+    print('MISSING ' + str(e))
+else:
+    print('RESULT ' + str(time.perf_counter() - start))
+"""
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("KIVY_NO_ARGS", "1")
+    env.setdefault("KIVY_NO_CONSOLELOG", "1")
+    return env
+
+
+def run_child(code: str, cwd: str = ROOT) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=cwd, env=child_env(), capture_output=True, text=True, timeout=120
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith(("RESULT ", "MISSING ")):
+            return line
+    raise RuntimeError(f"child failed:\n{result.stderr[-2000:]}")
+
+
+def first_frame(eager: bool) -> dict:
+    started = time.perf_counter()
+    line = run_child(FIRST_FRAME_CODE.format(root=ROOT, front=FRONT, eager=eager), cwd=FRONT)
+    result = json.loads(line[len("RESULT "):])
+    result["wall"] = time.perf_counter() - started
+    return result
+
+
+def startup_imports(top: int) -> list:
+    """(cumulative seconds, module) of the slowest top-level imports of front.run_kivy"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import front.run_kivy"],
+        cwd=ROOT, env=child_env(), capture_output=True, text=True, timeout=120
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; keep the top level only
+        if not name.startswith("  "):
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--eager", action="store_true", help="also measure building all screens at start")
+    args = parser.parse_args()
+
+    print("Slowest top-level imports on the startup path (import front.run_kivy):")
+    for seconds, name in startup_imports(args.top):
+        print(f"  {name:<50}{seconds * 1000:>10.1f} ms")
+    print()
+
+    print("Deferred imports (extra cost on first use, after startup):")
+    for module in DEFERRED_MODULES:
+        line = run_child(IMPORT_CODE.format(root=ROOT, module=module))
+        if line.startswith("MISSING "):
+            print(f"  {module:<50}{'not installed':>13}")
+        else:
+            print(f"  {module:<50}{float(line[len('RESULT '):]) * 1000:>10.1f} ms")
+    print()
+
+    modes = [("lazy", False)] + ([("eager", True)] if args.eager else [])
+    print(f"{'mode':<8}{'imports ms':>12}{'build ms':>12}{'first frame ms':>16}{'wall ms':>10}   (median of {args.runs})")
+    for label, eager in modes:
+        runs = [first_frame(eager) for _ in range(args.runs)]
+        median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{label:<8}{median['imports'] * 1000:>12.1f}{median['build'] * 1000:>12.1f}"
+              f"{median['first_frame'] * 1000:>16.1f}{median['wall'] * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
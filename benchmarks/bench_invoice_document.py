@@ -0,0 +1,88 @@
+# benchmarks/bench_invoice_document.py
+"""
+Cost of editing large invoices through InvoiceDocument: one field edit
+(incremental total), set_lines and to_items on 100 to 10,000 lines,
+compared with the full float recalculation of every line that the invoice
+screen did on each keystroke before.
+
+Pure Python, no Kivy needed.
+Run from the repository root: python benchmarks/bench_invoice_document.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from front.utils.invoice_document import InvoiceDocument  # noqa: E402
+
+
+def make_items(lines: int) -> list:
+    return [
+        {
+            "name": f"Товар {i} арт. {100000 + i}",
+            "quantity": str(1 + i % 17),
+            "price": f"{10 + (i * 37) % 5000}.50",
+        }
+        for i in range(lines)
+    ]
+
+
+def legacy_total(data: list) -> float:
+    """Previous update_total: every line re-parsed from text on each edit"""
+    def line_sum(line):
+        try:
+            return float(line['quantity']) * float(line['price'])
+        except (KeyError, ValueError):
+            return 0.0
+    return sum(line_sum(line) for line in data)
+
+
+def per_call(func, calls: int, repeat: int) -> float:
+    """Best average time of one call, seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(calls):
+            func(i)
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--edits", type=int, default=2000, help="field edits per measurement")
+    args = parser.parse_args()
+
+    print(f"{'lines':>6}{'edit us':>10}{'legacy edit us':>16}{'set_lines ms':>14}{'to_items ms':>13}")
+    for lines in (100, 1000, 10000):
+        items = make_items(lines)
+        document = InvoiceDocument()
+        document.set_lines(items)
+
+        def edit_field(i):
+            # Значение переключается, чтобы каждое изменение действительно меняло строку
+            line = document.lines[i % lines]
+            document.set_field(i % lines, 'quantity', '2' if line.quantity_text == '1' else '1')
+        edit = per_call(edit_field, args.edits, args.repeat)
+
+        legacy_data = [dict(item) for item in items]
+
+        def legacy_edit(i):
+            line = legacy_data[i % lines]
+            line['quantity'] = '2' if line['quantity'] == '1' else '1'
+            legacy_total(legacy_data)
+        legacy_calls = max(1, min(args.edits, 200000 // lines))
+        legacy = per_call(legacy_edit, legacy_calls, args.repeat)
+
+        set_lines = per_call(lambda i: document.set_lines(items), 5, args.repeat)
+        to_items = per_call(lambda i: document.to_items(), 5, args.repeat)
+
+        print(f"{lines:>6}{edit * 1e6:>10.2f}{legacy * 1e6:>16.1f}"
+              f"{set_lines * 1000:>14.2f}{to_items * 1000:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_pdf_generator.py
+"""
+Cost of building InvoicePDFGenerator and rendering 10-line and 5,000-line
+invoices, compared with the per-construction font parsing and the
+auto-measured Table the generator used before.
+
+Run from the repository root: python benchmarks/bench_pdf_generator.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.pdfbase import pdfmetrics  # noqa: E402
+from reportlab.pdfbase.ttfonts import TTFont  # noqa: E402
+from reportlab.platypus import Table  # noqa: E402
+
+from front.utils.pdf_generator import (  # noqa: E402
+    InvoicePDFGenerator, get_pdf_generator, FONT_PATH, FONT_NAME, TABLE_COL_WIDTHS
+)
+
+
+class LegacyTableGenerator(InvoicePDFGenerator):
+    """Previous table construction: every row height measured on each page split"""
+
+    def _make_items_table(self, table_data) -> Table:
+        table = Table(table_data, colWidths=TABLE_COL_WIDTHS)
+        table.setStyle(self.table_style)
+        return table
+
+
+def make_invoice(lines: int) -> dict:
+    items = [
+        {
+            "name": f"Товар {i} арт. {100000 + i}",
+            "quantity": 1 + i % 17,
+            "price": 10 + (i * 37) % 5000 + 0.5,
+        }
+        for i in range(lines)
+    ]
+    return {
+        "id": lines,
+        "created_at": "2024-11-01T10:00:00",
+        "contact": "ИП Покупатель, +7 701 1234567",
+        "additional_info": "Доставка до склада",
+        "total": sum(item["quantity"] * item["price"] for item in items),
+        "is_paid": False,
+        "items": items,
+    }
+
+
+def best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix="bench_pdf_")
+
+    # Old constructor: the TTF was parsed and registered on every construction
+    font_parse = best_of(lambda: pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH)), args.repeat)
+    construct = best_of(InvoicePDFGenerator, args.repeat)
+    print(f"{'font parse per construction (before)':<40}{font_parse * 1000:>10.2f} ms")
+    print(f"{'InvoicePDFGenerator() (now)':<40}{construct * 1000:>10.3f} ms")
+    print()
+
+    generators = (("before", LegacyTableGenerator()), ("now", get_pdf_generator()))
+    print(f"{'lines':>6}{'table':>10}{'render ms':>12}{'size KB':>10}")
+    for lines in (10, 5000):
+        invoice = make_invoice(lines)
+        for label, generator in generators:
+            path = os.path.join(out_dir, f"invoice_{lines}_{label}.pdf")
+            seconds = best_of(lambda: generator.generate_pdf(invoice, path), args.repeat)
+            print(f"{lines:>6}{label:>10}{seconds * 1000:>12.1f}{os.path.getsize(path) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
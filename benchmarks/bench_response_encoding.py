@@ -0,0 +1,104 @@
+# benchmarks/bench_response_encoding.py
+"""
+Payload size and client decode time of a 100-invoice page in each encoding
+the API can negotiate: JSON, gzip/brotli JSON, MessagePack and gzip MessagePack.
+
+Run: python benchmarks/bench_response_encoding.py [--invoices 100] [--items 8]
+"""
+import argparse
+import gzip
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def make_page(invoice_count: int, items_per_invoice: int) -> list:
+    """Build a page shaped like a List[InvoiceResponse] JSON body"""
+    rng = random.Random(42)
+    start = datetime(2024, 10, 1, 9, 0)
+    page = []
+    for invoice_id in range(1, invoice_count + 1):
+        items = []
+        for _ in range(items_per_invoice):
+            quantity = round(rng.uniform(1, 50), 3)
+            price = round(rng.uniform(10, 5000), 2)
+            items.append({
+                "name": f"Товар {rng.randint(1, 9999)} арт. {rng.randint(100000, 999999)}",
+                "quantity": quantity,
+                "price": price,
+                "total": round(quantity * price, 2),
+            })
+        page.append({
+            "id": invoice_id,
+            "created_at": (start + timedelta(minutes=37 * invoice_id)).isoformat(),
+            "contact_info": f"ИП Покупатель {rng.randint(1, 500)}, +7 701 {rng.randint(1000000, 9999999)}",
+            "additional_info": "Доставка до склада",
+            "total_amount": round(sum(item["total"] for item in items), 2),
+            "is_paid": rng.random() < 0.6,
+            "shop_id": rng.randint(1, 5),
+            "user_id": rng.randint(1, 20),
+            "shop": {"id": 1, "name": "Магазин №1", "photo": None, "is_active": True},
+            "items": items,
+        })
+    return page
+
+
+def build_variants(page: list) -> list:
+    # Same settings as FastAPI's JSONResponse
+    json_body = json.dumps(page, ensure_ascii=False, separators=(",", ":")).encode()
+    variants = [
+        ("json", json_body, json.loads),
+        ("json+gzip", gzip.compress(json_body, compresslevel=6), lambda b: json.loads(gzip.decompress(b))),
+    ]
+    if brotli is not None:
+        variants.append(
+            ("json+br", brotli.compress(json_body, quality=4), lambda b: json.loads(brotli.decompress(b)))
+        )
+    if msgpack is not None:
+        packed = msgpack.packb(page, use_bin_type=True)
+        variants.append(("msgpack", packed, lambda b: msgpack.unpackb(b, raw=False)))
+        variants.append((
+            "msgpack+gzip",
+            gzip.compress(packed, compresslevel=6),
+            lambda b: msgpack.unpackb(gzip.decompress(b), raw=False)
+        ))
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=100)
+    parser.add_argument("--items", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    page = make_page(args.invoices, args.items)
+    variants = build_variants(page)
+    baseline = len(variants[0][1])
+
+    print(f"{args.invoices} invoices x {args.items} items, decode averaged over {args.repeat} runs")
+    print(f"{'encoding':<14}{'bytes':>10}{'ratio':>8}{'decode ms':>12}")
+    for name, body, decode in variants:
+        assert decode(body) == page
+        seconds = timeit.timeit(lambda: decode(body), number=args.repeat) / args.repeat
+        print(f"{name:<14}{len(body):>10}{len(body) / baseline:>8.2f}{seconds * 1000:>12.3f}")
+
+    if brotli is None:
+        print("brotli not installed: json+br skipped")
+    if msgpack is None:
+        print("msgpack not installed: msgpack variants skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# controllers/analytics_api_controller.py
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlencode
+from .base_api_controller import BaseAPIController
+from .transport import RequestHandle, Transport
+import logging
+
+logger = logging.getLogger(__name__)
+
+SERIES_ENDPOINT = "/api/v1/analytics/series"
+
+
+class AnalyticsAPIController(BaseAPIController):
+    def __init__(self, base_url: str = "http://localhost:8000", auth_controller: Optional[Any] = None, transport: Optional[Transport] = None):
+        super().__init__(base_url=base_url, auth_controller=auth_controller, transport=transport)
+
+    def get_series(
+            self,
+            start: date,
+            end: date,
+            shop_id: Optional[int] = None,
+            success_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+            error_callback: Optional[Callable[[str], None]] = None
+    ) -> RequestHandle:
+        """Суммы по дням и магазинам за период (колонками, см. AnalyticsSeries на сервере)."""
+        params = {"start": start.isoformat(), "end": end.isoformat()}
+        if shop_id is not None:
+            params["shop_id"] = shop_id
+        endpoint = f"{SERIES_ENDPOINT}?{urlencode(params)}"
+        logger.debug(f"Fetching analytics series: {endpoint}")
+
+        def success_wrapper(req, result):
+            if not isinstance(result, dict):
+                logger.error(f"Unexpected response format: {result}")
+                if error_callback:
+                    error_callback("Unexpected response format from server")
+                return
+            if success_callback:
+                success_callback(result)
+
+        return self._make_cached_request(
+            endpoint=endpoint,
+            success_callback=success_wrapper,
+            error_callback=error_callback
+        )
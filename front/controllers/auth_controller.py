@@ -1,36 +1,149 @@
 # controllers/auth_api_controller.py
 import json
+import time
 from functools import partial
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, List, Tuple
+from kivy.clock import Clock
 from kivy.network.urlrequest import UrlRequest
 from .base_api_controller import BaseAPIController
+from .transport import Transport
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Токен обновляется за столько секунд до истечения (но не раньше середины срока жизни)
+REFRESH_BEFORE_EXPIRY = 60
+
 
 class AuthAPIController(BaseAPIController):
-    def __init__(self, base_url: str = "http://localhost:8000"):
-        super().__init__(base_url=base_url)
+    def __init__(self, base_url: str = "http://localhost:8000", transport: Optional[Transport] = None):
+        super().__init__(base_url=base_url, transport=transport)
         self.token: Optional[str] = None
+        self.refresh_token: Optional[str] = None
+        # Имя вошедшего пользователя: по нему разделяется кэш ответов
+        self.username: Optional[str] = None
         self.headers = {
             "Content-Type": "application/x-www-form-urlencoded"
         }
+        self._refresh_event = None
+        # Колбэки всех, кто ждет уже идущего обновления токена
+        self._refresh_waiters: Optional[List[Tuple[Optional[Callable], Optional[Callable]]]] = None
 
-    def _handle_login_success(self, req: UrlRequest, result: Any, success_callback: Optional[Callable[[Any], None]]):
-        """Handle successful login."""
+    def _store_tokens(self, result: Any) -> None:
+        """Remember the token pair and schedule the refresh before the access token expires."""
         self.token = result.get('access_token')
+        self.refresh_token = result.get('refresh_token')
+        if self._refresh_event is not None:
+            self._refresh_event.cancel()
+            self._refresh_event = None
+
+        expires_in = result.get('expires_in')
+        if self.refresh_token and expires_in:
+            delay = max(expires_in / 2, expires_in - REFRESH_BEFORE_EXPIRY)
+            self._refresh_event = Clock.schedule_once(lambda dt: self.refresh(), delay)
+
+    def _handle_login_success(self, req: UrlRequest, result: Any, success_callback: Optional[Callable[[Any], None]], username: Optional[str] = None):
+        """Handle successful login."""
+        self._store_tokens(result)
+        self.username = username
         logger.info("Login successful. Token obtained.")
         if success_callback:
             success_callback(result)
 
-    def _handle_register_success(self, req: UrlRequest, result: Any, success_callback: Optional[Callable[[Any], None]]):
+    def _handle_register_success(self, req: UrlRequest, result: Any, success_callback: Optional[Callable[[Any], None]], username: Optional[str] = None):
         """Handle successful registration."""
-        self.token = result.get('access_token')
+        self._store_tokens(result)
+        self.username = username
         logger.info("Registration successful. Token obtained.")
         if success_callback:
             success_callback(result)
 
+    @property
+    def can_refresh(self) -> bool:
+        return self.refresh_token is not None
+
+    def refresh(
+            self,
+            success_callback: Optional[Callable[[Any], None]] = None,
+            error_callback: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Exchange the refresh token for a new token pair (no password, no bcrypt on the server).
+
+        Concurrent calls share one request: the server rotates the refresh
+        token, so sending the same one twice would end the session.
+        """
+        if not self.refresh_token:
+            if error_callback:
+                error_callback("No refresh token available")
+            return
+
+        if self._refresh_waiters is not None:
+            self._refresh_waiters.append((success_callback, error_callback))
+            return
+        self._refresh_waiters = [(success_callback, error_callback)]
+        started = time.monotonic()
+
+        def finish(index: int, value: Any) -> None:
+            waiters, self._refresh_waiters = self._refresh_waiters or [], None
+            for callbacks in waiters:
+                if callbacks[index]:
+                    callbacks[index](value)
+
+        def on_success(req, result):
+            if self.refresh_token is None:
+                # Пока шел запрос, пользователь вышел
+                finish(1, "Logged out")
+                return
+            self._store_tokens(result)
+            logger.info(f"Access token refreshed in {time.monotonic() - started:.3f}s")
+            finish(0, result)
+
+        def on_error(error):
+            logger.warning(f"Token refresh failed: {error}")
+            finish(1, error)
+
+        def on_failure(req, result):
+            # Отклоненный refresh-токен больше не пригодится - нужен вход по паролю
+            if getattr(req, 'resp_status', None) == 401:
+                self.refresh_token = None
+            self._handle_error(req, result, on_error)
+
+        self.transport.request(
+            f"{self.base_url}/api/v1/auth/refresh",
+            method='POST',
+            req_body=json.dumps({"refresh_token": self.refresh_token}),
+            req_headers=self._get_headers(content_type="application/json"),
+            on_success=partial(self._handle_success, success_callback=on_success, error_callback=on_error),
+            on_failure=on_failure,
+            on_error=partial(self._handle_error, error_callback=on_error)
+        )
+
+    def logout(self, callback: Optional[Callable[[], None]] = None):
+        """
+        Revoke the refresh token on the server and forget both tokens.
+        """
+        refresh_token = self.refresh_token
+        if self._refresh_event is not None:
+            self._refresh_event.cancel()
+            self._refresh_event = None
+        self.token = None
+        self.refresh_token = None
+        self.username = None
+        if not refresh_token:
+            if callback:
+                callback()
+            return
+
+        self._make_request(
+            endpoint="/api/v1/auth/logout",
+            method='POST',
+            req_body=json.dumps({"refresh_token": refresh_token}),
+            headers=self._get_headers(content_type="application/json"),
+            success_callback=lambda req, result: callback() if callback else None,
+            error_callback=lambda error: callback() if callback else None
+        )
+
     def login(
             self,
             username: str,
@@ -50,7 +163,7 @@ class AuthAPIController(BaseAPIController):
             method='POST',
             req_body=form_data,
             headers=self.headers,
-            success_callback=partial(self._handle_login_success, success_callback=success_callback),
+            success_callback=partial(self._handle_login_success, success_callback=success_callback, username=username),
             error_callback=error_callback
         )
 
@@ -64,7 +177,7 @@ class AuthAPIController(BaseAPIController):
         Asynchronous registration via API.
         """
         register_url = "/api/v1/auth/register"
-        logger.debug(f"Attempting to register user with data: {user_data}")
+        logger.debug(f"Attempting to register user: {user_data.get('username')}")
 
         req_body = json.dumps(user_data)
         headers = self._get_headers(content_type="application/json")
@@ -74,7 +187,7 @@ class AuthAPIController(BaseAPIController):
             method='POST',
             req_body=req_body,
             headers=headers,
-            success_callback=partial(self._handle_register_success, success_callback=success_callback),
+            success_callback=partial(self._handle_register_success, success_callback=success_callback, username=user_data.get('username')),
             error_callback=error_callback
         )
 
@@ -1,31 +1,177 @@
 # controllers/base_api_controller.py
 from typing import Callable, Optional, Dict, Any
+from kivy.clock import Clock
 from kivy.network.urlrequest import UrlRequest
 from functools import partial
+from .response_cache import ResponseCache, get_response_cache, policy_for
+from .telemetry import log_payload
+from .transport import RequestHandle, Transport, get_default_transport
+import gzip
 import json
 import logging
 
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, JSON is always available
+    msgpack = None
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+ACCEPT_ENCODING = "br, gzip" if brotli is not None else "gzip"
+
 
 class BaseAPIController:
-    def __init__(self, base_url: str = "http://localhost:8000", auth_controller: Optional[Any] = None):
+    def __init__(
+            self,
+            base_url: str = "http://localhost:8000",
+            auth_controller: Optional[Any] = None,
+            transport: Optional[Transport] = None,
+            response_cache: Optional[ResponseCache] = None
+    ):
         self.base_url = base_url
         self.auth_controller = auth_controller
+        # По умолчанию все контроллеры делят один пул keep-alive соединений и один кэш ответов
+        self.transport = transport or get_default_transport()
+        self.response_cache = response_cache or get_response_cache()
 
     def _get_headers(self, content_type: str = "application/json") -> Dict[str, str]:
         """Generate headers for the HTTP request."""
         headers = {
             "Content-Type": content_type,
-            "Accept": "application/json"
+            "Accept": f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.9" if msgpack else "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING
         }
         if self.auth_controller and getattr(self.auth_controller, 'token', None):
             headers["Authorization"] = f"Bearer {self.auth_controller.token}"
-        logger.debug(f"Generated headers: {headers}")
         return headers
 
+    @staticmethod
+    def _decode_response(req: UrlRequest, body: Any) -> Any:
+        """Decompress and parse a raw response body according to its headers."""
+        if not isinstance(body, (bytes, bytearray)):
+            return body
+
+        resp_headers = {key.lower(): value for key, value in (req.resp_headers or {}).items()}
+        content_encoding = resp_headers.get('content-encoding', '').lower()
+        content_type = resp_headers.get('content-type', '').lower()
+
+        if content_encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif content_encoding == 'br':
+            if brotli is None:
+                raise ValueError("Server sent a brotli response but brotli is not installed")
+            body = brotli.decompress(body)
+
+        if not body:
+            return None
+        if MSGPACK_MEDIA_TYPE in content_type:
+            return msgpack.unpackb(body, raw=False)
+        if 'json' in content_type:
+            return json.loads(body)
+        return body.decode('utf-8', errors='replace')
+
+    def _handle_success(self, req: UrlRequest, result: Any, success_callback: Optional[Callable[[UrlRequest, Any], None]], error_callback: Optional[Callable[[str], None]]):
+        """Decode the raw body and pass it to the success callback."""
+        try:
+            decoded = self._decode_response(req, result)
+        except Exception as e:
+            logger.exception("Failed to decode response")
+            if error_callback:
+                error_callback(f"Error processing response: {str(e)}")
+            return
+
+        log_payload('<', getattr(req, 'method', ''), getattr(req, 'url', ''), getattr(req, 'resp_headers', None), decoded)
+        if success_callback:
+            success_callback(req, decoded)
+
+    @staticmethod
+    def _write_scope(endpoint: str) -> str:
+        """Collection a write affects: /api/v1/invoices/5/status -> /api/v1/invoices"""
+        return '/'.join(endpoint.split('?', 1)[0].split('/')[:4])
+
+    def _handle_write_success(self, req: UrlRequest, result: Any, endpoint: str, success_callback: Optional[Callable[[UrlRequest, Any], None]]):
+        """Drop cached reads of the collection a successful write changed."""
+        self.response_cache.invalidate_scope(self._write_scope(endpoint))
+        if success_callback:
+            success_callback(req, result)
+
+    def _cache_key(self, endpoint: str) -> str:
+        # Кэш разделен по пользователям: после смены входа чужие данные не показываются
+        scope = getattr(self.auth_controller, 'username', None) or 'anonymous'
+        return ResponseCache.make_key(scope, self.base_url, endpoint)
+
+    def _make_cached_request(
+            self,
+            endpoint: str,
+            success_callback: Optional[Callable[[UrlRequest, Any], None]] = None,
+            error_callback: Optional[Callable[[str], None]] = None
+    ) -> RequestHandle:
+        """GET through the response cache.
+
+        A fresh entry is returned without a request. A stale one is
+        revalidated with If-None-Match; for endpoints whose policy allows it
+        the stale data is delivered immediately and success_callback is
+        called again only if the server returns something new.
+        """
+        policy = policy_for(endpoint)
+        if policy is None:
+            return self._make_request(endpoint, 'GET', headers=self._get_headers(),
+                                      success_callback=success_callback, error_callback=error_callback)
+
+        key = self._cache_key(endpoint)
+        entry = self.response_cache.get(key)
+        handle = RequestHandle()
+
+        def deliver_cached(dt=None):
+            if success_callback and not handle.cancelled:
+                success_callback(None, entry['body'])
+
+        if entry is not None and self.response_cache.is_fresh(entry, policy):
+            logger.debug(f"Cache hit for {endpoint}")
+            Clock.schedule_once(deliver_cached)
+            return handle
+
+        served_stale = entry is not None and policy.stale_while_revalidate
+        if served_stale:
+            logger.debug(f"Serving stale {endpoint} while revalidating")
+            Clock.schedule_once(deliver_cached)
+
+        headers = self._get_headers()
+        if entry is not None and entry.get('etag'):
+            headers["If-None-Match"] = entry['etag']
+
+        def on_response(req, result):
+            if req.resp_status == 304 and entry is not None:
+                self.response_cache.touch(key)
+                if not served_stale:
+                    deliver_cached()
+                return
+
+            etag = {k.lower(): v for k, v in (req.resp_headers or {}).items()}.get('etag')
+            self.response_cache.put(key, endpoint, result, etag)
+            if success_callback:
+                success_callback(req, result)
+
+        def on_error(error):
+            # Ошибка фоновой проверки не мешает уже показанным данным
+            if served_stale:
+                logger.warning(f"Background revalidation of {endpoint} failed: {error}")
+            elif error_callback:
+                error_callback(error)
+
+        request = self._make_request(endpoint, 'GET', headers=headers,
+                                     success_callback=on_response, error_callback=on_error)
+        handle.on_cancel(request.cancel)
+        return handle
+
     def _handle_error(self, req: UrlRequest, error: Exception, error_callback: Optional[Callable[[str], None]]):
         """Handle errors from HTTP requests."""
         logger.error(f"Request error: {error}")
@@ -33,13 +179,14 @@ class BaseAPIController:
 
         if req.result:
             try:
-                if isinstance(req.result, dict):
+                result = self._decode_response(req, req.result)
+                if isinstance(result, dict):
                     # Если результат уже словарь, используем его напрямую
-                    error_data = req.result
+                    error_data = result
                     error_message = error_data.get('detail', error_message)
-                elif isinstance(req.result, (str, bytes, bytearray)):
-                    # Если результат - строка или байты, пробуем распарсить JSON
-                    error_data = json.loads(req.result)
+                elif isinstance(result, str):
+                    # Если результат - строка, пробуем распарсить JSON
+                    error_data = json.loads(result)
                     error_message = error_data.get('detail', error_message)
                 else:
                     logger.warning(f"Unexpected result type: {type(req.result)}")
@@ -59,20 +206,83 @@ class BaseAPIController:
             req_body: Optional[str] = None,
             headers: Optional[Dict[str, str]] = None,
             success_callback: Optional[Callable[[UrlRequest, Any], None]] = None,
-            error_callback: Optional[Callable[[str], None]] = None
-    ):
-        """General method to make HTTP requests."""
+            error_callback: Optional[Callable[[str], None]] = None,
+            file_path: Optional[str] = None
+    ) -> RequestHandle:
+        """General method to make HTTP requests.
+
+        With file_path the response body is streamed to that file instead of memory.
+        The returned handle cancels the request; its callbacks are then not called.
+        """
         url = f"{self.base_url}{endpoint}"
-        logger.debug(f"Making {method} request to {url}")
-        logger.debug(f"Request body: {req_body}")
-        logger.debug(f"Request headers: {headers or self._get_headers()}")
+        req_headers = dict(headers or self._get_headers())
+        req_headers.setdefault("Accept-Encoding", ACCEPT_ENCODING)
+        # Тела и заголовки пишутся в лог только при включенном логировании (токен скрывается)
+        log_payload('>', method, url, req_headers, req_body)
+
+        if method.upper() not in ('GET', 'HEAD'):
+            success_callback = partial(self._handle_write_success, endpoint=endpoint, success_callback=success_callback)
 
-        UrlRequest(
+        on_success = partial(self._handle_success, success_callback=success_callback, error_callback=error_callback)
+        on_error = partial(self._handle_error, error_callback=error_callback)
+
+        # Тело приходит сырыми байтами и разбирается в _decode_response с учетом сжатия и формата
+        return self._request_with_refresh(
+            url, method, req_body, req_headers,
+            on_success=on_success, on_error=on_error, on_failure=on_error, file_path=file_path
+        )
+
+    def _request_with_refresh(
+            self,
+            url: str,
+            method: str,
+            req_body: Optional[str],
+            req_headers: Dict[str, str],
+            on_success: Callable,
+            on_error: Callable,
+            on_failure: Callable,
+            file_path: Optional[str] = None
+    ) -> RequestHandle:
+        """transport.request that refreshes the access token once on 401 and repeats the request.
+
+        on_failure gets the 401 only if the refresh failed.
+        """
+        handle = RequestHandle()
+        send_failure = on_failure
+
+        if self._can_refresh_token() and "Authorization" in req_headers:
+            def send_failure(req, result):
+                # Истекший или отозванный токен: один раз обновляем его и повторяем запрос
+                if getattr(req, 'resp_status', None) != 401 or handle.cancelled:
+                    on_failure(req, result)
+                    return
+
+                def retry(tokens):
+                    if handle.cancelled:
+                        return
+                    retry_headers = dict(req_headers, Authorization=f"Bearer {self.auth_controller.token}")
+                    handle.on_cancel(self.transport.request(
+                        url, method=method, req_body=req_body, req_headers=retry_headers, file_path=file_path,
+                        on_success=on_success, on_error=on_error, on_failure=on_failure
+                    ).cancel)
+
+                self.auth_controller.refresh(
+                    success_callback=retry,
+                    error_callback=lambda error: on_failure(req, result)
+                )
+
+        request = self.transport.request(
             url,
-            req_body=req_body,
             method=method,
-            req_headers=headers or self._get_headers(),
-            on_success=lambda req, result: success_callback(req, result) if success_callback else None,
-            on_error=partial(self._handle_error, error_callback=error_callback),
-            on_failure=partial(self._handle_error, error_callback=error_callback)
-        )
\ No newline at end of file
+            req_body=req_body,
+            req_headers=req_headers,
+            file_path=file_path,
+            on_success=on_success,
+            on_error=on_error,
+            on_failure=send_failure
+        )
+        handle.on_cancel(request.cancel)
+        return handle
+
+    def _can_refresh_token(self) -> bool:
+        return bool(self.auth_controller is not None and getattr(self.auth_controller, 'can_refresh', False))
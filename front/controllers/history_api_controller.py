@@ -1,6 +1,7 @@
 from typing import Dict, Any, Optional, Callable
 from functools import partial
 from .base_api_controller import BaseAPIController
+from .transport import RequestHandle, Transport
 import logging
 from urllib.parse import urlencode, quote
 from datetime import datetime
@@ -9,8 +10,8 @@ logger = logging.getLogger(__name__)
 
 
 class HistoryAPIController(BaseAPIController):
-    def __init__(self, base_url: str = "http://localhost:8000", auth_controller: Optional[Any] = None):
-        super().__init__(base_url=base_url, auth_controller=auth_controller)
+    def __init__(self, base_url: str = "http://localhost:8000", auth_controller: Optional[Any] = None, transport: Optional[Transport] = None):
+        super().__init__(base_url=base_url, auth_controller=auth_controller, transport=transport)
 
     def _prepare_filters(self, filters: Optional[Dict[str, Any]]) -> str:
         """
@@ -43,8 +44,11 @@ class HistoryAPIController(BaseAPIController):
             success_callback: Optional[Callable[[Any], None]] = None,
             error_callback: Optional[Callable[[str], None]] = None,
             filters: Optional[Dict[str, Any]] = None
-    ):
-        """Получение списка накладных с опциональными фильтрами."""
+    ) -> RequestHandle:
+        """Получение списка накладных с опциональными фильтрами.
+
+        Возвращает RequestHandle: после cancel() колбэки не вызываются.
+        """
         endpoint = "/api/v1/invoices/"
 
         # Добавляем фильтры к URL
@@ -69,12 +73,30 @@ class HistoryAPIController(BaseAPIController):
                 if error_callback:
                     error_callback(str(e))
 
+        return self._make_cached_request(
+            endpoint=endpoint,
+            success_callback=success_wrapper,
+            error_callback=error_callback
+        )
+
+    def export_invoices(
+            self,
+            file_path: str,
+            success_callback: Optional[Callable[[str], None]] = None,
+            error_callback: Optional[Callable[[str], None]] = None,
+            filters: Optional[Dict[str, Any]] = None
+    ):
+        """Скачивание PDF всех накладных по фильтру одним ZIP-архивом (потоково в файл)."""
+        endpoint = "/api/v1/invoices/export" + self._prepare_filters(filters)
+        logger.debug(f"Exporting invoices with filters: {filters} to {file_path}")
+
         self._make_request(
             endpoint=endpoint,
             method='GET',
             headers=self._get_headers(),
-            success_callback=success_wrapper,
-            error_callback=error_callback
+            success_callback=lambda req, result: success_callback(file_path) if success_callback else None,
+            error_callback=error_callback,
+            file_path=file_path
         )
 
     def delete_invoice(
@@ -130,10 +152,8 @@ class HistoryAPIController(BaseAPIController):
                 if error_callback:
                     error_callback(str(e))
 
-        self._make_request(
+        self._make_cached_request(
             endpoint=endpoint,
-            method='GET',
-            headers=self._get_headers(),
             success_callback=success_wrapper,
             error_callback=error_callback
         )
\ No newline at end of file
@@ -2,15 +2,53 @@
 from datetime import timedelta, datetime
 from typing import Dict, Any, Optional, Callable
 from .base_api_controller import BaseAPIController
+from .transport import Transport
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _api_items(invoice_data: Dict[str, Any]):
+    return [
+        {
+            "name": item["name"],
+            "article": item.get("article", ""),
+            "quantity": float(item["quantity"]),
+            "price": float(item["price"]),
+            "total": float(item["sum"])
+        }
+        for item in invoice_data.get("items", [])
+        if item.get("name") and item.get("quantity") and item.get("price")
+    ]
+
+
+def invoice_create_payload(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело POST /invoices/ из данных формы накладной"""
+    return {
+        "shop_id": int(invoice_data.get("shop_id", 1)),
+        "contact_info": str(invoice_data.get("contact", "")),
+        "additional_info": str(invoice_data.get("additional_info", "")),
+        "total_amount": float(invoice_data.get("total", 0)),
+        "is_paid": bool(invoice_data.get("is_paid", False)),
+        "items": _api_items(invoice_data)
+    }
+
+
+def invoice_update_payload(invoice_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Тело PATCH /invoices/{id} из данных формы накладной"""
+    return {
+        "contact_info": str(invoice_data.get("contact", "")),
+        "additional_info": str(invoice_data.get("additional_info", "")),
+        "total_amount": float(invoice_data.get("total", 0)),
+        "is_paid": bool(invoice_data.get("is_paid", False)),
+        "items": _api_items(invoice_data)
+    }
+
+
 class InvoiceAPIController(BaseAPIController):
-    def __init__(self, base_url: str = "http://localhost:8000", auth_controller: Optional[Any] = None):
-        super().__init__(base_url=base_url, auth_controller=auth_controller)
+    def __init__(self, base_url: str = "http://localhost:8000", auth_controller: Optional[Any] = None, transport: Optional[Transport] = None):
+        super().__init__(base_url=base_url, auth_controller=auth_controller, transport=transport)
 
     def create_invoice(
             self,
@@ -20,36 +58,17 @@ class InvoiceAPIController(BaseAPIController):
     ):
         """Create a new invoice."""
         endpoint = "/api/v1/invoices/"
-        logger.debug(f"Creating invoice with data: {invoice_data}")
+        logger.debug("Creating invoice")
 
         # Prepare invoice data for API
         try:
-            api_invoice_data = {
-                "shop_id": int(invoice_data.get("shop_id", 1)),
-                "contact_info": str(invoice_data.get("contact", "")),
-                "additional_info": str(invoice_data.get("additional_info", "")),
-                "total_amount": float(invoice_data.get("total", 0)),
-                "is_paid": bool(invoice_data.get("is_paid", False)),
-                "items": [
-                    {
-                        "name": item["name"],
-                        "article": item.get("article", ""),
-                        "quantity": float(item["quantity"]),
-                        "price": float(item["price"]),
-                        "total": float(item["sum"])
-                    }
-                    for item in invoice_data.get("items", [])
-                    if item.get("name") and item.get("quantity") and item.get("price")
-                ]
-            }
+            api_invoice_data = invoice_create_payload(invoice_data)
         except (ValueError, TypeError, KeyError) as e:
             logger.error(f"Invalid invoice data: {e}")
             if error_callback:
                 error_callback(f"Invalid invoice data: {e}")
             return
 
-        logger.debug(f"Prepared invoice data for API: {api_invoice_data}")
-
         req_body = json.dumps(api_invoice_data)
         self._make_request(
             endpoint=endpoint,
@@ -69,35 +88,17 @@ class InvoiceAPIController(BaseAPIController):
     ):
         """Update an existing invoice."""
         endpoint = f"/api/v1/invoices/{invoice_id}"
-        logger.debug(f"Updating invoice ID: {invoice_id} with data: {invoice_data}")
+        logger.debug(f"Updating invoice ID: {invoice_id}")
 
         # Prepare update data
         try:
-            update_data = {
-                "contact_info": str(invoice_data.get("contact", "")),
-                "additional_info": str(invoice_data.get("additional_info", "")),
-                "total_amount": float(invoice_data.get("total", 0)),
-                "is_paid": bool(invoice_data.get("is_paid", False)),
-                "items": [
-                    {
-                        "name": item["name"],
-                        "article": item.get("article", ""),
-                        "quantity": float(item["quantity"]),
-                        "price": float(item["price"]),
-                        "total": float(item["sum"])
-                    }
-                    for item in invoice_data.get("items", [])
-                    if item.get("name") and item.get("quantity") and item.get("price")
-                ]
-            }
+            update_data = invoice_update_payload(invoice_data)
         except (ValueError, TypeError, KeyError) as e:
             logger.error(f"Invalid invoice update data: {e}")
             if error_callback:
                 error_callback(f"Invalid invoice update data: {e}")
             return
 
-        logger.debug(f"Prepared update data for API: {update_data}")
-
         req_body = json.dumps(update_data)
         self._make_request(
             endpoint=endpoint,
@@ -118,10 +119,8 @@ class InvoiceAPIController(BaseAPIController):
         endpoint = f"/api/v1/invoices/{invoice_id}"
         logger.debug(f"Fetching invoice details for ID: {invoice_id}")
 
-        self._make_request(
+        self._make_cached_request(
             endpoint=endpoint,
-            method='GET',
-            headers=self._get_headers(),
             success_callback=lambda req, result: success_callback(result) if success_callback else None,
             error_callback=error_callback
         )
@@ -0,0 +1,494 @@
+# controllers/local_store.py
+"""
+Local SQLite copy of the user's invoices with a durable outbox.
+
+Screens read and write here, so they do not wait on the network.
+Every local change is stored together with an outbox entry in one
+transaction; SyncController later sends the outbox to the API and pulls
+the server state back. Each invoice remembers the version (a digest of the
+server record) its local edits were based on, which is how a concurrent
+change on the server is detected. Invoices created here also get a
+client_key that is sent with the create, so a repeated POST cannot produce
+a second server invoice.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+
+SYNCED = 'synced'
+PENDING = 'pending'
+CONFLICT = 'conflict'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    local_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    server_id INTEGER UNIQUE,
+    created_at TEXT NOT NULL DEFAULT '',
+    contact_info TEXT NOT NULL DEFAULT '',
+    additional_info TEXT NOT NULL DEFAULT '',
+    total_amount REAL NOT NULL DEFAULT 0,
+    is_paid INTEGER NOT NULL DEFAULT 0,
+    shop_id INTEGER,
+    server_version TEXT,
+    sync_state TEXT NOT NULL DEFAULT 'synced',
+    deleted INTEGER NOT NULL DEFAULT 0,
+    conflict_payload TEXT,
+    client_key TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_invoices_created ON invoices (created_at);
+
+CREATE TABLE IF NOT EXISTS invoice_items (
+    local_id INTEGER NOT NULL REFERENCES invoices (local_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    price REAL NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (local_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    local_id INTEGER NOT NULL,
+    payload TEXT,
+    base_version TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_local ON outbox (local_id);
+"""
+
+
+def invoice_version(invoice: Dict[str, Any]) -> str:
+    """Digest of the fields a user can edit in a server invoice record"""
+    normalized = {
+        'contact_info': invoice.get('contact_info') or '',
+        'additional_info': invoice.get('additional_info') or '',
+        'total_amount': round(float(invoice.get('total_amount') or 0), 2),
+        'is_paid': bool(invoice.get('is_paid')),
+        'items': [
+            [item.get('name') or '', float(item.get('quantity') or 0), round(float(item.get('price') or 0), 2)]
+            for item in invoice.get('items', [])
+        ],
+    }
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def store_path_for(username: str) -> str:
+    safe_name = ''.join(ch for ch in username if ch.isalnum() or ch in '-_.') or 'user'
+    return os.path.join(STORE_DIR, f"invoices_{safe_name}.sqlite3")
+
+
+class LocalInvoiceStore:
+    """Invoices, their items and the outbox in one SQLite file per user.
+
+    Used from the Kivy thread only.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        # Запись outbox, которая сейчас отправляется: новые правки к ней не подмешиваются
+        self.sending_id: Optional[int] = None
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _migrate(self) -> None:
+        """Bring a store created by an older version up to SCHEMA"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(invoices)")}
+        with self.conn:
+            if 'client_key' not in columns:
+                self.conn.execute("ALTER TABLE invoices ADD COLUMN client_key TEXT")
+            # Ключ нужен накладным, которые еще не дошли до сервера
+            unsent = self.conn.execute(
+                "SELECT local_id FROM invoices WHERE server_id IS NULL AND client_key IS NULL"
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE invoices SET client_key = ? WHERE local_id = ?",
+                ((str(uuid.uuid4()), row['local_id']) for row in unsent)
+            )
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_invoices_client_key ON invoices (client_key)")
+
+    # --- reads ----------------------------------------------------------
+
+    def list_invoices(self) -> List[Dict[str, Any]]:
+        """Visible invoices, newest first, in the API list format plus local_id and sync_state"""
+        rows = self.conn.execute(
+            "SELECT * FROM invoices WHERE deleted = 0 ORDER BY created_at DESC, local_id DESC"
+        ).fetchall()
+        return [self._row_to_invoice(row) for row in rows]
+
+    def get_invoice(self, local_id: int) -> Optional[Dict[str, Any]]:
+        """One invoice with items in the API detail format"""
+        row = self.conn.execute("SELECT * FROM invoices WHERE local_id = ?", (local_id,)).fetchone()
+        if row is None:
+            return None
+        invoice = self._row_to_invoice(row)
+        invoice['items'] = [
+            dict(item) for item in self.conn.execute(
+                "SELECT name, quantity, price, total FROM invoice_items WHERE local_id = ? ORDER BY position",
+                (local_id,)
+            )
+        ]
+        return invoice
+
+    def local_id_for(self, server_id: int) -> Optional[int]:
+        row = self.conn.execute("SELECT local_id FROM invoices WHERE server_id = ?", (server_id,)).fetchone()
+        return row['local_id'] if row else None
+
+    def conflicts(self) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT * FROM invoices WHERE sync_state = ?", (CONFLICT,)).fetchall()
+        return [self._row_to_invoice(row) for row in rows]
+
+    @staticmethod
+    def _row_to_invoice(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'id': row['server_id'],
+            'local_id': row['local_id'],
+            'created_at': row['created_at'],
+            'contact_info': row['contact_info'],
+            'additional_info': row['additional_info'],
+            'total_amount': row['total_amount'],
+            'is_paid': bool(row['is_paid']),
+            'shop_id': row['shop_id'],
+            'sync_state': row['sync_state'],
+        }
+
+    # --- local changes ----------------------------------------------------
+
+    def save_local(self, invoice_data: Dict[str, Any], local_id: Optional[int] = None) -> int:
+        """Store form data (InvoiceView._collect_invoice_data format) and queue it for sync"""
+        with self.conn:
+            if local_id is None:
+                cursor = self.conn.execute(
+                    "INSERT INTO invoices (created_at, shop_id, sync_state, client_key) VALUES (?, ?, ?, ?)",
+                    (invoice_data.get('created_at', ''), invoice_data.get('shop_id'), PENDING, str(uuid.uuid4()))
+                )
+                local_id = cursor.lastrowid
+                self._enqueue('create', local_id, invoice_data, None)
+            else:
+                row = self.conn.execute(
+                    "SELECT server_id, server_version FROM invoices WHERE local_id = ?", (local_id,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(f"Unknown local invoice {local_id}")
+                op = 'create' if row['server_id'] is None else 'update'
+                self._enqueue(op, local_id, invoice_data, row['server_version'])
+                self.conn.execute("UPDATE invoices SET sync_state = ? WHERE local_id = ?", (PENDING, local_id))
+
+            self._write_fields(local_id, invoice_data)
+        return local_id
+
+    def delete_local(self, local_id: int) -> None:
+        """Hide an invoice now and queue its deletion on the server"""
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT server_id, server_version FROM invoices WHERE local_id = ?", (local_id,)
+            ).fetchone()
+            if row is None:
+                return
+            in_flight = self.conn.execute(
+                "SELECT 1 FROM outbox WHERE id = ? AND local_id = ?", (self.sending_id or -1, local_id)
+            ).fetchone() is not None
+            self.conn.execute(
+                "DELETE FROM outbox WHERE local_id = ? AND id != ?", (local_id, self.sending_id or -1)
+            )
+            if row['server_id'] is None and not in_flight:
+                # Накладная не успела попасть на сервер: удалять там нечего
+                self.conn.execute("DELETE FROM invoices WHERE local_id = ?", (local_id,))
+                return
+            self.conn.execute(
+                "UPDATE invoices SET deleted = 1, sync_state = ? WHERE local_id = ?", (PENDING, local_id)
+            )
+            self.conn.execute(
+                "INSERT INTO outbox (op, local_id, payload, base_version, created_at) VALUES ('delete', ?, NULL, ?, ?)",
+                (local_id, row['server_version'], time.time())
+            )
+
+    def _enqueue(self, op: str, local_id: int, invoice_data: Dict[str, Any], base_version: Optional[str]) -> None:
+        payload = json.dumps(invoice_data, ensure_ascii=False, default=str)
+        # Неотправленную запись с тем же действием заменяем: на сервер уйдет только последнее состояние
+        pending = self.conn.execute(
+            "SELECT id FROM outbox WHERE local_id = ? AND op = ? AND id != ? ORDER BY id DESC LIMIT 1",
+            (local_id, op, self.sending_id or -1)
+        ).fetchone()
+        if pending is not None:
+            self.conn.execute("UPDATE outbox SET payload = ? WHERE id = ?", (payload, pending['id']))
+            return
+        self.conn.execute(
+            "INSERT INTO outbox (op, local_id, payload, base_version, created_at) VALUES (?, ?, ?, ?, ?)",
+            (op, local_id, payload, base_version, time.time())
+        )
+
+    def _write_fields(self, local_id: int, invoice_data: Dict[str, Any]) -> None:
+        self.conn.execute(
+            "UPDATE invoices SET contact_info = ?, additional_info = ?, total_amount = ?, is_paid = ? "
+            "WHERE local_id = ?",
+            (
+                invoice_data.get('contact', ''),
+                invoice_data.get('additional_info', ''),
+                float(invoice_data.get('total', 0)),
+                int(bool(invoice_data.get('is_paid'))),
+                local_id,
+            )
+        )
+        self._replace_items(local_id, (
+            (item.get('name', ''), item.get('quantity', 0), item.get('price', 0),
+             item.get('sum', float(item.get('quantity', 0)) * float(item.get('price', 0))))
+            for item in invoice_data.get('items', [])
+        ))
+
+    def _replace_items(self, local_id: int, items: Iterable) -> None:
+        self.conn.execute("DELETE FROM invoice_items WHERE local_id = ?", (local_id,))
+        self.conn.executemany(
+            "INSERT INTO invoice_items (local_id, position, name, quantity, price, total) VALUES (?, ?, ?, ?, ?, ?)",
+            ((local_id, position, name, float(quantity), float(price), float(total))
+             for position, (name, quantity, price, total) in enumerate(items))
+        )
+
+    # --- outbox ---------------------------------------------------------
+
+    def next_outbox_entry(self) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT outbox.*, invoices.server_id, invoices.client_key FROM outbox "
+            "LEFT JOIN invoices ON invoices.local_id = outbox.local_id ORDER BY outbox.id LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['payload'] = json.loads(entry['payload']) if entry['payload'] else None
+        return entry
+
+    def outbox_size(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def record_attempt(self, entry_id: int, error: str) -> None:
+        with self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?", (error, entry_id)
+            )
+
+    def drop_entry(self, entry_id: int, server_invoice: Optional[Dict[str, Any]] = None) -> None:
+        """Give up on an entry the server rejected.
+
+        Unless newer edits are queued, the invoice goes back to server_invoice
+        (the copy the edit was checked against). Without it the server version
+        is forgotten, so the next full pull overwrites the rejected edit.
+        """
+        with self.conn:
+            row = self.conn.execute("SELECT local_id FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+            if row is None:
+                return
+            local_id = row['local_id']
+            queued = self.conn.execute("SELECT 1 FROM outbox WHERE local_id = ? LIMIT 1", (local_id,)).fetchone()
+            if queued is None:
+                if server_invoice is not None:
+                    self._write_server_fields(local_id, server_invoice, invoice_version(server_invoice))
+                else:
+                    self.conn.execute("UPDATE invoices SET server_version = NULL WHERE local_id = ?", (local_id,))
+            self._refresh_state(local_id)
+
+    # --- server state ---------------------------------------------------
+
+    def apply_pushed(
+            self,
+            entry_id: int,
+            local_id: int,
+            server_invoice: Dict[str, Any],
+            resend: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """A create/update was accepted: remember the server id and version.
+
+        resend: form data the server did not apply (a repeated create returns
+        the invoice as the first request made it); it is queued as an update
+        unless newer edits of the invoice are already waiting.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+            self.conn.execute(
+                "UPDATE invoices SET server_id = ?, created_at = ?, shop_id = ?, server_version = ? WHERE local_id = ?",
+                (
+                    server_invoice['id'],
+                    server_invoice.get('created_at', ''),
+                    server_invoice.get('shop_id'),
+                    invoice_version(server_invoice),
+                    local_id,
+                )
+            )
+            # Более новые правки этой накладной еще в очереди: строим их на принятой версии
+            self.conn.execute(
+                "UPDATE outbox SET op = CASE op WHEN 'create' THEN 'update' ELSE op END, base_version = ? "
+                "WHERE local_id = ?",
+                (invoice_version(server_invoice), local_id)
+            )
+            if resend is not None:
+                queued = self.conn.execute("SELECT 1 FROM outbox WHERE local_id = ? LIMIT 1", (local_id,)).fetchone()
+                if queued is None:
+                    self._enqueue('update', local_id, resend, invoice_version(server_invoice))
+            self._refresh_state(local_id)
+
+    def apply_deleted(self, entry_id: int, local_id: int) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+            self.conn.execute("DELETE FROM invoices WHERE local_id = ?", (local_id,))
+
+    def _refresh_state(self, local_id: int) -> None:
+        queued = self.conn.execute("SELECT 1 FROM outbox WHERE local_id = ? LIMIT 1", (local_id,)).fetchone()
+        self.conn.execute(
+            "UPDATE invoices SET sync_state = ? WHERE local_id = ? AND sync_state != ?",
+            (PENDING if queued else SYNCED, local_id, CONFLICT)
+        )
+
+    def merge_server_page(self, invoices: List[Dict[str, Any]]) -> int:
+        """Upsert server invoices; rows with unsynced local changes are left alone.
+
+        Returns the number of rows that changed.
+        """
+        changed = 0
+        with self.conn:
+            for invoice in invoices:
+                version = invoice_version(invoice)
+                row = self.conn.execute(
+                    "SELECT local_id, server_version, sync_state FROM invoices WHERE server_id = ?",
+                    (invoice['id'],)
+                ).fetchone()
+                if row is None and invoice.get('client_key'):
+                    # Накладная создана отсюда, но ответ на POST не дошел: привязываем ее, а не дублируем
+                    row = self.conn.execute(
+                        "SELECT local_id, server_version, sync_state FROM invoices "
+                        "WHERE client_key = ? AND server_id IS NULL",
+                        (invoice['client_key'],)
+                    ).fetchone()
+                    if row is not None:
+                        self.conn.execute(
+                            "UPDATE invoices SET server_id = ? WHERE local_id = ?", (invoice['id'], row['local_id'])
+                        )
+                if row is not None and (row['sync_state'] != SYNCED or row['server_version'] == version):
+                    continue
+
+                if row is None:
+                    local_id = self.conn.execute(
+                        "INSERT INTO invoices (server_id, sync_state) VALUES (?, ?)", (invoice['id'], SYNCED)
+                    ).lastrowid
+                else:
+                    local_id = row['local_id']
+                self._write_server_fields(local_id, invoice, version)
+                changed += 1
+        return changed
+
+    def prune_missing(self, server_ids: Iterable[int]) -> int:
+        """Remove synced invoices that a complete pull no longer returned"""
+        seen = set(server_ids)
+        with self.conn:
+            rows = self.conn.execute(
+                "SELECT local_id, server_id FROM invoices WHERE server_id IS NOT NULL AND sync_state = ?", (SYNCED,)
+            ).fetchall()
+            missing = [row['local_id'] for row in rows if row['server_id'] not in seen]
+            self.conn.executemany("DELETE FROM invoices WHERE local_id = ?", ((local_id,) for local_id in missing))
+        return len(missing)
+
+    def _write_server_fields(self, local_id: int, invoice: Dict[str, Any], version: str) -> None:
+        self.conn.execute(
+            "UPDATE invoices SET created_at = ?, contact_info = ?, additional_info = ?, total_amount = ?, "
+            "is_paid = ?, shop_id = ?, server_version = ?, sync_state = ?, deleted = 0, conflict_payload = NULL "
+            "WHERE local_id = ?",
+            (
+                invoice.get('created_at', ''),
+                invoice.get('contact_info') or '',
+                invoice.get('additional_info') or '',
+                float(invoice.get('total_amount') or 0),
+                int(bool(invoice.get('is_paid'))),
+                invoice.get('shop_id'),
+                version,
+                SYNCED,
+                local_id,
+            )
+        )
+        self._replace_items(local_id, (
+            (item.get('name', ''), item.get('quantity', 0), item.get('price', 0),
+             item.get('total', float(item.get('quantity', 0)) * float(item.get('price', 0))))
+            for item in invoice.get('items', [])
+        ))
+
+    # --- conflicts ------------------------------------------------------
+
+    def mark_conflict(self, local_id: int, server_invoice: Optional[Dict[str, Any]]) -> None:
+        """Stop syncing an invoice the server changed under local edits.
+
+        The local edits stay in the row; the server copy is kept next to it
+        (None if the server deleted the invoice) until resolve_conflict().
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE local_id = ?", (local_id,))
+            self.conn.execute(
+                "UPDATE invoices SET sync_state = ?, conflict_payload = ? WHERE local_id = ?",
+                (CONFLICT, json.dumps(server_invoice, ensure_ascii=False, default=str), local_id)
+            )
+
+    def resolve_conflict(self, local_id: int, keep_local: bool) -> None:
+        """keep_local: push the local version over the server one; otherwise take the server copy"""
+        row = self.conn.execute("SELECT * FROM invoices WHERE local_id = ?", (local_id,)).fetchone()
+        if row is None or row['sync_state'] != CONFLICT:
+            return
+        server_invoice = json.loads(row['conflict_payload']) if row['conflict_payload'] else None
+
+        with self.conn:
+            if not keep_local:
+                if server_invoice is None:
+                    self.conn.execute("DELETE FROM invoices WHERE local_id = ?", (local_id,))
+                else:
+                    self._write_server_fields(local_id, server_invoice, invoice_version(server_invoice))
+                return
+
+            self.conn.execute(
+                "UPDATE invoices SET sync_state = ?, conflict_payload = NULL WHERE local_id = ?", (PENDING, local_id)
+            )
+            if server_invoice is None:
+                # На сервере накладную удалили: восстанавливаем ее как новую, с новым ключом
+                self.conn.execute(
+                    "UPDATE invoices SET server_id = NULL, deleted = 0, client_key = ? WHERE local_id = ?",
+                    (str(uuid.uuid4()), local_id)
+                )
+                op, base_version = 'create', None
+            else:
+                op = 'delete' if row['deleted'] else 'update'
+                base_version = invoice_version(server_invoice)
+            payload = None if op == 'delete' else json.dumps(self._form_data(local_id), ensure_ascii=False)
+            self.conn.execute(
+                "INSERT INTO outbox (op, local_id, payload, base_version, created_at) VALUES (?, ?, ?, ?, ?)",
+                (op, local_id, payload, base_version, time.time())
+            )
+
+    def _form_data(self, local_id: int) -> Dict[str, Any]:
+        """Local row in the InvoiceView form format used by the outbox"""
+        invoice = self.get_invoice(local_id)
+        return {
+            'contact': invoice['contact_info'],
+            'additional_info': invoice['additional_info'],
+            'total': invoice['total_amount'],
+            'is_paid': invoice['is_paid'],
+            'created_at': invoice['created_at'],
+            'shop_id': invoice['shop_id'] or 1,
+            'items': [
+                {'name': item['name'], 'quantity': item['quantity'], 'price': item['price'], 'sum': item['total']}
+                for item in invoice['items']
+            ],
+        }
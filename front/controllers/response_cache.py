@@ -0,0 +1,196 @@
+# controllers/response_cache.py
+"""
+LRU cache of decoded GET responses, persisted to disk.
+
+Entries are keyed by user and URL and carry the server ETag, so stale
+entries can be revalidated with If-None-Match: a 304 refreshes the entry
+without downloading the body again. How long an entry is served without
+asking the server, and whether a stale entry is shown while revalidating,
+is configured per endpoint in CACHE_POLICIES.
+
+Bodies are copied in and out, so callers may modify what they receive
+while the cache is being written to disk.
+"""
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'responses.json')
+CACHE_MAX_ENTRIES = 256
+# Запись на диск откладывается, чтобы серия ответов сохранялась одним файлом
+SAVE_DELAY = 1.0
+
+
+class CachePolicy:
+    """ttl: seconds an entry is served without contacting the server.
+
+    stale_while_revalidate: after ttl, return the cached data at once and
+    revalidate in the background; otherwise revalidate first (a 304 still
+    saves the download).
+    """
+
+    def __init__(self, ttl: float, stale_while_revalidate: bool = False):
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+
+
+CACHE_POLICIES = [
+    # Детали накладной открываются в форме редактирования: устаревшие данные не показываем
+    (re.compile(r'^/api/v1/invoices/\d+$'), CachePolicy(ttl=120)),
+    # Список можно показать сразу и обновить, когда придет ответ
+    (re.compile(r'^/api/v1/invoices/(\?.*)?$'), CachePolicy(ttl=30, stale_while_revalidate=True)),
+    # Дневные суммы для графиков меняются медленно
+    (re.compile(r'^/api/v1/analytics/series(\?.*)?$'), CachePolicy(ttl=300, stale_while_revalidate=True)),
+]
+
+# Данные, построенные из коллекции: запись в коллекцию сбрасывает и их
+DEPENDENT_SCOPES = {
+    '/api/v1/invoices': ('/api/v1/analytics',),
+}
+
+
+def policy_for(endpoint: str) -> Optional[CachePolicy]:
+    """Cache policy for an endpoint, or None if it is not cached"""
+    for pattern, policy in CACHE_POLICIES:
+        if pattern.match(endpoint):
+            return policy
+    return None
+
+
+class ResponseCache:
+    """Decoded response bodies with their ETags, bounded by entry count"""
+
+    def __init__(self, path: Optional[str] = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._save_timer: Optional[threading.Timer] = None
+
+    @staticmethod
+    def make_key(scope: str, base_url: str, endpoint: str) -> str:
+        return f"{scope}|{base_url}{endpoint}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Copy of the entry with 'body', 'etag' and 'stored_at', or None"""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return dict(entry, body=copy.deepcopy(entry['body']))
+
+    @staticmethod
+    def is_fresh(entry: Dict[str, Any], policy: CachePolicy) -> bool:
+        return time.time() - entry['stored_at'] < policy.ttl
+
+    def put(self, key: str, endpoint: str, body: Any, etag: Optional[str]) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            self._entries[key] = {
+                'endpoint': endpoint,
+                'body': copy.deepcopy(body),
+                'etag': etag,
+                'stored_at': time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._schedule_save()
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as just revalidated (server answered 304)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['stored_at'] = time.time()
+            self._entries.move_to_end(key)
+        self._schedule_save()
+
+    def invalidate_prefix(self, endpoint_prefix: str) -> None:
+        """Drop every entry whose endpoint starts with endpoint_prefix"""
+        self._ensure_loaded()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items()
+                     if entry['endpoint'].startswith(endpoint_prefix)]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            self._schedule_save()
+
+    def invalidate_scope(self, scope: str) -> None:
+        """Drop a collection's entries and everything derived from it (DEPENDENT_SCOPES)"""
+        for prefix in (scope, *DEPENDENT_SCOPES.get(scope, ())):
+            self.invalidate_prefix(prefix)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self._schedule_save()
+
+    # --- persistence ----------------------------------------------------
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path or not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+                for key, entry in stored:
+                    self._entries[key] = entry
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable response cache {self.path}: {e}")
+                self._entries.clear()
+
+    def _schedule_save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self) -> None:
+        """Write the cache to disk atomically (runs on a timer thread)"""
+        # Сериализуем под блокировкой: записи не меняются, пока строится текст
+        with self._lock:
+            self._save_timer = None
+            text = json.dumps(list(self._entries.items()), ensure_ascii=False, default=str)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save response cache: {e}")
+
+
+_shared_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Cache shared by all controllers"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ResponseCache()
+    return _shared_cache
@@ -0,0 +1,292 @@
+# controllers/sync_controller.py
+"""
+Background synchronisation between LocalInvoiceStore and the API.
+
+A sync pass first sends the outbox in order, one entry at a time, then
+pulls the invoices that changed on the server since the previous pass
+(updated_after cursor). Every FULL_PULL_INTERVAL, and on the first pass, the
+full list is pulled instead, so invoices deleted on the server are removed
+locally. Creates carry the invoice's client_key, so a create retried after a
+lost response returns the existing server invoice. Before an update or
+delete is sent, the current server record is compared with the version the
+local edit was based on; if someone else changed it meanwhile the invoice is
+marked as a conflict instead of being overwritten. Network failures leave
+the outbox untouched, so the next pass retries.
+"""
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+from urllib.parse import quote
+
+from kivy.clock import Clock
+
+from .base_api_controller import BaseAPIController
+from .invoice_api_controller import invoice_create_payload, invoice_update_payload
+from .local_store import LocalInvoiceStore, invoice_version, store_path_for
+from .transport import Transport
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL = 60  # секунды между фоновыми синхронизациями
+FULL_PULL_INTERVAL = 30 * 60  # секунды между полными выгрузками списка (удаление пропавших накладных)
+PULL_PAGE_SIZE = 100  # максимум, который отдает /invoices/
+INVOICES_ENDPOINT = "/api/v1/invoices/"
+
+DoneCallback = Callable[[Optional[int], Any], None]
+
+
+class SyncController(BaseAPIController):
+    """Sends the local outbox to the API and mirrors server invoices locally.
+
+    change_listeners are called with no arguments after a pass changed the
+    store; conflict_listeners receive the local invoice dict; error_listeners
+    receive a message for a change the server rejected.
+    """
+
+    def __init__(
+            self,
+            store: LocalInvoiceStore,
+            auth_controller: Any,
+            base_url: str = "http://localhost:8000",
+            transport: Optional[Transport] = None
+    ):
+        super().__init__(base_url=base_url, auth_controller=auth_controller, transport=transport)
+        self.store = store
+        self.change_listeners: List[Callable[[], None]] = []
+        self.conflict_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.error_listeners: List[Callable[[str], None]] = []
+        self._running = False
+        self._again = False
+        self._changed = False
+        self._event = None
+        self._stopped = False
+        # updated_at самой поздней полученной накладной: следующий проход берет только более новые
+        self._cursor: Optional[str] = None
+        self._next_cursor: Optional[str] = None
+        self._full_pull_at: Optional[float] = None
+
+    def start(self) -> None:
+        """Sync now and then every SYNC_INTERVAL seconds"""
+        if self._event is None:
+            self._event = Clock.schedule_interval(lambda dt: self.sync(), SYNC_INTERVAL)
+        self.sync()
+
+    def stop(self) -> None:
+        """Stop syncing; responses still in flight are ignored"""
+        self._stopped = True
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def sync(self) -> None:
+        """Start a pass; if one is running, another follows it"""
+        if self._stopped:
+            return
+        if self._running:
+            self._again = True
+            return
+        self._running = True
+        self._changed = False
+        self._push_next()
+
+    # --- requests ---------------------------------------------------------
+
+    def _send(self, method: str, endpoint: str, payload: Optional[Dict[str, Any]], on_done: DoneCallback) -> None:
+        """on_done(status, data): status is None when the server was not reached"""
+        def on_response(req, raw):
+            if self._stopped:
+                return
+            try:
+                data = self._decode_response(req, raw)
+            except Exception as e:
+                logger.error(f"Sync: failed to decode {method} {endpoint}: {e}")
+                data = None
+            on_done(req.resp_status, data)
+
+        # Через _request_with_refresh: истекший токен обновляется, и запрос повторяется
+        self._request_with_refresh(
+            f"{self.base_url}{endpoint}",
+            method,
+            json.dumps(payload) if payload is not None else None,
+            self._get_headers(),
+            on_success=on_response,
+            on_error=lambda req, error: None if self._stopped else on_done(None, str(error)),
+            on_failure=on_response
+        )
+
+    # --- push -------------------------------------------------------------
+
+    def _push_next(self) -> None:
+        entry = self.store.next_outbox_entry()
+        if entry is None:
+            self._start_pull()
+            return
+
+        self.store.sending_id = entry['id']
+        if entry['op'] == 'create':
+            payload = invoice_create_payload(entry['payload'])
+            if entry['client_key']:
+                payload['client_key'] = entry['client_key']
+            self._send('POST', INVOICES_ENDPOINT, payload,
+                       lambda status, data: self._on_pushed(entry, status, data))
+            return
+
+        # Перед изменением проверяем, не поменял ли накладную кто-то другой
+        self._send('GET', f"{INVOICES_ENDPOINT}{entry['server_id']}", None,
+                   lambda status, data: self._on_server_state(entry, status, data))
+
+    def _on_server_state(self, entry: Dict[str, Any], status: Optional[int], data: Any) -> None:
+        if status == 404:
+            if entry['op'] == 'delete':
+                self.store.apply_deleted(entry['id'], entry['local_id'])
+                self._changed = True
+                self._continue_push()
+            else:
+                self._conflict(entry, None)
+            return
+        if status != 200:
+            self._halt(entry, status, data)
+            return
+
+        if entry['base_version'] and invoice_version(data) != entry['base_version']:
+            self._conflict(entry, data)
+            return
+        # Если сервер отвергнет изменение, накладная вернется к этой копии
+        entry['server_invoice'] = data
+
+        endpoint = f"{INVOICES_ENDPOINT}{entry['server_id']}"
+        if entry['op'] == 'delete':
+            self._send('DELETE', endpoint, None, lambda status, data: self._on_pushed(entry, status, data))
+        else:
+            self._send('PATCH', endpoint, invoice_update_payload(entry['payload']),
+                       lambda status, data: self._on_pushed(entry, status, data))
+
+    def _on_pushed(self, entry: Dict[str, Any], status: Optional[int], data: Any) -> None:
+        if (status is not None and status < 400) or (entry['op'] == 'delete' and status == 404):
+            if entry['op'] == 'delete':
+                self.store.apply_deleted(entry['id'], entry['local_id'])
+            else:
+                # Повторный create возвращает накладную в том виде, в каком ее создал первый запрос
+                pushed = invoice_create_payload(entry['payload']) if entry['op'] == 'create' else None
+                resend = entry['payload'] if pushed and invoice_version(pushed) != invoice_version(data) else None
+                self.store.apply_pushed(entry['id'], entry['local_id'], data, resend)
+            self.response_cache.invalidate_scope(INVOICES_ENDPOINT.rstrip('/'))
+            self._changed = True
+            self._continue_push()
+            return
+
+        if status is not None and 400 <= status < 500 and status not in (401, 408, 429):
+            # Сервер отверг изменение: повтор не поможет
+            message = data.get('detail', data) if isinstance(data, dict) else data
+            logger.error(f"Sync: {entry['op']} of local invoice {entry['local_id']} rejected: {message}")
+            self.store.drop_entry(entry['id'], entry.get('server_invoice'))
+            self._changed = True
+            self._notify(self.error_listeners, f"Сервер отклонил изменение накладной: {message}")
+            self._continue_push()
+            return
+
+        self._halt(entry, status, data)
+
+    def _conflict(self, entry: Dict[str, Any], server_invoice: Optional[Dict[str, Any]]) -> None:
+        logger.warning(f"Sync: conflict on local invoice {entry['local_id']}")
+        self.store.mark_conflict(entry['local_id'], server_invoice)
+        self._changed = True
+        invoice = self.store.get_invoice(entry['local_id'])
+        if invoice is not None:
+            self._notify(self.conflict_listeners, invoice)
+        self._continue_push()
+
+    def _continue_push(self) -> None:
+        self.store.sending_id = None
+        self._push_next()
+
+    def _halt(self, entry: Dict[str, Any], status: Optional[int], data: Any) -> None:
+        """Server unreachable or failing: keep the outbox and retry on the next pass"""
+        error = f"HTTP {status}" if status is not None else str(data)
+        logger.warning(f"Sync: {entry['op']} of local invoice {entry['local_id']} postponed: {error}")
+        self.store.record_attempt(entry['id'], error)
+        self.store.sending_id = None
+        self._finish()
+
+    # --- pull -------------------------------------------------------------
+
+    def _start_pull(self) -> None:
+        """Pull the changes since the cursor, or the full list when it is due"""
+        self._next_cursor = self._cursor
+        full_due = self._full_pull_at is None or time.monotonic() - self._full_pull_at >= FULL_PULL_INTERVAL
+        self._pull(0, set() if full_due or self._cursor is None else None)
+
+    def _pull(self, skip: int, seen: Optional[Set[int]]) -> None:
+        """seen collects the ids of a full pull; None pulls only invoices changed since the cursor"""
+        endpoint = f"{INVOICES_ENDPOINT}?skip={skip}&limit={PULL_PAGE_SIZE}"
+        if seen is None:
+            # Граница включительно: накладные, измененные в ту же секунду, не теряются
+            endpoint += f"&updated_after={quote(self._cursor, safe='')}"
+        self._send('GET', endpoint, None, lambda status, data: self._on_page(skip, seen, status, data))
+
+    def _on_page(self, skip: int, seen: Optional[Set[int]], status: Optional[int], data: Any) -> None:
+        if status != 200 or not isinstance(data, list):
+            logger.warning(f"Sync: pull stopped at offset {skip}: {status} {data if status is None else ''}")
+            self._finish()
+            return
+
+        if self.store.merge_server_page(data):
+            self._changed = True
+        # Строки ISO одного формата сравниваются как даты
+        stamps = [invoice['updated_at'] for invoice in data if invoice.get('updated_at')]
+        if self._next_cursor:
+            stamps.append(self._next_cursor)
+        self._next_cursor = max(stamps, default=None)
+        if seen is not None:
+            seen.update(invoice['id'] for invoice in data)
+
+        if len(data) == PULL_PAGE_SIZE:
+            self._pull(skip + PULL_PAGE_SIZE, seen)
+            return
+
+        self._cursor = self._next_cursor
+        if seen is not None:
+            # Список получен целиком: удаленные на сервере накладные убираем и локально
+            if self.store.prune_missing(seen):
+                self._changed = True
+            self._full_pull_at = time.monotonic()
+        self._finish()
+
+    def _finish(self) -> None:
+        self._running = False
+        if self._changed:
+            self._notify(self.change_listeners)
+        if self._again:
+            self._again = False
+            self.sync()
+
+    @staticmethod
+    def _notify(listeners: List[Callable], *args) -> None:
+        for listener in list(listeners):
+            try:
+                listener(*args)
+            except Exception as e:
+                logger.exception(f"Sync listener failed: {e}")
+
+
+_sync_controller: Optional[SyncController] = None
+
+
+def get_sync_controller(auth_controller: Any) -> Optional[SyncController]:
+    """Sync controller for the logged-in user (None before login)"""
+    global _sync_controller
+    username = getattr(auth_controller, 'username', None)
+    if not username or not getattr(auth_controller, 'token', None):
+        return None
+
+    path = store_path_for(username)
+    if _sync_controller is not None and _sync_controller.store.path == path:
+        return _sync_controller
+
+    if _sync_controller is not None:
+        _sync_controller.stop()
+        _sync_controller.store.close()
+    _sync_controller = SyncController(LocalInvoiceStore(path), auth_controller=auth_controller)
+    _sync_controller.start()
+    return _sync_controller
@@ -0,0 +1,213 @@
+# controllers/telemetry.py
+"""
+Per-request timing for the HTTP transports.
+
+Every finished request leaves a RequestTiming in a fixed-size ring buffer:
+DNS, connect, time to first byte and total time, the server's own time
+from the Server-Timing header, time spent in the Kivy-thread callback,
+bytes in and out, status and retries. summary() turns the buffer into
+per-endpoint percentiles, so a slow screen can be attributed to the
+network, the server or the client. dump() writes everything to a JSON
+file for offline comparison.
+
+Request and response payloads are logged only when payload logging is
+switched on (INVOICE_LOG_PAYLOADS=1 or set_payload_logging(True)); the
+Authorization header and the bodies of auth endpoints are always redacted.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_MAX_RECORDS = 500
+DUMP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'request_telemetry.json')
+PAYLOAD_LOG_ENV = 'INVOICE_LOG_PAYLOADS'
+PAYLOAD_LOG_LIMIT = 2000
+PERCENTILES = (50, 90, 99)
+
+# /api/v1/invoices/42/status?x=1 -> /api/v1/invoices/{id}/status
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_SERVER_TIMING = re.compile(r'dur=([0-9.]+)')
+_REDACTED_HEADERS = frozenset({'authorization', 'cookie', 'set-cookie'})
+# Тела запросов и ответов авторизации содержат пароли и токены
+_REDACTED_BODY_PATHS = ('/api/v1/auth/',)
+
+_payload_logging = os.environ.get(PAYLOAD_LOG_ENV, '') not in ('', '0', 'false')
+
+
+def endpoint_key(method: str, url: str) -> str:
+    """Group key for a request: method and path with ids and query removed"""
+    path = re.sub(r'^[a-z]+://[^/]+', '', url).split('?', 1)[0] or '/'
+    return f"{method} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def server_time(headers: Optional[Dict[str, str]]) -> Optional[float]:
+    """Server processing time in seconds from a Server-Timing header"""
+    for key, value in (headers or {}).items():
+        if key.lower() == 'server-timing':
+            match = _SERVER_TIMING.search(value)
+            if match:
+                return float(match.group(1)) / 1000
+    return None
+
+
+class RequestTiming:
+    """Measurements of one request; times in seconds, None when not measured"""
+
+    __slots__ = ('started', 'method', 'url', 'endpoint', 'status', 'error', 'retries', 'reused',
+                 'dns', 'connect', 'ttfb', 'total', 'server', 'callback', 'bytes_out', 'bytes_in')
+
+    def __init__(self, method: str, url: str):
+        self.started = time.time()
+        self.method = method
+        self.url = url
+        self.endpoint = endpoint_key(method, url)
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.retries = 0
+        self.reused: Optional[bool] = None
+        self.dns: Optional[float] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.total: Optional[float] = None
+        self.server: Optional[float] = None
+        self.callback: Optional[float] = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values), max(1, math.ceil(p / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+class RequestTelemetry:
+    """Thread-safe ring buffer of the most recent RequestTiming records"""
+
+    def __init__(self, max_records: int = TELEMETRY_MAX_RECORDS):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, timing: RequestTiming) -> None:
+        with self._lock:
+            self._records.append(timing)
+
+    def records(self) -> List[RequestTiming]:
+        with self._lock:
+            return list(self._records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint count, errors, retries, bytes and p50/p90/p99 of each timing"""
+        groups: Dict[str, List[RequestTiming]] = {}
+        for timing in self.records():
+            groups.setdefault(timing.endpoint, []).append(timing)
+
+        summary = {}
+        for endpoint, timings in groups.items():
+            stats: Dict[str, Any] = {
+                'count': len(timings),
+                'errors': sum(1 for t in timings if t.error or (t.status or 0) >= 400),
+                'retries': sum(t.retries for t in timings),
+                'bytes_in': sum(t.bytes_in for t in timings),
+                'bytes_out': sum(t.bytes_out for t in timings),
+            }
+            for field in ('total', 'ttfb', 'server', 'callback', 'connect', 'dns'):
+                values = sorted(getattr(t, field) for t in timings if getattr(t, field) is not None)
+                if values:
+                    stats[field] = {f'p{p}': percentile(values, p) for p in PERCENTILES}
+            summary[endpoint] = stats
+        return summary
+
+    def format_summary(self) -> str:
+        """Plain-text table of summary() for logs and the debug overlay"""
+        summary = self.summary()
+        if not summary:
+            return 'No requests recorded'
+
+        def ms(stats, field, p):
+            value = stats.get(field, {}).get(f'p{p}')
+            return '-' if value is None else f"{value * 1000:.0f}"
+
+        lines = [f"{'endpoint':<42}{'n':>5}{'err':>5}{'total p50/p90/p99':>20}{'ttfb p50':>10}"
+                 f"{'server p50':>12}{'cb p50':>8}{'KB in':>8}"]
+        ordered = sorted(summary.items(), key=lambda item: -item[1].get('total', {}).get('p90', 0))
+        for endpoint, stats in ordered:
+            total = '/'.join(ms(stats, 'total', p) for p in PERCENTILES)
+            lines.append(
+                f"{endpoint[:41]:<42}{stats['count']:>5}{stats['errors']:>5}{total:>20}"
+                f"{ms(stats, 'ttfb', 50):>10}{ms(stats, 'server', 50):>12}{ms(stats, 'callback', 50):>8}"
+                f"{stats['bytes_in'] / 1024:>8.1f}"
+            )
+        return '\n'.join(lines)
+
+    def dump(self, path: str = DUMP_PATH) -> str:
+        """Write the summary and the raw records to a JSON file; returns the path"""
+        payload = {
+            'created': time.time(),
+            'summary': self.summary(),
+            'records': [timing.as_dict() for timing in self.records()],
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        logger.info(f"Request telemetry written to {path}")
+        return path
+
+
+_telemetry: Optional[RequestTelemetry] = None
+
+
+def get_telemetry() -> RequestTelemetry:
+    """Telemetry buffer shared by all transports"""
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = RequestTelemetry()
+    return _telemetry
+
+
+# --- payload logging ----------------------------------------------------------
+
+def payload_logging_enabled() -> bool:
+    return _payload_logging and logger.isEnabledFor(logging.DEBUG)
+
+
+def set_payload_logging(enabled: bool) -> None:
+    global _payload_logging
+    _payload_logging = enabled
+
+
+def redact_headers(headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+    return {key: ('***' if key.lower() in _REDACTED_HEADERS else value) for key, value in (headers or {}).items()}
+
+
+def log_payload(direction: str, method: str, url: str, headers: Optional[Dict[str, str]], body: Any) -> None:
+    """DEBUG log of one request or response; does nothing unless payload logging is on"""
+    if not payload_logging_enabled():
+        return
+    if any(path in url for path in _REDACTED_BODY_PATHS):
+        body = '***'
+    elif isinstance(body, (bytes, bytearray)):
+        body = f"<{len(body)} bytes>"
+    elif body is not None and len(str(body)) > PAYLOAD_LOG_LIMIT:
+        body = f"{str(body)[:PAYLOAD_LOG_LIMIT]}... ({len(str(body))} chars)"
+    logger.debug("%s %s %s headers=%s body=%s", direction, method, url, redact_headers(headers), body)
@@ -0,0 +1,450 @@
+# controllers/transport.py
+"""
+HTTP transports for BaseAPIController.
+
+UrlRequestTransport opens a new thread and TCP connection per call (the old
+behaviour). PooledHTTPTransport keeps persistent keep-alive connections on a
+small pool of worker threads, applies timeouts and retries with backoff, and
+delivers callbacks on the Kivy thread. Callbacks receive a response object
+with the same attributes the controllers read from UrlRequest: url,
+resp_status, resp_headers and result.
+
+Both transports record a RequestTiming per request in the shared
+telemetry buffer (see telemetry.py).
+"""
+import http.client
+import logging
+from abc import ABC, abstractmethod
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+from kivy.clock import Clock
+
+from .telemetry import RequestTelemetry, RequestTiming, get_telemetry, server_time
+
+logger = logging.getLogger(__name__)
+
+SuccessCallback = Callable[[Any, Any], None]
+ErrorCallback = Callable[[Any, Any], None]
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Ошибки, после которых соединение считается мертвым
+CONNECTION_ERRORS = (http.client.HTTPException, ConnectionError, socket.timeout, OSError)
+
+
+class HTTPResponse:
+    """Finished request as seen by controller callbacks (UrlRequest-compatible)"""
+
+    def __init__(self, url: str, method: str):
+        self.url = url
+        self.method = method
+        self.resp_status: Optional[int] = None
+        self.resp_headers: Dict[str, str] = {}
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.timing = RequestTiming(method, url)
+
+
+class RequestHandle:
+    """Returned by Transport.request; cancel() discards the response.
+
+    A request still waiting in the pool queue is not sent at all; one already
+    on the wire completes, but none of its callbacks are called.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._cancel_hooks: List[Callable[[], Any]] = []
+
+    def on_cancel(self, hook: Callable[[], Any]) -> None:
+        self._cancel_hooks.append(hook)
+
+    def cancel(self) -> None:
+        if self.cancelled:
+            return
+        self.cancelled = True
+        for hook in self._cancel_hooks:
+            hook()
+        self._cancel_hooks.clear()
+
+    def guard(self, callback: Optional[Callable]) -> Optional[Callable]:
+        """callback that does nothing once the request is cancelled"""
+        if callback is None:
+            return None
+
+        def guarded(*args):
+            if not self.cancelled:
+                callback(*args)
+        return guarded
+
+
+class Transport(ABC):
+    """Interface: send a request and call back on the Kivy thread.
+
+    on_success(resp, body) for 1xx-3xx responses, on_failure(resp, body) for
+    4xx/5xx and on_error(resp, exception) when no response was received.
+    Returns a RequestHandle.
+    """
+
+    @abstractmethod
+    def request(
+            self,
+            url: str,
+            method: str = 'GET',
+            req_body: Optional[str] = None,
+            req_headers: Optional[Dict[str, str]] = None,
+            file_path: Optional[str] = None,
+            on_success: Optional[SuccessCallback] = None,
+            on_failure: Optional[ErrorCallback] = None,
+            on_error: Optional[ErrorCallback] = None
+    ) -> RequestHandle:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class UrlRequestTransport(Transport):
+    """One kivy UrlRequest (thread + connection) per call.
+
+    UrlRequest does not expose connection phases, so only the total time,
+    status, bytes and callback time are recorded.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, telemetry: Optional[RequestTelemetry] = None):
+        self.timeout = timeout
+        self.telemetry = telemetry or get_telemetry()
+
+    def request(self, url, method='GET', req_body=None, req_headers=None, file_path=None,
+                on_success=None, on_failure=None, on_error=None) -> RequestHandle:
+        from kivy.network.urlrequest import UrlRequest
+
+        handle = RequestHandle()
+        timing = RequestTiming(method.upper(), url)
+        if req_body:
+            timing.bytes_out = len(req_body.encode('utf-8') if isinstance(req_body, str) else req_body)
+        started = time.perf_counter()
+
+        def timed(callback):
+            callback = handle.guard(callback)
+
+            def finish(req, value):
+                timing.total = time.perf_counter() - started
+                timing.status = getattr(req, 'resp_status', None)
+                timing.server = server_time(getattr(req, 'resp_headers', None))
+                if isinstance(value, Exception):
+                    timing.error = repr(value)
+                elif isinstance(value, (bytes, bytearray)):
+                    timing.bytes_in = len(value)
+                try:
+                    if callback is not None:
+                        callback_started = time.perf_counter()
+                        callback(req, value)
+                        timing.callback = time.perf_counter() - callback_started
+                finally:
+                    self.telemetry.record(timing)
+            return finish
+
+        on_success, on_failure, on_error = timed(on_success), timed(on_failure), timed(on_error)
+        request = UrlRequest(
+            url,
+            req_body=req_body,
+            method=method,
+            req_headers=req_headers,
+            decode=False,
+            file_path=file_path,
+            timeout=self.timeout,
+            on_success=on_success,
+            on_error=on_error,
+            on_failure=on_failure,
+            # UrlRequest отдает 3xx (в том числе 304) в on_redirect
+            on_redirect=on_success
+        )
+        if hasattr(request, 'cancel'):
+            handle.on_cancel(request.cancel)
+        return handle
+
+
+class PooledHTTPTransport(Transport):
+    """Keep-alive connection pool served by background worker threads.
+
+    Each worker thread owns one persistent connection per host, so up to
+    max_connections requests run concurrently and later requests reuse warm
+    connections. Idempotent requests are retried with exponential backoff on
+    network errors and on 429/502/503/504 (honouring Retry-After).
+    """
+
+    def __init__(
+            self,
+            max_connections: int = 4,
+            timeout: float = 10.0,
+            retries: int = 2,
+            backoff: float = 0.3,
+            max_backoff: float = 10.0,
+            idle_timeout: float = 4.0,
+            chunk_size: int = 64 * 1024,
+            telemetry: Optional[RequestTelemetry] = None
+    ):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Uvicorn закрывает простаивающие соединения через 5 с: переоткрываем раньше
+        self.idle_timeout = idle_timeout
+        self.chunk_size = chunk_size
+        self.telemetry = telemetry or get_telemetry()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._local = threading.local()
+        self._all_connections = []
+        self._connections_lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_connections, thread_name_prefix='http-pool'
+                )
+            return self._executor
+
+    def request(self, url, method='GET', req_body=None, req_headers=None, file_path=None,
+                on_success=None, on_failure=None, on_error=None) -> RequestHandle:
+        handle = RequestHandle()
+        future = self.executor.submit(
+            self._perform, url, method.upper(), req_body, dict(req_headers or {}), file_path,
+            handle.guard(on_success), handle.guard(on_failure), handle.guard(on_error)
+        )
+        # Запрос, еще стоящий в очереди пула, снимается и не занимает соединение
+        handle.on_cancel(future.cancel)
+        return handle
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        with self._connections_lock:
+            for conn in self._all_connections:
+                conn.close()
+            self._all_connections.clear()
+
+    # --- worker thread -------------------------------------------------
+
+    def _perform(self, url, method, req_body, req_headers, file_path, on_success, on_failure, on_error) -> None:
+        resp = HTTPResponse(url, method)
+        started = time.perf_counter()
+        try:
+            self._send_with_retries(resp, req_body, req_headers, file_path)
+        except Exception as e:
+            logger.error(f"{method} {url} failed: {e}")
+            resp.error = e
+            resp.timing.error = repr(e)
+            resp.timing.total = time.perf_counter() - started
+            self._deliver(on_error, resp, e)
+            return
+
+        resp.timing.total = time.perf_counter() - started
+        resp.timing.status = resp.resp_status
+        resp.timing.server = server_time(resp.resp_headers)
+
+        if resp.resp_status is not None and resp.resp_status >= 400:
+            self._deliver(on_failure, resp, resp.result)
+        else:
+            self._deliver(on_success, resp, resp.result)
+
+    def _send_with_retries(self, resp: HTTPResponse, req_body, req_headers, file_path) -> None:
+        idempotent = resp.method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                self._send_once(resp, req_body, req_headers, file_path)
+            except CONNECTION_ERRORS as e:
+                if not idempotent or attempt >= self.retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"{resp.method} {resp.url}: {e!r}, retry in {delay:.2f}s")
+            else:
+                if not (idempotent and resp.resp_status in RETRY_STATUSES and attempt < self.retries):
+                    return
+                delay = max(self._backoff_delay(attempt), self._retry_after(resp))
+                logger.warning(f"{resp.method} {resp.url}: HTTP {resp.resp_status}, retry in {delay:.2f}s")
+            time.sleep(min(delay, self.max_backoff))
+            attempt += 1
+            resp.timing.retries = attempt
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt)
+
+    @staticmethod
+    def _retry_after(resp: HTTPResponse) -> float:
+        value = {k.lower(): v for k, v in resp.resp_headers.items()}.get('retry-after')
+        try:
+            return float(value) if value is not None else 0.0
+        except ValueError:
+            return 0.0
+
+    def _send_once(self, resp: HTTPResponse, req_body, req_headers, file_path) -> None:
+        parts = urlsplit(resp.url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        body = req_body.encode('utf-8') if isinstance(req_body, str) else req_body
+        timing = resp.timing
+        # Размер запроса: строка запроса, заголовки и тело (оценка без служебных заголовков http.client)
+        timing.bytes_out += (len(resp.method) + len(path) + 11 + len(body or b'')
+                             + sum(len(k) + len(v) + 4 for k, v in req_headers.items()))
+
+        conn, reused = self._get_connection(parts.scheme, parts.hostname, parts.port)
+        timing.reused = reused
+        try:
+            try:
+                if not reused:
+                    self._connect(conn, timing)
+                sent = time.perf_counter()
+                conn.request(resp.method, path, body=body, headers=req_headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                if not reused or resp.method not in IDEMPOTENT_METHODS:
+                    raise
+                # Скорее всего сервер закрыл простаивавшее keep-alive соединение, но обрыв
+                # возможен и после обработки запроса - повторяем только идемпотентные методы
+                self._drop_connection(parts.scheme, parts.hostname, parts.port)
+                conn, _ = self._get_connection(parts.scheme, parts.hostname, parts.port)
+                timing.reused = False
+                self._connect(conn, timing)
+                sent = time.perf_counter()
+                conn.request(resp.method, path, body=body, headers=req_headers)
+                response = conn.getresponse()
+            timing.ttfb = time.perf_counter() - sent
+
+            resp.resp_status = response.status
+            resp.resp_headers = dict(response.getheaders())
+            timing.bytes_in += 15 + sum(len(k) + len(v) + 4 for k, v in resp.resp_headers.items())
+            if file_path and response.status < 400:
+                with open(file_path, 'wb') as f:
+                    while True:
+                        chunk = response.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        timing.bytes_in += len(chunk)
+                        f.write(chunk)
+                resp.result = None
+            else:
+                resp.result = response.read()
+                timing.bytes_in += len(resp.result)
+
+            if response.will_close:
+                self._drop_connection(parts.scheme, parts.hostname, parts.port)
+            else:
+                self._touch_connection(parts.scheme, parts.hostname, parts.port)
+        except Exception:
+            self._drop_connection(parts.scheme, parts.hostname, parts.port)
+            raise
+
+    @staticmethod
+    def _connect(conn, timing: RequestTiming) -> None:
+        """Open a new connection now, timing name resolution and TCP/TLS setup separately"""
+        def create_connection(address, timeout=None, source_address=None):
+            host, port = address
+            resolving = time.perf_counter()
+            addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            timing.dns = time.perf_counter() - resolving
+            error = None
+            for family, socktype, proto, _, sockaddr in addresses:
+                sock = socket.socket(family, socktype, proto)
+                try:
+                    sock.settimeout(timeout)
+                    if source_address:
+                        sock.bind(source_address)
+                    sock.connect(sockaddr)
+                    return sock
+                except OSError as e:
+                    error = e
+                    sock.close()
+            raise error or OSError(f"No addresses found for {host}")
+
+        conn._create_connection = create_connection
+        started = time.perf_counter()
+        conn.connect()
+        timing.connect = time.perf_counter() - started - (timing.dns or 0)
+
+    # Соединения живут в thread-local словаре: каждый поток пула работает со своими
+
+    def _connections(self) -> Dict[Any, list]:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        return connections
+
+    def _get_connection(self, scheme, host, port):
+        """Return (connection, reused) for the current worker thread"""
+        key = (scheme, host, port)
+        connections = self._connections()
+        entry = connections.get(key)
+        if entry is not None:
+            conn, last_used = entry
+            if time.monotonic() - last_used < self.idle_timeout:
+                return conn, True
+            self._drop_connection(scheme, host, port)
+
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=ssl.create_default_context()
+            )
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        connections[key] = [conn, time.monotonic()]
+        with self._connections_lock:
+            self._all_connections.append(conn)
+        return conn, False
+
+    def _touch_connection(self, scheme, host, port) -> None:
+        entry = self._connections().get((scheme, host, port))
+        if entry is not None:
+            entry[1] = time.monotonic()
+
+    def _drop_connection(self, scheme, host, port) -> None:
+        entry = self._connections().pop((scheme, host, port), None)
+        if entry is None:
+            return
+        conn = entry[0]
+        conn.close()
+        with self._connections_lock:
+            if conn in self._all_connections:
+                self._all_connections.remove(conn)
+
+    def _deliver(self, callback, resp: HTTPResponse, value) -> None:
+        def run(dt):
+            # Время обработки ответа в потоке Kivy (разбор, обновление интерфейса) тоже часть записи
+            try:
+                if callback is not None:
+                    started = time.perf_counter()
+                    callback(resp, value)
+                    resp.timing.callback = time.perf_counter() - started
+            finally:
+                self.telemetry.record(resp.timing)
+        Clock.schedule_once(run)
+
+
+_default_transport: Optional[Transport] = None
+
+
+def get_default_transport() -> Transport:
+    """Transport shared by controllers that were not given their own"""
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = PooledHTTPTransport()
+    return _default_transport
+
+
+def set_default_transport(transport: Transport) -> None:
+    global _default_transport
+    _default_transport = transport
@@ -3,13 +3,34 @@ from kivy.lang import Builder
 from kivy.uix.screenmanager import ScreenManager
 from kivy.core.window import Window
 from kivy.metrics import dp
-from front.views.analytics_view import AnalyticsView
 from front.views.auth_view import AuthView
-from front.views.history_view import HistoryView
-from front.views.main_view import MainView
-from front.views.invoice_view import InvoiceView
 from front.controllers.auth_controller import AuthAPIController
 
+KV_DIR = 'views/kv_view'
+# F12 - окно телеметрии запросов
+TELEMETRY_KEY = 293
+
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager, создающий экраны при первом переходе на них.
+
+    register_screen(name, factory): factory(sm) строит экран и добавляет его
+    в sm. Переход через current и get_screen строят экран по требованию.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._factories = {}
+
+    def register_screen(self, name, factory) -> None:
+        self._factories[name] = factory
+
+    def get_screen(self, name):
+        factory = self._factories.pop(name, None)
+        if factory is not None:
+            factory(self)
+        return super().get_screen(name)
+
 
 class InvoiceApp(App):
     def __init__(self, **kwargs):
@@ -32,35 +53,72 @@ class InvoiceApp(App):
         Window.softinput_mode = 'pan'
         Window.rotation = 0
 
+        self._loaded_kv = set()
+        self.auth_controller = None
+        self._telemetry_overlay = None
+        Window.bind(on_keyboard=self._on_keyboard)
+
+    def _on_keyboard(self, window, key, *args):
+        if key == TELEMETRY_KEY:
+            self.show_telemetry()
+            return True
+        return False
+
+    def show_telemetry(self) -> None:
+        """Отладочное окно со временем запросов (создается при первом открытии)"""
+        if self._telemetry_overlay is None:
+            from front.views.telemetry_overlay import TelemetryOverlay
+            self._telemetry_overlay = TelemetryOverlay()
+        self._telemetry_overlay.open()
+
+    def load_kv(self, *names: str) -> None:
+        """Загрузка правил .kv (каждый файл один раз)"""
+        for name in names:
+            if name not in self._loaded_kv:
+                Builder.load_file(f'{KV_DIR}/{name}')
+                self._loaded_kv.add(name)
+
     def build(self):
 
-        Builder.load_file('views/kv_view/styles.kv')
-        Builder.load_file('views/kv_view/date_picker.kv')
-        Builder.load_file('views/kv_view/invoice_table.kv')
-        Builder.load_file('views/kv_view/invoice_history_item.kv')
-        Builder.load_file('views/kv_view/auth.kv')
-        Builder.load_file('views/kv_view/main.kv')
-        Builder.load_file('views/kv_view/invoice.kv')
-        Builder.load_file('views/kv_view/history.kv')
-        Builder.load_file('views/kv_view/analytics.kv')
+        # До первого кадра строится только экран входа; остальные экраны,
+        # их .kv и зависимости загружаются при первом переходе на них
+        self.load_kv('styles.kv', 'auth.kv')
 
-        sm = ScreenManager()
-        auth_controller = AuthAPIController()
+        sm = LazyScreenManager()
+        self.auth_controller = AuthAPIController()
 
         auth_view = AuthView(sm)
-        auth_view.auth_controller = auth_controller
+        auth_view.auth_controller = self.auth_controller
 
+        sm.register_screen('main', self._build_main)
+        sm.register_screen('invoice', self._build_invoice)
+        sm.register_screen('history', self._build_history)
+        sm.register_screen('analytics', self._build_analytics)
+
+        return sm
+
+    def _build_main(self, sm):
+        from front.views.main_view import MainView
+        self.load_kv('main.kv')
         MainView(sm)
 
+    def _build_invoice(self, sm):
+        from front.views.invoice_view import InvoiceView
+        self.load_kv('invoice_table.kv', 'invoice.kv')
         invoice_view = InvoiceView(sm)
-        invoice_view.auth_controller = auth_controller
+        invoice_view.auth_controller = self.auth_controller
 
+    def _build_history(self, sm):
+        from front.views.history_view import HistoryView
+        self.load_kv('date_picker.kv', 'invoice_history_item.kv', 'history.kv')
         history_view = HistoryView(sm)
-        history_view.auth_controller = auth_controller
-
-        AnalyticsView(sm)
+        history_view.auth_controller = self.auth_controller
 
-        return sm
+    def _build_analytics(self, sm):
+        from front.views.analytics_view import AnalyticsView
+        self.load_kv('analytics.kv')
+        analytics_view = AnalyticsView(sm)
+        analytics_view.auth_controller = self.auth_controller
 
 
 if __name__ == '__main__':
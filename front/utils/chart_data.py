@@ -0,0 +1,90 @@
+# utils/chart_data.py
+"""
+Подготовка рядов для графиков аналитики (без Kivy).
+
+Сервер отдает суммы по дням и магазинам в виде колонок; здесь они
+сворачиваются в плотные дневные ряды, а длинные ряды прореживаются до
+ширины графика алгоритмом LTTB (Largest-Triangle-Three-Buckets), который
+сохраняет пики и провалы, в отличие от простого шага по индексам.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+
+class DailySeries:
+    """Плотные дневные ряды: элемент i относится к дню start + i"""
+
+    __slots__ = ('start', 'revenue', 'invoices', 'paid_amount', 'paid_invoices')
+
+    def __init__(self, start: date, days: int):
+        self.start = start
+        self.revenue = [0.0] * days
+        self.invoices = [0] * days
+        self.paid_amount = [0.0] * days
+        self.paid_invoices = [0] * days
+
+    def __len__(self) -> int:
+        return len(self.revenue)
+
+    def day(self, index: int) -> date:
+        return self.start + timedelta(days=index)
+
+    @property
+    def unpaid_amount(self) -> List[float]:
+        return [total - paid for total, paid in zip(self.revenue, self.paid_amount)]
+
+    @classmethod
+    def from_response(cls, data: Dict[str, Any], shop_id: Optional[int] = None) -> 'DailySeries':
+        """Ответ /analytics/series -> ряды по всем магазинам или по одному shop_id"""
+        start = date.fromisoformat(str(data['start']))
+        end = date.fromisoformat(str(data['end']))
+        series = cls(start, (end - start).days + 1)
+        for i, day in enumerate(data.get('day', [])):
+            if shop_id is not None and data['shop_id'][i] != shop_id:
+                continue
+            index = (date.fromisoformat(str(day)) - start).days
+            if not 0 <= index < len(series):
+                continue
+            series.revenue[index] += data['revenue'][i]
+            series.invoices[index] += data['invoices'][i]
+            series.paid_amount[index] += data['paid_amount'][i]
+            series.paid_invoices[index] += data['paid_invoices'][i]
+        return series
+
+
+def lttb(values: Sequence[float], threshold: int, first: int = 0, last: Optional[int] = None) -> List[int]:
+    """Индексы точек values[first:last], оставляемых LTTB при прореживании до threshold точек.
+
+    x точки - ее индекс. Первая и последняя точки сохраняются всегда.
+    """
+    last = len(values) if last is None else last
+    count = last - first
+    if threshold >= count or threshold < 3:
+        return list(range(first, last))
+
+    selected = [first]
+    bucket_size = (count - 2) / (threshold - 2)
+    a = first
+    for bucket in range(threshold - 2):
+        # Текущая корзина и средняя точка следующей
+        start = first + int(bucket * bucket_size) + 1
+        end = first + int((bucket + 1) * bucket_size) + 1
+        next_start = end
+        next_end = min(first + int((bucket + 2) * bucket_size) + 1, last)
+        if next_end <= next_start:
+            next_start, next_end = last - 1, last
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        ax, ay = a, values[a]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            # Удвоенная площадь треугольника (a, i, среднее следующей корзины)
+            area = abs((ax - avg_x) * (values[i] - ay) - (ax - i) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        selected.append(best)
+        a = best
+
+    selected.append(last - 1)
+    return selected
@@ -1,28 +1,49 @@
 from kivy.uix.popup import Popup
-from kivy.uix.button import Button
-from kivy.uix.label import Label
-from kivy.metrics import dp
-from datetime import datetime
+from datetime import date
 import calendar
-from kivy.properties import ObjectProperty, NumericProperty, StringProperty
+from typing import Callable, List, Optional
+from kivy.properties import ObjectProperty, NumericProperty, StringProperty, BooleanProperty
 from kivy.factory import Factory
 
+# Максимум ячеек месяца: 6 недель по 7 дней
+CALENDAR_CELLS = 42
+
+MONTHS = {
+    1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
+    5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
+    9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
+}
+
+_month_calendar = calendar.Calendar(firstweekday=calendar.MONDAY)
+
 
 class CustomDatePicker(Popup):
+    """Календарь с ячейками, созданными один раз.
+
+    При смене месяца ячейки только переподписываются. Один экземпляр можно
+    открывать повторно через open_for; в режиме диапазона первое нажатие
+    задает начало, второе - конец, и callback получает обе даты.
+    """
     calendar_grid = ObjectProperty(None)
     month_year_label = ObjectProperty(None)
     current_month = NumericProperty()
     current_year = NumericProperty()
     current_day = NumericProperty()
     selected_date = StringProperty()
+    range_mode = BooleanProperty(False)
 
-    def __init__(self, callback, **kwargs):
-        today = datetime.now()
+    def __init__(self, callback: Optional[Callable] = None, range_mode: bool = False, **kwargs):
+        today = date.today()
         self.current_month = today.month
         self.current_year = today.year
         self.current_day = today.day
         self.callback = callback
+        self.range_start: Optional[date] = None
+        self.range_end: Optional[date] = None
+        self._cells: List = []
+        self._cell_days: List[Optional[date]] = [None] * CALENDAR_CELLS
         super(CustomDatePicker, self).__init__(**kwargs)
+        self.range_mode = range_mode
         self.setup_calendar()
 
     def setup_calendar(self):
@@ -35,68 +56,101 @@ class CustomDatePicker(Popup):
                 text=day,
                 color=getattr(self, 'title_color', default_color)
             ))
+
+        # Ячейки дней создаются и привязываются один раз
+        for index in range(CALENDAR_CELLS):
+            cell = Factory.CalendarButton()
+            cell.cell_index = index
+            cell.bind(on_release=self._on_cell_release)
+            self.ids.calendar_grid.add_widget(cell)
+            self._cells.append(cell)
         self.update_calendar()
 
+    def open_for(self, callback: Callable, start: Optional[date] = None, end: Optional[date] = None,
+                 range_mode: bool = False) -> None:
+        """Повторное открытие того же календаря с новой целью и текущим выбором"""
+        self.callback = callback
+        self.range_mode = range_mode
+        self.range_start = start
+        self.range_end = end if range_mode else None
+        shown = start or date.today()
+        self.current_year, self.current_month = shown.year, shown.month
+        self.update_calendar()
+        self.open()
+
     def get_month_year_text(self):
-        months = {
-            1: 'Январь', 2: 'Февраль', 3: 'Март', 4: 'Апрель',
-            5: 'Май', 6: 'Июнь', 7: 'Июль', 8: 'Август',
-            9: 'Сентябрь', 10: 'Октябрь', 11: 'Ноябрь', 12: 'Декабрь'
-        }
-        return f"{months[self.current_month]} {self.current_year}"
+        return f"{MONTHS[self.current_month]} {self.current_year}"
 
     def update_calendar(self):
-        if not hasattr(self, 'ids') or 'calendar_grid' not in self.ids:
+        if not self._cells:
             return
 
-        self.ids.calendar_grid.clear_widgets()
         self.ids.month_year_label.text = self.get_month_year_text()
+        days = list(_month_calendar.itermonthdates(self.current_year, self.current_month))
+        for index in range(CALENDAR_CELLS):
+            day = days[index] if index < len(days) else None
+            # Дни соседних месяцев не показываем
+            self._cell_days[index] = day if day is not None and day.month == self.current_month else None
+        self._refresh_marks()
+
+    def _refresh_marks(self):
+        """Подписи и подсветка ячеек: сегодня, выбранные даты и дни между ними"""
+        today = date.today()
+        start, end = self.range_start, self.range_end
+        for cell, day in zip(self._cells, self._cell_days):
+            if day is None:
+                cell.text = ''
+                cell.disabled = True
+                cell.opacity = 0
+                continue
+            cell.text = str(day.day)
+            cell.disabled = False
+            cell.opacity = 1
+            if day == start or day == end:
+                cell.mark = 'selected'
+            elif start and end and start < day < end:
+                cell.mark = 'range'
+            elif day == today:
+                cell.mark = 'today'
+            else:
+                cell.mark = ''
+
+    def _on_cell_release(self, cell):
+        day = self._cell_days[cell.cell_index]
+        if day is not None:
+            self.select_date(day)
+
+    def select_date(self, day: date):
+        if not self.range_mode:
+            self._finish(day)
+            return
 
-        # Получаем календарь на текущий месяц
-        cal = calendar.monthcalendar(self.current_year, self.current_month)
-
-        for week in cal:
-            for day in week:
-                if day == 0:
-                    # Пустая ячейка
-                    btn = Factory.CalendarDayLabel(
-                        text='',
-                        size_hint_y=None,
-                        height=dp(35)
-                    )
-                else:
-                    # Кнопка с днём
-                    btn = Factory.CalendarButton(
-                        text=str(day),
-                        size_hint_y=None,
-                        height=dp(35)
-                    )
-
-                    # Выделяем текущий день
-                    if (day == datetime.now().day and
-                            self.current_month == datetime.now().month and
-                            self.current_year == datetime.now().year):
-                        btn.background_color = (0.3, 0.7, 1, 1)
-
-                    # Создаем замыкание для корректной привязки дня
-                    def create_callback(day_value):
-                        return lambda instance: self.select_date(day_value)
-
-                    btn.bind(on_release=create_callback(day))
-
-                self.ids.calendar_grid.add_widget(btn)
-
-    def select_date(self, day):
-        selected_date = datetime(self.current_year, self.current_month, day)
-        formatted_date = selected_date.strftime('%Y-%m-%d')
-        self.callback(formatted_date)
+        if self.range_start is None or self.range_end is not None:
+            # Новый диапазон
+            self.range_start, self.range_end = day, None
+            self._refresh_marks()
+            return
+
+        start, end = sorted((self.range_start, day))
+        self.range_start, self.range_end = start, end
+        self._finish(start, end)
+
+    def apply_selection(self, instance=None):
+        """Применить выбор диапазона как есть, в том числе только начальную дату"""
+        if self.range_start is not None:
+            self._finish(self.range_start, self.range_end)
+        else:
+            self.dismiss()
+
+    def _finish(self, start: date, end: Optional[date] = None):
+        if self.range_mode:
+            self.callback(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d') if end else None)
+        else:
+            self.callback(start.strftime('%Y-%m-%d'))
         self.dismiss()
 
     def set_today(self, instance):
-        today = datetime.now()
-        formatted_date = today.strftime('%Y-%m-%d')
-        self.callback(formatted_date)
-        self.dismiss()
+        self.select_date(date.today())
 
     def prev_month(self, instance):
         if self.current_month == 1:
@@ -112,4 +166,4 @@ class CustomDatePicker(Popup):
             self.current_year += 1
         else:
             self.current_month += 1
-        self.update_calendar()
\ No newline at end of file
+        self.update_calendar()
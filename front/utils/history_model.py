@@ -0,0 +1,184 @@
+# utils/history_model.py
+"""
+Модель списка накладных для HistoryView.
+
+Накладные разбираются один раз при загрузке: дата, сумма и ключи поиска
+хранятся в компактных записях уже в нужных типах. Фильтры и сортировки
+работают со списком индексов записей и не трогают строки, а словари для
+RecycleView создаются только для показываемых записей и переиспользуются
+между проходами.
+"""
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def _parse_date(value: str) -> Optional[date]:
+    # fromisoformat на порядок быстрее strptime
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class InvoiceRecord:
+    """Одна накладная в разобранном виде"""
+
+    __slots__ = ('server_id', 'local_id', 'date_text', 'date', 'contact', 'contact_key',
+                 'number_key', 'total', 'is_paid', '_display')
+
+    def __init__(self, invoice: Dict[str, Any]):
+        server_id = invoice.get('id')
+        self.server_id: Optional[int] = int(server_id) if server_id else None
+        # local_id есть у строк из локального хранилища; у строк с сервера он 0
+        self.local_id: int = invoice.get('local_id') or 0
+        created_at = invoice.get('created_at') or ''
+        self.date_text: str = created_at.split('T')[0]
+        self.date: Optional[date] = _parse_date(self.date_text)
+        self.contact: str = invoice.get('contact_info') or ''
+        self.contact_key: str = self.contact.lower()
+        self.number_key: str = str(self.server_id) if self.server_id else ''
+        self.total: float = float(invoice.get('total_amount') or 0.0)
+        self.is_paid: bool = bool(invoice.get('is_paid', False))
+        self._display: Optional[Dict[str, Any]] = None
+
+    def display(self) -> Dict[str, Any]:
+        """Словарь для InvoiceItemWidget (создается при первом показе)"""
+        if self._display is None:
+            self._display = {
+                'local_id': self.local_id,
+                'number': self.number_key or 'нов.',
+                'date': self.date_text,
+                'contact': self.contact,
+                'total': f"{self.total:.2f}",
+                'is_paid': self.is_paid,
+            }
+        return self._display
+
+
+# Ключи сортировки по полям, которые показывает список
+SORT_KEYS = {
+    'number': lambda record: (record.server_id is None, record.server_id or 0),
+    'date': lambda record: record.date or date.min,
+    'contact': lambda record: record.contact_key,
+    'total': lambda record: record.total,
+    'is_paid': lambda record: record.is_paid,
+}
+
+
+class HistoryModel:
+    """Все загруженные накладные и текущая выборка (индексы в порядке показа)"""
+
+    def __init__(self):
+        self.records: List[InvoiceRecord] = []
+        self.order: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def load(self, invoices: Iterable[Dict[str, Any]]) -> None:
+        """Заменяет данные; выборка - все накладные в исходном порядке"""
+        self.records = [InvoiceRecord(invoice) for invoice in invoices]
+        self.order = list(range(len(self.records)))
+
+    def reset(self) -> None:
+        """Выборка без фильтров в порядке загрузки"""
+        self.order = list(range(len(self.records)))
+
+    def filter(self, filters: Dict[str, Any]) -> None:
+        """Оставляет в выборке записи, подходящие под фильтры запроса /invoices/"""
+        records = self.records
+        indices = range(len(records))
+
+        number = filters.get('number')
+        if number:
+            number = number.lower()
+            indices = [i for i in indices if number in records[i].number_key]
+        if filters.get('created_after'):
+            date_from = filters['created_after'].date()
+            indices = [i for i in indices if records[i].date and records[i].date >= date_from]
+        if filters.get('created_before'):
+            date_to = filters['created_before'].date()
+            indices = [i for i in indices if records[i].date and records[i].date <= date_to]
+        contact = filters.get('contact')
+        if contact:
+            contact = contact.lower()
+            indices = [i for i in indices if contact in records[i].contact_key]
+        if 'min_amount' in filters:
+            indices = [i for i in indices if records[i].total >= filters['min_amount']]
+        if 'max_amount' in filters:
+            indices = [i for i in indices if records[i].total <= filters['max_amount']]
+        if 'is_paid' in filters:
+            indices = [i for i in indices if records[i].is_paid == filters['is_paid']]
+
+        self.order = list(indices)
+
+    def sort(self, field: str, reverse: bool = False) -> None:
+        key = SORT_KEYS[field]
+        records = self.records
+        self.order.sort(key=lambda i: key(records[i]), reverse=reverse)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Строки выборки для RecycleView"""
+        records = self.records
+        return [records[i].display() for i in self.order]
+
+    def groups(self, field: str) -> List[Tuple[Any, List[int]]]:
+        """Выборка, разбитая по значению поля: [(значение, индексы)], по возрастанию значения"""
+        key = SORT_KEYS[field]
+        grouped: Dict[Any, List[int]] = {}
+        for i in self.order:
+            grouped.setdefault(key(self.records[i]), []).append(i)
+        return sorted(grouped.items(), key=lambda item: item[0])
+
+    def grouped_rows(self, field: str) -> List[Dict[str, Any]]:
+        """Строки выборки с заголовками групп"""
+        rows = []
+        for _, indices in self.groups(field):
+            group = [self.records[i] for i in indices]
+            first = group[0]
+            if field == 'is_paid':
+                header_text = 'Оплачено' if first.is_paid else 'Не оплачено'
+            else:
+                header_text = first.display()[field] or 'Не указано'
+            rows.append({
+                'is_group_header': True,
+                'local_id': 0,
+                'number': '',
+                'date': '',
+                'contact': f"{header_text} ({len(group)} шт.)",
+                'total': f"{sum(record.total for record in group):.2f}",
+                'is_paid': all(record.is_paid for record in group)
+            })
+            rows.extend(record.display() for record in group)
+        return rows
+
+    # --- точечные изменения ------------------------------------------------
+
+    def find(self, server_id: int) -> Optional[int]:
+        for i, record in enumerate(self.records):
+            if record.server_id == server_id:
+                return i
+        return None
+
+    def update(self, invoice: Dict[str, Any]) -> bool:
+        """Заменяет запись накладной с тем же id; False, если ее нет"""
+        i = self.find(int(invoice.get('id') or 0))
+        if i is None:
+            return False
+        record = InvoiceRecord(invoice)
+        if not record.local_id:
+            record.local_id = self.records[i].local_id
+        self.records[i] = record
+        return True
+
+    def remove(self, server_id: int) -> None:
+        i = self.find(server_id)
+        if i is None:
+            return
+        del self.records[i]
+        self.order = [j if j < i else j - 1 for j in self.order if j != i]
+
+    def prepend(self, invoice: Dict[str, Any]) -> None:
+        """Новая накладная в начало списка и выборки"""
+        self.records.insert(0, InvoiceRecord(invoice))
+        self.order = [0] + [i + 1 for i in self.order]
@@ -3,8 +3,10 @@ import os
 import subprocess
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
-from front.utils.pdf_generator import InvoicePDFGenerator
-from front.utils.share_pdf import ShareManager
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.progressbar import ProgressBar
+from front.utils.pdf_worker import get_pdf_worker
 
 
 class InvoiceActionsMixin:
@@ -18,68 +20,115 @@ class InvoiceActionsMixin:
         )
         popup.open()
 
-    def print_invoice(self):
-        """Handles the printing of the invoice as a PDF."""
-        try:
-            # Ensure there is data to print
-            invoice_data = self._collect_invoice_data()
-            if not invoice_data["items"]:
-                self.show_message("Ошибка: накладная пуста")
-                return
+    def _start_pdf_job(self, title, on_complete, error_prefix):
+        """Ставит PDF текущей накладной в фоновую очередь и показывает прогресс."""
+        # Ensure there is data to render
+        invoice_data = self._collect_invoice_data()
+        if not invoice_data["items"]:
+            self.show_message("Ошибка: накладная пуста")
+            return
 
-            # Create directory for PDFs if it doesn't exist
-            pdf_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'generated_pdfs')
-            os.makedirs(pdf_dir, exist_ok=True)
+        # Предыдущее незавершенное задание больше не нужно
+        self.cancel_pdf_job()
 
-            # Generate filename
-            invoice_id = self.invoice_number_input.text or 'new'
-            filename = InvoicePDFGenerator.get_invoice_filename(invoice_id)
-            pdf_path = os.path.join(pdf_dir, filename)
+        # Имя файла в кэше определяется номером и содержимым накладной
+        invoice_id = self.invoice_number_input.text or 'new'
+
+        progress_bar = ProgressBar(max=1, value=0)
+        cancel_button = Button(text='Отмена', size_hint_y=None, height=44)
+        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        content.add_widget(progress_bar)
+        content.add_widget(cancel_button)
+        popup = Popup(
+            title=title,
+            content=content,
+            size_hint=(None, None),
+            size=(400, 180),
+            auto_dismiss=False
+        )
+        cancel_button.bind(on_release=lambda *args: self.cancel_pdf_job())
 
-            # Generate PDF
-            pdf_generator = InvoicePDFGenerator()
-            generated_pdf = pdf_generator.generate_pdf(invoice_data, pdf_path)
+        def handle_progress(fraction):
+            progress_bar.value = fraction
 
+        def handle_complete(path):
+            self._close_pdf_job()
+            on_complete(path)
+
+        def handle_error(error):
+            self._close_pdf_job()
+            print(f"Error generating PDF: {error}")
+            self.show_message(f"{error_prefix}: {str(error)}")
+
+        self._pdf_job = get_pdf_worker().submit(
+            invoice_data, invoice_id,
+            on_complete=handle_complete,
+            on_error=handle_error,
+            on_progress=handle_progress
+        )
+        self._pdf_popup = popup
+        # Файл из кэша приходит без генерации: окно прогресса не нужно
+        if not self._pdf_job.done:
+            popup.open()
+
+    def _close_pdf_job(self):
+        popup = getattr(self, '_pdf_popup', None)
+        if popup is not None:
+            popup.dismiss()
+        self._pdf_popup = None
+        self._pdf_job = None
+
+    def cancel_pdf_job(self):
+        """Отменяет текущую генерацию PDF, если она идет."""
+        job = getattr(self, '_pdf_job', None)
+        if job is not None:
+            job.cancel()
+        self._close_pdf_job()
+
+    def print_invoice(self):
+        """Handles the printing of the invoice as a PDF."""
+        def open_pdf(generated_pdf):
             # Open PDF with the system viewer
-            if os.path.exists(generated_pdf):
+            if not os.path.exists(generated_pdf):
+                self.show_message("Ошибка при создании PDF")
+                return
+
+            try:
                 if os.name == 'nt':  # Windows
                     os.startfile(generated_pdf)
                 elif os.name == 'posix':  # macOS and Linux
-                    subprocess.call(['xdg-open', generated_pdf])  # Linux
-                    # subprocess.call(['open', generated_pdf])  # macOS
+                    subprocess.Popen(['xdg-open', generated_pdf])  # Linux
+                    # subprocess.Popen(['open', generated_pdf])  # macOS
+            except Exception as e:
+                print(f"Error opening PDF: {e}")
+                self.show_message(f"Ошибка при открытии PDF: {str(e)}")
+                return
 
-                self.show_message("PDF накладной создан и открыт")
-            else:
-                self.show_message("Ошибка при создании PDF")
+            self.show_message("PDF накладной создан и открыт")
 
+        try:
+            self._start_pdf_job("Создание PDF...", open_pdf, "Ошибка при создании PDF")
         except Exception as e:
             print(f"Error generating PDF: {e}")
             self.show_message(f"Ошибка при создании PDF: {str(e)}")
 
     def share_invoice(self):
         """Handles sharing the invoice via available sharing options."""
-        try:
-            # Check for data
-            invoice_data = self._collect_invoice_data()
-            if not invoice_data["items"]:
-                self.show_message("Ошибка: накладная пуста")
-                return
-
-            # Create PDF
-            pdf_generator = InvoicePDFGenerator()
-            invoice_id = self.invoice_number_input.text or 'new'
-            filename = InvoicePDFGenerator.get_invoice_filename(invoice_id)
-            pdf_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'generated_pdfs', filename)
-            generated_pdf = pdf_generator.generate_pdf(invoice_data, pdf_path)
-
+        def show_share(generated_pdf):
             if not os.path.exists(generated_pdf):
                 self.show_message("Ошибка при создании PDF для отправки")
                 return
 
+            # plyer нужен только для отправки: импортируем при первом использовании
+            from front.utils.share_pdf import ShareManager
+
             # Show sharing options
             share_manager = ShareManager()
             share_manager.show_share_popup(generated_pdf)
 
+        try:
+            # Если эта же накладная уже печаталась, файл возьмется из кэша
+            self._start_pdf_job("Подготовка PDF...", show_share, "Ошибка при отправке накладной")
         except Exception as e:
             print(f"Error sharing invoice: {e}")
             self.show_message(f"Ошибка при отправке накладной: {str(e)}")
@@ -0,0 +1,196 @@
+# utils/invoice_document.py
+"""
+Документ накладной без зависимости от Kivy.
+
+Строки хранят введенный текст и разобранные Decimal-значения, сумма строки
+и общая сумма пересчитываются по приращению при изменении одной строки.
+Виджеты подписываются на события документа через add_listener.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+
+# События: listener(event, index); для LINES_RESET и TOTAL_CHANGED index = None
+LINE_CHANGED = 'line_changed'
+LINE_ADDED = 'line_added'
+LINE_REMOVED = 'line_removed'
+LINES_RESET = 'lines_reset'
+TOTAL_CHANGED = 'total_changed'
+
+Listener = Callable[[str, Optional[int]], None]
+
+
+def parse_number(text: Any) -> Optional[Decimal]:
+    """Число из поля ввода; None, если поле пустое или это не число"""
+    if isinstance(text, Decimal):
+        return text if text.is_finite() else None
+    value = str(text if text is not None else '').strip().replace(',', '.')
+    if not value:
+        return None
+    try:
+        result = Decimal(value)
+    except InvalidOperation:
+        return None
+    return result if result.is_finite() else None
+
+
+def parse_decimal(text: Any) -> Decimal:
+    """Число из поля ввода; пустое или неверное значение - ноль"""
+    result = parse_number(text)
+    return ZERO if result is None else result
+
+
+def format_money(value: Decimal) -> str:
+    return f"{value.quantize(CENT, rounding=ROUND_HALF_UP)}"
+
+
+class InvoiceLine:
+    """Строка накладной: текст полей и разобранные значения"""
+
+    __slots__ = ('name', 'quantity_text', 'price_text', 'quantity', 'price', 'amount',
+                 'quantity_valid', 'price_valid')
+
+    def __init__(self, name: str = '', quantity: Any = '', price: Any = ''):
+        self.name = name
+        self.quantity_text = ''
+        self.price_text = ''
+        self.quantity = ZERO
+        self.price = ZERO
+        self.amount = ZERO
+        self.quantity_valid = False
+        self.price_valid = False
+        self.set_quantity(quantity)
+        self.set_price(price)
+
+    def set_quantity(self, text: Any) -> None:
+        self.quantity_text = '' if text is None else str(text)
+        parsed = parse_number(self.quantity_text)
+        self.quantity_valid = parsed is not None
+        self.quantity = ZERO if parsed is None else parsed
+        self._recalculate()
+
+    def set_price(self, text: Any) -> None:
+        self.price_text = '' if text is None else str(text)
+        parsed = parse_number(self.price_text)
+        self.price_valid = parsed is not None
+        self.price = ZERO if parsed is None else parsed
+        self._recalculate()
+
+    def _recalculate(self) -> None:
+        self.amount = (self.quantity * self.price).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    @property
+    def is_filled(self) -> bool:
+        """Строка попадает в накладную, только если количество и цена - числа.
+
+        Неверный текст ("abc") не превращается в нулевое количество: такая
+        строка считается незаполненной и не отправляется.
+        """
+        return self.quantity_valid and self.price_valid
+
+    def as_dict(self) -> Dict[str, str]:
+        """Текстовое представление для виджета строки"""
+        return {
+            'name': self.name,
+            'quantity': self.quantity_text,
+            'price': self.price_text,
+            'amount': format_money(self.amount),
+        }
+
+
+class InvoiceDocument:
+    """Строки накладной и их общая сумма"""
+
+    def __init__(self, lines: Iterable[InvoiceLine] = ()):
+        self.lines: List[InvoiceLine] = list(lines)
+        self.total: Decimal = sum((line.amount for line in self.lines), ZERO)
+        self._listeners: List[Listener] = []
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def add_listener(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _emit(self, event: str, index: Optional[int] = None) -> None:
+        for listener in list(self._listeners):
+            listener(event, index)
+
+    def _shift_total(self, delta: Decimal) -> None:
+        if delta:
+            self.total += delta
+            self._emit(TOTAL_CHANGED)
+
+    # --- изменения ------------------------------------------------------------
+
+    def set_lines(self, items: Iterable[Dict[str, Any]], min_lines: int = 0) -> None:
+        """Заменяет все строки (items в формате API), дополняя пустыми до min_lines"""
+        lines = [InvoiceLine(item.get('name', ''), item.get('quantity', ''), item.get('price', ''))
+                 for item in items]
+        lines.extend(InvoiceLine() for _ in range(min_lines - len(lines)))
+        old_total = self.total
+        self.lines = lines
+        self.total = sum((line.amount for line in lines), ZERO)
+        self._emit(LINES_RESET)
+        if self.total != old_total:
+            self._emit(TOTAL_CHANGED)
+
+    def clear(self, min_lines: int = 0) -> None:
+        self.set_lines((), min_lines)
+
+    def append_line(self) -> int:
+        self.lines.append(InvoiceLine())
+        index = len(self.lines) - 1
+        self._emit(LINE_ADDED, index)
+        return index
+
+    def pop_line(self) -> Optional[InvoiceLine]:
+        """Удаляет последнюю строку"""
+        if not self.lines:
+            return None
+        line = self.lines.pop()
+        self._emit(LINE_REMOVED, len(self.lines))
+        self._shift_total(-line.amount)
+        return line
+
+    def set_field(self, index: int, field: str, text: Any) -> None:
+        """Изменение одного поля строки; сумма пересчитывается только для нее"""
+        line = self.lines[index]
+        old_amount = line.amount
+        if field == 'name':
+            if line.name == text:
+                return
+            line.name = text
+        elif field == 'quantity':
+            if line.quantity_text == text:
+                return
+            line.set_quantity(text)
+        elif field == 'price':
+            if line.price_text == text:
+                return
+            line.set_price(text)
+        else:
+            raise ValueError(f"Unknown invoice line field: {field}")
+        self._emit(LINE_CHANGED, index)
+        self._shift_total(line.amount - old_amount)
+
+    # --- данные для API и PDF -------------------------------------------------
+
+    def to_items(self) -> List[Dict[str, Any]]:
+        """Заполненные строки в формате InvoiceItemCreate (числа как float для JSON)"""
+        return [
+            {
+                'name': line.name,
+                'quantity': float(line.quantity),
+                'price': float(line.price),
+                'sum': float(line.amount),
+            }
+            for line in self.lines
+            if line.is_filled
+        ]
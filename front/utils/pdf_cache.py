@@ -0,0 +1,128 @@
+# utils/pdf_cache.py
+"""
+Кэш PDF накладных в generated_pdfs.
+
+Имя файла строится из хэша нормализованных данных накладной, поэтому
+одинаковая накладная генерируется один раз, а печать и отправка берут
+готовый файл. Каталог ограничен по размеру и возрасту файлов.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from front.utils.pdf_table import build_table_rows
+
+# Каталог, куда клиент всегда складывал PDF накладных
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'generated_pdfs')
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024
+PDF_CACHE_MAX_AGE = 30 * 24 * 3600  # секунды
+
+
+def normalize_invoice_data(invoice_data, invoice_id=None):
+    """Приводит данные к тексту, который генератор печатает в PDF.
+
+    Строки товаров берутся из build_table_rows, общего с генератором, остальные поля
+    форматируются так же, как в generate_pdf: разные PDF не получат один
+    ключ, а одинаковые - разные.
+    """
+    total = invoice_data.get('total', 0)
+    additional_info = invoice_data.get('additional_info')
+    return {
+        'file_id': str(invoice_id if invoice_id is not None else invoice_data.get('id', '')),
+        'id': str(invoice_data.get('id', '')),
+        'created_at': str(invoice_data.get('created_at', '')).split('T')[0],
+        'contact': str(invoice_data.get('contact', '')),
+        'additional_info': str(additional_info) if additional_info else '',
+        'total': f"{total:.2f}" if isinstance(total, (int, float)) else str(total),
+        'is_paid': bool(invoice_data.get('is_paid', False)),
+        'rows': build_table_rows(invoice_data.get('items', [])),
+    }
+
+
+def invoice_cache_key(invoice_data, invoice_id=None) -> str:
+    normalized = normalize_invoice_data(invoice_data, invoice_id)
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:24]
+
+
+class PDFCache:
+    """Файлы PDF, адресуемые по содержимому накладной"""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES, max_age=PDF_CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path_for(self, invoice_data, invoice_id=None) -> str:
+        """Путь к файлу накладной (файл может еще не существовать)"""
+        key = invoice_cache_key(invoice_data, invoice_id)
+        label = str(invoice_id or 'new').strip() or 'new'
+        # В имени оставляем номер накладной, чтобы файл было легко узнать
+        safe_label = ''.join(ch for ch in label if ch.isalnum() or ch in '-_')[:32] or 'new'
+        return os.path.join(self.directory, f"invoice_{safe_label}_{key}.pdf")
+
+    def lookup(self, invoice_data, invoice_id=None):
+        """Путь к готовому файлу или None"""
+        path = self.path_for(invoice_data, invoice_id)
+        if not os.path.exists(path):
+            return None
+        # mtime служит отметкой последнего использования для вытеснения
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return path
+
+    @staticmethod
+    def temp_path(path) -> str:
+        """Файл, в который пишется PDF до атомарной замены"""
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+
+    def commit(self, temp_path, path) -> str:
+        """Переносит готовый файл на место и вытесняет лишнее"""
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def evict(self) -> None:
+        """Удаляет старые файлы, затем самые давно использованные сверх лимита"""
+        with self._lock:
+            now = time.time()
+            entries = []
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+
+            for name in names:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if self._remove(path):
+                    total -= size
+
+    @staticmethod
+    def _remove(path) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
@@ -7,54 +7,156 @@ from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.units import cm
 import os
+import threading
 from datetime import datetime
 
+from front.utils.pdf_table import TABLE_HEADER, build_table_rows
+
+
+# Получаем абсолютный путь к директории utils
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Путь к файлу шрифта в текущей директории
+FONT_PATH = os.path.join(CURRENT_DIR, 'DejaVuSans.ttf')
+FONT_NAME = 'DejaVu'
+
+# Путь к директории для сохранения PDF
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(CURRENT_DIR)), 'generated_pdfs')
+
+TABLE_COL_WIDTHS = [1 * cm, 8 * cm, 3 * cm, 3 * cm, 3 * cm]
+
 
 class InvoicePDFGenerator:
-    def __init__(self):
-        # Получаем абсолютный путь к директории utils
-        current_dir = os.path.dirname(os.path.abspath(__file__))
+    """Генератор PDF накладных.
 
-        # Путь к файлу шрифта в текущей директории
-        font_path = os.path.join(current_dir, 'DejaVuSans.ttf')
+    Шрифт, стили и директория вывода готовятся один раз на процесс и
+    разделяются всеми экземплярами; используйте get_pdf_generator().
+    TTF-шрифты reportlab встраивает подмножеством: в файл попадают
+    только использованные глифы.
+    """
 
-        # Путь к директории для сохранения PDF
-        project_dir = os.path.dirname(os.path.dirname(current_dir))
-        self.output_dir = os.path.join(project_dir, 'generated_pdfs')
+    _resources_lock = threading.Lock()
+    _resources_ready = False
 
-        # Создаём директорию для PDF если её нет
-        os.makedirs(self.output_dir, exist_ok=True)
+    style_header: ParagraphStyle
+    style_normal: ParagraphStyle
+    style_total: ParagraphStyle
+    style_payment: ParagraphStyle
+    table_style: TableStyle
+    row_height: float
 
-        # Проверяем существование файла шрифта
-        if not os.path.exists(font_path):
-            raise FileNotFoundError(
-                f"Шрифт не найден по пути: {font_path}\n"
-                f"Пожалуйста, убедитесь что файл DejaVuSans.ttf находится в директории: {current_dir}"
+    def __init__(self):
+        self._ensure_resources()
+        self.output_dir = OUTPUT_DIR
+
+    @classmethod
+    def _ensure_resources(cls) -> None:
+        """Регистрация шрифта и сборка стилей при первом использовании"""
+        if cls._resources_ready:
+            return
+
+        with cls._resources_lock:
+            if cls._resources_ready:
+                return
+
+            # Создаём директорию для PDF если её нет
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+            # Проверяем существование файла шрифта
+            if not os.path.exists(FONT_PATH):
+                raise FileNotFoundError(
+                    f"Шрифт не найден по пути: {FONT_PATH}\n"
+                    f"Пожалуйста, убедитесь что файл DejaVuSans.ttf находится в директории: {CURRENT_DIR}"
+                )
+
+            # Регистрация шрифта для поддержки кириллицы
+            if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+            styles = getSampleStyleSheet()
+            cls.style_header = ParagraphStyle(
+                'CustomHeader',
+                parent=styles['Heading1'],
+                fontName=FONT_NAME,
+                fontSize=16,
+                spaceAfter=30,
+                alignment=1  # Center alignment
             )
 
-        # Регистрация шрифта для поддержки кириллицы
-        pdfmetrics.registerFont(TTFont('DejaVu', font_path))
-
-        self.styles = getSampleStyleSheet()
-        self.style_header = ParagraphStyle(
-            'CustomHeader',
-            parent=self.styles['Heading1'],
-            fontName='DejaVu',
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1  # Center alignment
-        )
+            cls.style_normal = ParagraphStyle(
+                'CustomNormal',
+                parent=styles['Normal'],
+                fontName=FONT_NAME,
+                fontSize=12,
+                spaceBefore=6,
+                spaceAfter=6
+            )
 
-        self.style_normal = ParagraphStyle(
-            'CustomNormal',
-            parent=self.styles['Normal'],
-            fontName='DejaVu',
-            fontSize=12,
-            spaceBefore=6,
-            spaceAfter=6
-        )
+            cls.style_total = ParagraphStyle(
+                'Total',
+                parent=cls.style_normal,
+                fontSize=14,
+                alignment=2  # Right alignment
+            )
 
-    def generate_pdf(self, invoice_data, filename=None):
+            cls.style_payment = ParagraphStyle(
+                'PaymentStatus',
+                parent=cls.style_normal,
+                fontSize=14,
+                alignment=2
+            )
+
+            cls.table_style = TableStyle([
+                ('FONT', (0, 0), (-1, -1), FONT_NAME),
+                ('FONTSIZE', (0, 0), (-1, -1), 12),
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('BOX', (0, 0), (-1, -1), 2, colors.black),
+                ('LINEABOVE', (0, 1), (-1, 1), 2, colors.black),
+                ('LINEBEFORE', (1, 1), (1, -1), 1, colors.black),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+                ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+                ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
+            ])
+
+            # Все ячейки однострочные, поэтому высота строки одна для всей таблицы:
+            # измеряем её один раз вместо пересчета всех строк при каждом разрыве страницы
+            sample = Table([TABLE_HEADER], colWidths=TABLE_COL_WIDTHS)
+            sample.setStyle(cls.table_style)
+            cls.row_height = sample.wrap(0, 0)[1]
+
+            cls._resources_ready = True
+
+    @staticmethod
+    def _build_table_rows(items):
+        return build_table_rows(items)
+
+    def _make_items_table(self, table_data) -> Table:
+        """Таблица товаров: заголовок повторяется на каждой странице (repeatRows=1)"""
+        table = Table(
+            table_data,
+            colWidths=TABLE_COL_WIDTHS,
+            rowHeights=[self.row_height] * len(table_data),
+            repeatRows=1
+        )
+        table.setStyle(self.table_style)
+        return table
+
+    def estimate_pages(self, invoice_data) -> int:
+        """Оценка числа страниц по количеству строк (для индикатора прогресса)"""
+        frame_height = A4[1] - 2 * 72
+        rows = len(invoice_data.get('items', [])) + 1
+        return 1 + int(rows * self.row_height // frame_height)
+
+    def generate_pdf(self, invoice_data, filename=None, progress_callback=None):
+        """Создает PDF и возвращает путь к файлу.
+
+        progress_callback(event, value) получает события reportlab
+        ('SIZE_EST', 'PROGRESS', 'PAGE', 'FINISHED'); исключение из него
+        прерывает построение документа.
+        """
         if filename is None:
             filename = self.get_invoice_filename(invoice_data.get('id', 'new'))
 
@@ -68,6 +170,8 @@ class InvoicePDFGenerator:
             topMargin=72,
             bottomMargin=72
         )
+        if progress_callback:
+            doc.setProgressCallBack(progress_callback)
 
         # Создаем список элементов для документа
         elements = []
@@ -87,62 +191,16 @@ class InvoicePDFGenerator:
             elements.append(Spacer(1, 0.5 * cm))
 
         # Создаем таблицу с товарами
-        table_data = [
-            ['№', 'Наименование', 'Количество', 'Цена', 'Сумма']
-        ]
-
-        for idx, item in enumerate(invoice_data.get('items', []), 1):
-            if item.get('name') and item.get('quantity') and item.get('price'):
-                table_data.append([
-                    str(idx),
-                    item.get('name', ''),
-                    str(item.get('quantity', '')),
-                    f"{float(item.get('price', 0)):.2f}",
-                    f"{float(item.get('quantity', 0)) * float(item.get('price', 0)):.2f}"
-                ])
-
-        # Создаем таблицу
-        table = Table(table_data, colWidths=[1 * cm, 8 * cm, 3 * cm, 3 * cm, 3 * cm])
-        table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'DejaVu'),
-            ('FONTSIZE', (0, 0), (-1, -1), 12),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 2, colors.black),
-            ('LINEABOVE', (0, 1), (-1, 1), 2, colors.black),
-            ('LINEBEFORE', (1, 1), (1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),
-        ]))
-
-        elements.append(table)
+        table_data = [TABLE_HEADER] + self._build_table_rows(invoice_data.get('items', []))
+        elements.append(self._make_items_table(table_data))
         elements.append(Spacer(1, 0.5 * cm))
 
         # Добавляем итоговую сумму
-        elements.append(Paragraph(
-            f"Итого: {invoice_data.get('total', 0):.2f}",
-            ParagraphStyle(
-                'Total',
-                parent=self.style_normal,
-                fontSize=14,
-                alignment=2  # Right alignment
-            )
-        ))
+        elements.append(Paragraph(f"Итого: {invoice_data.get('total', 0):.2f}", self.style_total))
 
         # Добавляем статус оплаты
         payment_status = "Оплачено" if invoice_data.get('is_paid', False) else "Не оплачено"
-        elements.append(Paragraph(
-            f"Статус оплаты: {payment_status}",
-            ParagraphStyle(
-                'PaymentStatus',
-                parent=self.style_normal,
-                fontSize=14,
-                alignment=2
-            )
-        ))
+        elements.append(Paragraph(f"Статус оплаты: {payment_status}", self.style_payment))
 
         # Создаем PDF
         doc.build(elements)
@@ -152,4 +210,15 @@ class InvoicePDFGenerator:
     def get_invoice_filename(invoice_id):
         """Генерирует имя файла для накладной"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return f"invoice_{invoice_id}_{timestamp}.pdf"
\ No newline at end of file
+        return f"invoice_{invoice_id}_{timestamp}.pdf"
+
+
+_shared_generator = None
+
+
+def get_pdf_generator() -> InvoicePDFGenerator:
+    """Общий на процесс экземпляр генератора"""
+    global _shared_generator
+    if _shared_generator is None:
+        _shared_generator = InvoicePDFGenerator()
+    return _shared_generator
@@ -0,0 +1,29 @@
+# utils/pdf_table.py
+"""
+Текст таблицы товаров в PDF накладной (без reportlab).
+
+Общий для генератора и кэша PDF: ключ кэша строится ровно из того, что
+печатается, а импорт кэша не тянет за собой reportlab.
+"""
+
+TABLE_HEADER = ['№', 'Наименование', 'Количество', 'Цена', 'Сумма']
+
+
+def build_table_rows(items):
+    """Строки таблицы товаров без заголовка - ровно тот текст, что печатается.
+
+    По этим же строкам строится ключ кэша PDF (см. pdf_cache).
+    """
+    rows = []
+    for idx, item in enumerate(items, 1):
+        if item.get('name') and item.get('quantity') and item.get('price'):
+            quantity = float(item.get('quantity', 0))
+            price = float(item.get('price', 0))
+            rows.append([
+                str(idx),
+                str(item.get('name', '')).replace('\n', ' '),
+                str(item.get('quantity', '')),
+                f"{price:.2f}",
+                f"{quantity * price:.2f}"
+            ])
+    return rows
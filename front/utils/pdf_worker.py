@@ -0,0 +1,163 @@
+# utils/pdf_worker.py
+"""
+Фоновая генерация PDF накладных.
+
+Задания выполняются по очереди в отдельном потоке, поэтому окно Kivy
+не зависает на время работы reportlab. Все колбэки (прогресс, готово,
+ошибка) вызываются в главном потоке через Clock. Готовые файлы берутся
+из PDFCache, так что повторная печать или отправка не генерирует PDF заново.
+"""
+import os
+import queue
+import threading
+import time
+
+from kivy.clock import Clock
+
+from front.utils.pdf_cache import PDFCache
+
+# Не чаще одного обновления прогресс-бара за этот интервал (сек)
+PROGRESS_INTERVAL = 0.1
+
+
+class PDFJobCancelled(Exception):
+    """Задание отменено пользователем"""
+
+
+class PDFRenderJob:
+    """Одно задание на генерацию PDF"""
+
+    def __init__(self, invoice_data, output_path, on_complete, on_error=None, on_progress=None):
+        self.invoice_data = invoice_data
+        self.output_path = output_path
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self) -> None:
+        """Отменить задание; колбэки после этого не вызываются"""
+        self.cancelled = True
+
+
+class PDFRenderWorker:
+    """Очередь заданий и поток, который их выполняет"""
+
+    def __init__(self, cache=None):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._cache = cache
+        self._evicted = False
+
+    @property
+    def cache(self) -> PDFCache:
+        if self._cache is None:
+            self._cache = PDFCache()
+        return self._cache
+
+    def submit(self, invoice_data, invoice_id, on_complete, on_error=None, on_progress=None) -> PDFRenderJob:
+        """Поставить накладную в очередь.
+
+        on_complete(path), on_error(exception) и on_progress(fraction)
+        вызываются в главном потоке. Если PDF с такими же данными уже
+        есть в кэше, on_complete получит его без генерации.
+        """
+        output_path = self.cache.path_for(invoice_data, invoice_id)
+        job = PDFRenderJob(invoice_data, output_path, on_complete, on_error, on_progress)
+
+        ready_path = self.cache.lookup(invoice_data, invoice_id)
+        if ready_path is not None:
+            job.done = True
+            Clock.schedule_once(lambda dt: self._deliver(job, job.on_complete, ready_path))
+            return job
+
+        self._start()
+        self._queue.put(job)
+        return job
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pdf-render', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if not self._evicted:
+                    # Чистим каталог от старых файлов один раз за запуск, вне главного потока
+                    self._evicted = True
+                    self.cache.evict()
+                if not job.cancelled:
+                    self._render(job)
+            finally:
+                self._queue.task_done()
+
+    def _render(self, job: PDFRenderJob) -> None:
+        # Файл мог появиться, пока задание ждало в очереди (печать и отправка подряд)
+        if os.path.exists(job.output_path):
+            self._finish(job, job.on_complete, job.output_path)
+            return
+
+        # reportlab импортируется при первой генерации, а не при запуске приложения
+        from front.utils.pdf_generator import get_pdf_generator
+
+        generator = get_pdf_generator()
+        expected_pages = generator.estimate_pages(job.invoice_data)
+        last_report = [0.0]
+
+        def on_event(event, value):
+            if job.cancelled:
+                raise PDFJobCancelled()
+            if event == 'PAGE' and job.on_progress:
+                now = time.monotonic()
+                if now - last_report[0] >= PROGRESS_INTERVAL:
+                    last_report[0] = now
+                    fraction = min(value / expected_pages, 0.99)
+                    Clock.schedule_once(lambda dt: self._deliver(job, job.on_progress, fraction))
+
+        # Пишем во временный файл: в кэше не должно оказаться недописанного PDF
+        temp_path = self.cache.temp_path(job.output_path)
+        try:
+            generator.generate_pdf(job.invoice_data, temp_path, progress_callback=on_event)
+            path = self.cache.commit(temp_path, job.output_path)
+        except PDFJobCancelled:
+            self._remove_partial(temp_path)
+            return
+        except Exception as e:
+            self._remove_partial(temp_path)
+            self._finish(job, job.on_error, e)
+            return
+
+        self._finish(job, job.on_complete, path)
+
+    def _finish(self, job: PDFRenderJob, callback, value) -> None:
+        job.done = True
+        Clock.schedule_once(lambda dt: self._deliver(job, callback, value))
+
+    @staticmethod
+    def _deliver(job: PDFRenderJob, callback, value) -> None:
+        # Проверяем отмену уже в главном потоке: после cancel() колбэков не будет
+        if callback is not None and not job.cancelled:
+            callback(value)
+
+    @staticmethod
+    def _remove_partial(path) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_shared_worker = None
+
+
+def get_pdf_worker() -> PDFRenderWorker:
+    """Общий на процесс фоновый генератор"""
+    global _shared_worker
+    if _shared_worker is None:
+        _shared_worker = PDFRenderWorker()
+    return _shared_worker
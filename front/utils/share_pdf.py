@@ -4,7 +4,6 @@ import subprocess
 import webbrowser
 from urllib.parse import quote
 import os
-from plyer import email
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.popup import Popup
@@ -45,6 +44,8 @@ class ShareManager:
             buttons_layout = BoxLayout(size_hint_y=None, height='40dp', spacing=10)
 
             def send_email(instance):
+                from plyer import email
+
                 recipient = email_input.text
                 if recipient:
                     try:
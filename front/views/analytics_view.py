@@ -1,9 +1,127 @@
 # views/analytics_view.py
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from kivy.properties import ObjectProperty, StringProperty, NumericProperty
 from kivy.uix.screenmanager import Screen
 
+from front.controllers.analytics_api_controller import AnalyticsAPIController
+from front.utils.chart_data import DailySeries
+from front.views.chart_widget import LineChart  # noqa: F401  (используется в analytics.kv)
+
+# Период, который загружается один раз; кнопки периода только сдвигают окно графика
+LOADED_DAYS = 5 * 365
+ALL_SHOPS = 'Все магазины'
+
+REVENUE_COLOR = (0.2, 0.6, 1, 1)
+PAID_COLOR = (0.2, 0.7, 0.3, 1)
+UNPAID_COLOR = (0.9, 0.35, 0.3, 1)
+
 
 class AnalyticsView(Screen):
-    def __init__(self, screen_manager):
-        super().__init__(name='analytics')
+    auth_controller = ObjectProperty(None)
+    metric = StringProperty('revenue')
+    range_days = NumericProperty(365)
+    period_start_text = StringProperty('')
+    period_end_text = StringProperty('')
+    summary_text = StringProperty('Загрузка...')
+
+    def __init__(self, screen_manager, **kwargs):
+        super().__init__(name='analytics', **kwargs)
         self.sm = screen_manager
         self.sm.add_widget(self)
+        self.api_controller: Optional[AnalyticsAPIController] = None
+        self.response: Optional[Dict[str, Any]] = None
+        self.series: Optional[DailySeries] = None
+        self.shop_id: Optional[int] = None
+        self._request = None
+
+        # Кэшируем ссылки на элементы интерфейса
+        self.chart = self.ids.chart
+        self.shop_filter = self.ids.shop_filter
+
+    def on_auth_controller(self, instance, value) -> None:
+        if value:
+            self.api_controller = AnalyticsAPIController(auth_controller=value)
+
+    def on_enter(self):
+        self.load_series()
+
+    def load_series(self) -> None:
+        """Загрузка дневных сумм; повторный вход отдает данные из кэша ответов"""
+        if not self.api_controller or not getattr(self.auth_controller, 'token', None):
+            self.summary_text = 'Необходима авторизация'
+            return
+
+        if self._request is not None:
+            self._request.cancel()
+        end = date.today()
+        self._request = self.api_controller.get_series(
+            end - timedelta(days=LOADED_DAYS - 1),
+            end,
+            success_callback=self.on_series_loaded,
+            error_callback=lambda error: setattr(self, 'summary_text', f'Ошибка загрузки: {error}')
+        )
+
+    def on_series_loaded(self, response: Dict[str, Any]) -> None:
+        self.response = response
+        shops = sorted(set(response.get('shop_id', [])))
+        self.shop_filter.values = [ALL_SHOPS] + [f'Магазин {shop}' for shop in shops]
+        if self.shop_id is not None and self.shop_id not in shops:
+            self.shop_id = None
+            self.shop_filter.text = ALL_SHOPS
+        self._rebuild_series()
+
+    def set_shop(self, text: str) -> None:
+        self.shop_id = None if text == ALL_SHOPS else int(text.split()[-1])
+        self._rebuild_series()
+
+    def set_metric(self, metric: str) -> None:
+        self.metric = metric
+        self._update_chart()
+
+    def set_range(self, days: int) -> None:
+        """days = 0 - весь загруженный период"""
+        self.range_days = days
+        self._update_window()
+
+    def _rebuild_series(self) -> None:
+        if self.response is None:
+            return
+        self.series = DailySeries.from_response(self.response, self.shop_id)
+        self._update_chart()
+
+    def _update_chart(self) -> None:
+        if self.series is None:
+            return
+        if self.metric == 'invoices':
+            self.chart.set_series([(self.series.invoices, REVENUE_COLOR)])
+        elif self.metric == 'paid':
+            self.chart.set_series([
+                (self.series.paid_amount, PAID_COLOR),
+                (self.series.unpaid_amount, UNPAID_COLOR),
+            ])
+        else:
+            self.chart.set_series([(self.series.revenue, REVENUE_COLOR)])
+        self._update_window()
+
+    def _update_window(self) -> None:
+        """Смена периода: сдвиг окна графика без повторного запроса"""
+        if self.series is None:
+            return
+        length = len(self.series)
+        first = max(0, length - self.range_days) if self.range_days else 0
+        self.chart.set_window(first, length)
+
+        self.period_start_text = self.series.day(first).isoformat()
+        self.period_end_text = self.series.day(length - 1).isoformat()
+
+        revenue = sum(self.series.revenue[first:])
+        paid = sum(self.series.paid_amount[first:])
+        invoices = sum(self.series.invoices[first:])
+        paid_invoices = sum(self.series.paid_invoices[first:])
+        self.summary_text = (
+            f"Выручка: {revenue:.2f}   Накладных: {invoices}\n"
+            f"[color=33b24d]Оплачено: {paid:.2f} ({paid_invoices})[/color]   "
+            f"[color=e65a4d]Не оплачено: {revenue - paid:.2f} ({invoices - paid_invoices})[/color]"
+        )
@@ -26,7 +26,6 @@ class AuthView(Screen):
         """Callback для успешной авторизации"""
         if self.auth_controller:
             self.auth_controller.token = result.get('access_token')
-            print(f"Token received: {self.auth_controller.token}")  # Отладка
 
             # Обновляем auth_controller во всех представлениях
             for screen in self.sm.screens:
@@ -0,0 +1,105 @@
+# views/chart_widget.py
+from kivy.clock import Clock
+from kivy.graphics import Color, Line, Rectangle
+from kivy.metrics import dp
+from kivy.properties import NumericProperty
+from kivy.uix.widget import Widget
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from front.utils.chart_data import lttb
+
+# Одна точка линии примерно на столько пикселей ширины
+POINT_SPACING = 2
+
+
+class LineChart(Widget):
+    """Линейный график нескольких рядов на инструкциях canvas.
+
+    Показывается окно [first, last) рядов; в нем точки прореживаются LTTB до
+    ширины виджета, так что число вершин не зависит от длины периода.
+    Инструкции Line создаются один раз и при перерисовке только получают
+    новые точки; прореживание пересчитывается, лишь когда меняются данные,
+    окно или ширина.
+    """
+    max_value = NumericProperty(0)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._series: List[Tuple[Sequence[float], Color, Line]] = []
+        self._window: Tuple[int, int] = (0, 0)
+        self._indices: Dict[int, Tuple[tuple, List[int]]] = {}
+        self._redraw_trigger = Clock.create_trigger(self._redraw)
+
+        with self.canvas.before:
+            Color(1, 1, 1, 1)
+            self._background = Rectangle(pos=self.pos, size=self.size)
+            Color(0.85, 0.85, 0.9, 1)
+            self._grid = [Line(points=[], width=1) for _ in range(4)]
+
+        self.bind(pos=self._redraw_trigger, size=self._redraw_trigger)
+
+    def set_series(self, series: Sequence[Tuple[Sequence[float], Tuple[float, float, float, float]]]) -> None:
+        """series: [(значения, rgba)]; инструкции переиспользуются, если число рядов не изменилось"""
+        if len(series) != len(self._series):
+            for _, color, line in self._series:
+                self.canvas.remove(color)
+                self.canvas.remove(line)
+            self._series = []
+            for values, rgba in series:
+                with self.canvas:
+                    color = Color(*rgba)
+                    line = Line(points=[], width=dp(1.2))
+                self._series.append((values, color, line))
+        else:
+            updated = []
+            for (values, rgba), (_, color, line) in zip(series, self._series):
+                color.rgba = rgba
+                updated.append((values, color, line))
+            self._series = updated
+        self._indices.clear()
+        self._redraw_trigger()
+
+    def set_window(self, first: int, last: Optional[int] = None) -> None:
+        """Показываемый диапазон индексов рядов"""
+        length = max((len(values) for values, _, _ in self._series), default=0)
+        last = length if last is None else min(last, length)
+        self._window = (max(0, min(first, last)), last)
+        self._redraw_trigger()
+
+    def _visible_indices(self, number: int, values: Sequence[float], threshold: int) -> List[int]:
+        first, last = self._window
+        key = (first, last, threshold)
+        cached = self._indices.get(number)
+        if cached is None or cached[0] != key:
+            cached = (key, lttb(values, threshold, first, last))
+            self._indices[number] = cached
+        return cached[1]
+
+    def _redraw(self, *args) -> None:
+        self._background.pos = self.pos
+        self._background.size = self.size
+        for i, grid_line in enumerate(self._grid):
+            y = self.y + self.height * (i + 1) / len(self._grid)
+            grid_line.points = [self.x, y, self.right, y]
+
+        first, last = self._window
+        if last - first < 2 or self.width <= 0:
+            self.max_value = 0
+            for _, _, line in self._series:
+                line.points = []
+            return
+
+        threshold = max(3, int(self.width / POINT_SPACING))
+        visible = [(line, values, self._visible_indices(number, values, threshold))
+                   for number, (values, _, line) in enumerate(self._series)]
+        top = max((values[i] for _, values, indices in visible for i in indices), default=0)
+        self.max_value = top
+        scale_y = self.height / top if top > 0 else 0
+        scale_x = self.width / (last - first - 1)
+
+        for line, values, indices in visible:
+            points = []
+            for i in indices:
+                points.append(self.x + (i - first) * scale_x)
+                points.append(self.y + values[i] * scale_y)
+            line.points = points
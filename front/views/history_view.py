@@ -1,32 +1,69 @@
+import os
 from kivy.factory import Factory
 from front.views.invoice_history_item import InvoiceItemWidget
 from kivy.uix.screenmanager import Screen
+from kivy.properties import ObjectProperty
 from front.controllers.history_api_controller import HistoryAPIController
+from front.controllers.sync_controller import get_sync_controller
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from front.utils.date_picker import CustomDatePicker as DatePicker
+from front.utils.history_model import HistoryModel
+from front.controllers.transport import RequestHandle
 from kivy.clock import Clock
 
 Factory.register('InvoiceItemWidget', InvoiceItemWidget)
 
+# Размер страницы при поиске на сервере
+PAGE_SIZE = 50
+# Следующая страница загружается, когда до конца списка осталось меньше этой доли
+LOAD_MORE_THRESHOLD = 0.1
+# Пауза в наборе текста фильтра, после которой запускается поиск, секунды
+SEARCH_DEBOUNCE = 0.4
+
 
 class HistoryView(Screen):
+    auth_controller = ObjectProperty(None)
+
     def __init__(self, screen_manager, **kwargs):
         super().__init__(name='history', **kwargs)
         self.sm = screen_manager
         self.sm.add_widget(self)
         self.api_controller: HistoryAPIController = None
-        self.original_data: List[Dict[str, Any]] = []
-        self.current_data: List[Dict[str, Any]] = []
+        self.sync_controller = None
+        # Загруженные накладные и текущая выборка
+        self.model = HistoryModel()
         self.sort_field: str = 'date'
         self.sort_reverse: bool = True
         self.current_grouping: str = None
         self.is_active = False
 
+        # Фильтры текущего поиска и состояние постраничной загрузки
+        self.active_filters: Dict[str, Any] = {}
+        self.paged = False
+        self._pages: Dict[int, List[Dict[str, Any]]] = {}  # skip -> накладные страницы
+        self._next_skip = 0
+        self._has_more = False
+        self._loading_page = False
+        # Номер текущего запроса списка: ответы на более ранние отбрасываются
+        self._query_seq = 0
+        self._page_requests: List[RequestHandle] = []
+        self._date_picker: Optional[DatePicker] = None
+
         # Кэшируем ссылки на элементы интерфейса
         self._cache_ui_elements()
+        self.invoice_list.bind(scroll_y=self._on_list_scroll)
+
+        # Поиск по мере ввода: запрос уходит после паузы, а не на каждое нажатие
+        self._search_trigger = Clock.create_trigger(lambda dt: self._live_search(), SEARCH_DEBOUNCE)
+        for field in (self.invoice_number_filter, self.date_from_filter, self.date_to_filter,
+                      self.contact_filter, self.amount_from_filter, self.amount_to_filter,
+                      self.payment_status_filter):
+            field.bind(text=self._on_filter_changed)
 
     def _cache_ui_elements(self):
         """Кэширование ссылок на элементы интерфейса"""
@@ -57,18 +94,47 @@ class HistoryView(Screen):
         self.amount_from_filter.text = ''
         self.amount_to_filter.text = ''
         self.payment_status_filter.text = 'Все'
-        self.current_data = self.original_data.copy()
-        Clock.schedule_once(lambda dt: self.update_display(), 0.1)
+        self._search_trigger.cancel()
+        self.active_filters = {}
+        self.refresh_list()
+
+    def _get_date_picker(self) -> DatePicker:
+        """Один календарь на экран: создается при первом открытии и переиспользуется"""
+        if self._date_picker is None:
+            self._date_picker = DatePicker()
+        return self._date_picker
+
+    @staticmethod
+    def _parse_filter_date(text: str):
+        try:
+            return datetime.strptime(text, "%Y-%m-%d").date()
+        except ValueError:
+            return None
+
+    def show_date_range_picker(self, instance):
+        """Показать календарь для выбора периода: начальная и конечная дата в одном окне"""
+        self._get_date_picker().open_for(
+            self.set_date_range,
+            start=self._parse_filter_date(self.date_from_filter.text),
+            end=self._parse_filter_date(self.date_to_filter.text),
+            range_mode=True
+        )
 
     def show_date_picker_from(self, instance):
         """Показать календарь для выбора начальной даты"""
-        date_picker = DatePicker(callback=self.set_date_from)
-        date_picker.open()
+        self._get_date_picker().open_for(
+            self.set_date_from, start=self._parse_filter_date(self.date_from_filter.text))
 
     def show_date_picker_to(self, instance):
         """Показать календарь для выбора конечной даты"""
-        date_picker = DatePicker(callback=self.set_date_to)
-        date_picker.open()
+        self._get_date_picker().open_for(
+            self.set_date_to, start=self._parse_filter_date(self.date_to_filter.text))
+
+    def set_date_range(self, date_from: str, date_to: Optional[str]):
+        """Установить период; без конечной даты меняется только начальная"""
+        self.date_from_filter.text = date_from
+        if date_to:
+            self.date_to_filter.text = date_to
 
     def set_date_from(self, date_str):
         """Установить начальную дату"""
@@ -78,27 +144,29 @@ class HistoryView(Screen):
         """Установить конечную дату"""
         self.date_to_filter.text = date_str
 
-    def validate_date_range(self):
-        """Проверка корректности диапазона дат"""
+    def validate_date_range(self, quiet: bool = False):
+        """Проверка корректности диапазона дат (quiet - без сообщений пользователю)"""
         if not self.date_from_filter.text or not self.date_to_filter.text:
             return True
 
+        def fail(message):
+            if not quiet:
+                self.show_message(message)
+            return False
+
         try:
             date_from = datetime.strptime(self.date_from_filter.text, "%Y-%m-%d")
             date_to = datetime.strptime(self.date_to_filter.text, "%Y-%m-%d")
 
             if date_from > date_to:
-                self.show_message("Дата 'с' не может быть позже даты 'по'")
-                return False
+                return fail("Дата 'с' не может быть позже даты 'по'")
 
             if date_to - date_from > timedelta(days=365):
-                self.show_message("Диапазон дат не может превышать один год")
-                return False
+                return fail("Диапазон дат не может превышать один год")
 
             return True
         except ValueError:
-            self.show_message("Неверный формат даты")
-            return False
+            return fail("Неверный формат даты")
 
     def sort_invoices(self, field: str) -> None:
         """Сортировка накладных по заданному полю."""
@@ -109,45 +177,18 @@ class HistoryView(Screen):
             self.sort_reverse = False
 
         try:
-            if field == 'total':
-                self.current_data.sort(key=lambda x: float(x.get(field, 0.0)), reverse=self.sort_reverse)
-            elif field == 'date':
-                self.current_data.sort(key=lambda x: datetime.strptime(x.get(field, ''), "%Y-%m-%d"),
-                                       reverse=self.sort_reverse)
-            else:
-                self.current_data.sort(key=lambda x: x.get(field, '').lower(), reverse=self.sort_reverse)
+            self.model.sort(field, reverse=self.sort_reverse)
             Clock.schedule_once(lambda dt: self.update_display(), 0.1)
         except Exception as e:
             self.show_message(f"Ошибка при сортировке: {str(e)}")
 
     def group_invoices(self, field: str) -> None:
         """Группировка накладных по заданному полю."""
-        if not self.current_data:
+        if not len(self.model):
             return
 
         self.current_grouping = field
-        grouped_data = {}
-
-        for invoice in self.current_data:
-            key = invoice.get(field, 'Не указано')
-            grouped_data.setdefault(key, []).append(invoice)
-
-        display_data = []
-        for key, group in sorted(grouped_data.items(), key=lambda x: x[0]):
-            header_text = 'Оплачено' if key and field == 'is_paid' else 'Не оплачено' if field == 'is_paid' else str(
-                key)
-            total_amount = sum(float(inv.get('total', 0.0)) for inv in group)
-            display_data.append({
-                'is_group_header': True,
-                'number': '',
-                'date': '',
-                'contact': f"{header_text} ({len(group)} шт.)",
-                'total': f"{total_amount:.2f}",
-                'is_paid': all(inv.get('is_paid', False) for inv in group)
-            })
-            display_data.extend(group)
-
-        self.invoice_list.data = display_data
+        self.invoice_list.data = self.model.grouped_rows(field)
         self.invoice_list.refresh_from_data()
 
     def clear_grouping(self) -> None:
@@ -155,17 +196,6 @@ class HistoryView(Screen):
         self.current_grouping = None
         Clock.schedule_once(lambda dt: self.update_display(), 0.1)
 
-    def _convert_invoice_to_display_format(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
-        """Преобразование данных накладной в формат для отображения"""
-        return {
-            'number': str(invoice.get('id', '')),
-            'date': invoice.get('created_at', '').split('T')[0] if 'T' in invoice.get('created_at', '')
-            else invoice.get('created_at', ''),
-            'contact': invoice.get('contact_info', ''),
-            'total': f"{float(invoice.get('total_amount', 0.0)):.2f}",
-            'is_paid': invoice.get('is_paid', False)
-        }
-
     def update_display(self) -> None:
         """Обновление отображения списка накладных"""
         if not self.is_active:
@@ -174,11 +204,15 @@ class HistoryView(Screen):
         if self.current_grouping:
             self.group_invoices(self.current_grouping)
         else:
-            self.invoice_list.data = self.current_data
+            self.invoice_list.data = self.model.rows()
             self.invoice_list.refresh_from_data()
 
-    def edit_invoice(self, invoice_id: int) -> None:
-        """Редактирование выбранной накладной."""
+    def edit_invoice(self, invoice_id: Optional[int], local_id: Optional[int] = None) -> None:
+        """Редактирование выбранной накладной.
+
+        local_id - ключ в локальном хранилище; без него накладная
+        загружается с сервера по invoice_id.
+        """
         try:
             print(f"HistoryView: Loading invoice {invoice_id} for editing")
 
@@ -195,7 +229,15 @@ class HistoryView(Screen):
                     print(f"Error in on_invoice_loaded: {e}")
                     self.show_message(f"Ошибка при загрузке данных накладной: {str(e)}")
 
-            if self.api_controller:
+            sync = self._get_sync_controller()
+            if sync and not local_id and invoice_id:
+                local_id = sync.store.local_id_for(invoice_id)
+            if sync and local_id:
+                invoice_data = sync.store.get_invoice(local_id)
+                if invoice_data is None:
+                    raise ValueError("Накладная не найдена")
+                on_invoice_loaded(invoice_data)
+            elif self.api_controller:
                 self.api_controller.get_invoice_details(
                     invoice_id,
                     success_callback=on_invoice_loaded,
@@ -211,10 +253,7 @@ class HistoryView(Screen):
     def on_invoices_loaded(self, result: List[Dict[str, Any]]) -> None:
         """Callback при успешной загрузке накладных."""
         try:
-            invoice_data = [self._convert_invoice_to_display_format(invoice) for invoice in result]
-
-            self.original_data = invoice_data.copy()
-            self.current_data = invoice_data.copy()
+            self.model.load(result)
 
             Clock.schedule_once(lambda dt: self.update_display(), 0.1)
 
@@ -225,7 +264,7 @@ class HistoryView(Screen):
     def on_auth_controller(self, instance, value) -> None:
         """Установка API контроллера при изменении auth_controller."""
         if value:
-            print(f"HistoryView: Setting auth_controller with token: {value.token}")
+            print("HistoryView: Setting auth_controller")
             self.api_controller = HistoryAPIController(auth_controller=value)
             if value.token:
                 print("HistoryView: Token present, loading invoices")
@@ -233,20 +272,67 @@ class HistoryView(Screen):
             else:
                 print("HistoryView: No token available")
 
+    def _get_sync_controller(self):
+        """Контроллер синхронизации текущего пользователя; подписывается на его события"""
+        auth_controller = self.auth_controller
+        sync = get_sync_controller(auth_controller) if auth_controller else None
+        if sync is not None and sync is not self.sync_controller:
+            self.sync_controller = sync
+            sync.change_listeners.append(self.on_store_changed)
+            sync.conflict_listeners.append(self.show_conflict)
+            sync.error_listeners.append(self.show_message)
+        return sync
+
+    def load_from_store(self) -> None:
+        """Показ накладных из локального хранилища (без обращения к серверу)"""
+        sync = self._get_sync_controller()
+        if sync:
+            self.on_invoices_loaded(sync.store.list_invoices())
+
+    def on_store_changed(self) -> None:
+        """Локальные данные изменились; результаты поиска на сервере не трогаем"""
+        if not self.paged:
+            self.load_from_store()
+
+    def show_conflict(self, invoice: Dict[str, Any]) -> None:
+        """Выбор версии накладной, измененной одновременно здесь и на сервере."""
+        local_id = invoice['local_id']
+        content = BoxLayout(orientation='vertical', spacing=10, padding=10)
+        content.add_widget(Label(
+            text=f"Накладная {invoice.get('id') or ''} изменена на сервере,\n"
+                 f"пока здесь были несохраненные правки.",
+            halign='center'
+        ))
+        buttons = BoxLayout(size_hint_y=None, height=40, spacing=10)
+        keep_local = Button(text='Оставить мои')
+        take_server = Button(text='Взять с сервера')
+        buttons.add_widget(keep_local)
+        buttons.add_widget(take_server)
+        content.add_widget(buttons)
+
+        popup = Popup(
+            title='Конфликт изменений',
+            content=content,
+            size_hint=(None, None),
+            size=(450, 220),
+            auto_dismiss=False
+        )
+
+        def resolve(keep):
+            popup.dismiss()
+            self.sync_controller.store.resolve_conflict(local_id, keep_local=keep)
+            self.on_store_changed()
+            self.sync_controller.sync()
+
+        keep_local.bind(on_release=lambda *args: resolve(True))
+        take_server.bind(on_release=lambda *args: resolve(False))
+        popup.open()
+
     def update_invoice_in_list(self, updated_invoice: Dict[str, Any]) -> None:
         """Обновление конкретной накладной в списке."""
         try:
-            invoice_number = str(updated_invoice.get('id'))
-            invoice_data = self._convert_invoice_to_display_format(updated_invoice)
-
-            # Обновляем в обоих списках
-            for data_list in [self.original_data, self.current_data]:
-                for i, invoice in enumerate(data_list):
-                    if invoice['number'] == invoice_number:
-                        data_list[i] = invoice_data.copy()
-                        break
-
-            Clock.schedule_once(lambda dt: self.update_display(), 0.1)
+            if self.model.update(updated_invoice):
+                Clock.schedule_once(lambda dt: self.update_display(), 0.1)
 
         except Exception as e:
             print(f"Error in update_invoice_in_list: {e}")
@@ -255,9 +341,7 @@ class HistoryView(Screen):
     def remove_invoice_from_list(self, invoice_id: int) -> None:
         """Удаление накладной из списка."""
         try:
-            invoice_id_str = str(invoice_id)
-            self.original_data = [inv for inv in self.original_data if inv['number'] != invoice_id_str]
-            self.current_data = [inv for inv in self.current_data if inv['number'] != invoice_id_str]
+            self.model.remove(invoice_id)
             Clock.schedule_once(lambda dt: self.update_display(), 0.1)
         except Exception as e:
             print(f"Error in remove_invoice_from_list: {e}")
@@ -266,10 +350,7 @@ class HistoryView(Screen):
     def add_invoice_to_list(self, new_invoice: Dict[str, Any]) -> None:
         """Добавление новой накладной в список"""
         try:
-            invoice_data = self._convert_invoice_to_display_format(new_invoice)
-
-            self.original_data.insert(0, invoice_data.copy())
-            self.current_data.insert(0, invoice_data.copy())
+            self.model.prepend(new_invoice)
 
             Clock.schedule_once(lambda dt: self.update_display(), 0.1)
 
@@ -292,91 +373,224 @@ class HistoryView(Screen):
         print(f"HistoryView: Load error: {error}")
         self.show_message(f"Ошибка загрузки накладных: {error}")
 
+    def _collect_filters(self) -> Dict[str, Any]:
+        """Фильтры панели в виде параметров запроса /invoices/ (ValueError при неверной сумме)"""
+        filters = {}
+        if self.invoice_number_filter.text.strip():
+            filters['number'] = self.invoice_number_filter.text.strip()
+        if self.date_from_filter.text:
+            filters['created_after'] = datetime.strptime(self.date_from_filter.text, "%Y-%m-%d")
+        if self.date_to_filter.text:
+            filters['created_before'] = datetime.strptime(self.date_to_filter.text, "%Y-%m-%d").replace(
+                hour=23, minute=59, second=59)
+        if self.contact_filter.text.strip():
+            filters['contact'] = self.contact_filter.text.strip()
+        if self.amount_from_filter.text:
+            filters['min_amount'] = float(self.amount_from_filter.text)
+        if self.amount_to_filter.text:
+            filters['max_amount'] = float(self.amount_to_filter.text)
+        if self.payment_status_filter.text != 'Все':
+            filters['is_paid'] = self.payment_status_filter.text == 'Оплачено'
+        return filters
+
     def search_invoices(self, instance=None) -> None:
-        """Фильтрация накладных по заданным критериям."""
+        """Применение фильтров: поиск на сервере по всей истории, страницами."""
+        self._search_trigger.cancel()
         if not self.validate_date_range():
             return
 
         try:
-            filtered_data = self.original_data.copy()
-
-            if self.invoice_number_filter.text:
-                search_number = self.invoice_number_filter.text.strip().lower()
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if search_number in invoice['number'].lower()
-                ]
-
-            if self.date_from_filter.text:
-                date_from = datetime.strptime(self.date_from_filter.text, "%Y-%m-%d")
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if datetime.strptime(invoice['date'], "%Y-%m-%d") >= date_from
-                ]
-
-            if self.date_to_filter.text:
-                date_to = datetime.strptime(self.date_to_filter.text, "%Y-%m-%d")
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if datetime.strptime(invoice['date'], "%Y-%m-%d") <= date_to],
-            if self.contact_filter.text:
-                search_contact = self.contact_filter.text.strip().lower()
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if search_contact in invoice['contact'].lower()
-                ]
-
-            if self.amount_from_filter.text:
-                min_amount = float(self.amount_from_filter.text)
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if float(invoice['total']) >= min_amount
-                ]
-
-            if self.amount_to_filter.text:
-                max_amount = float(self.amount_to_filter.text)
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if float(invoice['total']) <= max_amount
-                ]
-
-            if self.payment_status_filter.text != 'Все':
-                is_paid = self.payment_status_filter.text == 'Оплачено'
-                filtered_data = [
-                    invoice for invoice in filtered_data
-                    if invoice['is_paid'] == is_paid
-                ]
-
-            self.current_data = filtered_data
-            Clock.schedule_once(lambda dt: self.update_display(), 0.1)
+            filters = self._collect_filters()
+        except ValueError:
+            self.show_message("Неверный формат суммы")
+            return
+        self._apply_filters(filters)
 
-        except Exception as e:
-            print(f"Error in search_invoices: {e}")
-            self.show_message(f"Ошибка при фильтрации данных: {str(e)}")
+    def _on_filter_changed(self, instance, value) -> None:
+        # Каждое изменение откладывает поиск заново
+        self._search_trigger.cancel()
+        self._search_trigger()
+
+    def _live_search(self) -> None:
+        """Поиск после паузы в вводе; недописанные значения молча пропускаются"""
+        if not self.is_active or not self.validate_date_range(quiet=True):
+            return
+        try:
+            filters = self._collect_filters()
+        except ValueError:
+            return
+        if filters != self.active_filters:
+            self._apply_filters(filters)
+
+    def _apply_filters(self, filters: Dict[str, Any]) -> None:
+        self.active_filters = filters
+        if not filters and self._get_sync_controller():
+            # Без фильтров вся история уже есть в локальном хранилище
+            self._cancel_query()
+            self.paged = False
+            self.load_from_store()
+            return
+        self._start_paged_query(filters)
+
+    def _cancel_query(self) -> None:
+        """Отменяет запросы текущего поиска; их поздние ответы будут отброшены"""
+        self._query_seq += 1
+        for request in self._page_requests:
+            request.cancel()
+        self._page_requests = []
+
+    def _start_paged_query(self, filters: Dict[str, Any]) -> None:
+        """Сброс списка и загрузка первой страницы результатов с сервера"""
+        if not self.api_controller:
+            self.show_message("API контроллер не инициализирован")
+            return
+
+        self._cancel_query()
+        self.active_filters = filters
+        self.paged = True
+        self._pages = {}
+        self._next_skip = 0
+        self._has_more = True
+        self._loading_page = False
+        self.model.load([])
+        Clock.schedule_once(lambda dt: self.update_display(), 0)
+        self._load_next_page()
+
+    def _load_next_page(self) -> None:
+        if not self.paged or self._loading_page or not self._has_more:
+            return
+
+        self._loading_page = True
+        seq = self._query_seq
+        skip = self._next_skip
+        self._page_requests.append(self.api_controller.get_invoices(
+            success_callback=lambda result: self._on_page_loaded(seq, skip, result),
+            error_callback=lambda error: self._on_page_error(seq, error),
+            filters=dict(self.active_filters, skip=skip, limit=PAGE_SIZE)
+        ))
+
+    def _on_page_loaded(self, seq: int, skip: int, result: List[Dict[str, Any]]) -> None:
+        """Страница результатов; ответы на отмененные запросы отбрасываются."""
+        if seq != self._query_seq or not self.paged:
+            return
+
+        self._loading_page = False
+        sync = self._get_sync_controller()
+        if sync:
+            result = [
+                invoice if invoice.get('local_id')
+                else dict(invoice, local_id=sync.store.local_id_for(invoice.get('id')))
+                for invoice in result
+            ]
+
+        # Страница может прийти повторно (кэш, затем свежий ответ): заменяем ее целиком
+        self._pages[skip] = result
+        if skip >= self._next_skip:
+            self._next_skip = skip + len(result)
+            self._has_more = len(result) == PAGE_SIZE
+
+        self.model.load(invoice for page_skip in sorted(self._pages) for invoice in self._pages[page_skip])
+        Clock.schedule_once(lambda dt: self.update_display(), 0)
+        # Если страница не заполнила экран, прокрутки не будет: догружаем сразу
+        Clock.schedule_once(lambda dt: self._load_more_if_short(), 0.2)
+
+    def _on_page_error(self, seq: int, error: str) -> None:
+        if seq != self._query_seq or not self.paged:
+            return
+
+        self._loading_page = False
+        sync = self._get_sync_controller()
+        if sync and not self._pages:
+            # Нет связи с сервером: ищем по локальной копии
+            self.paged = False
+            self.model.load(sync.store.list_invoices())
+            self.model.filter(self.active_filters)
+            Clock.schedule_once(lambda dt: self.update_display(), 0)
+            self.show_message("Нет связи с сервером: показан поиск по локальной копии")
+            return
+        self.on_load_error(error)
+
+    def _on_list_scroll(self, instance, scroll_y) -> None:
+        """Догрузка следующей страницы, когда список прокручен почти до конца"""
+        if self.paged and scroll_y <= LOAD_MORE_THRESHOLD:
+            self._load_next_page()
+
+    def _load_more_if_short(self) -> None:
+        layout = self.invoice_list.layout_manager
+        if self.paged and layout is not None and layout.height <= self.invoice_list.height:
+            self._load_next_page()
 
     def refresh_list(self, instance=None) -> None:
-        """Обновление списка накладных с сервера."""
+        """Обновление списка накладных.
+
+        Без фильтров после входа список сразу берется из локального хранилища,
+        а синхронизация с сервером идет в фоне и обновит его по завершении.
+        С фильтрами (или без хранилища) результаты запрашиваются у сервера постранично.
+        """
+        sync = self._get_sync_controller()
+        if sync:
+            sync.sync()
+            if not self.active_filters:
+                self._cancel_query()
+                self.paged = False
+                self.load_from_store()
+                return
+
         if not self.api_controller:
             print("HistoryView: No API controller")
             self.show_message("API контроллер не инициализирован")
             return
 
-        if not hasattr(self.sm.get_screen('invoice'), 'auth_controller') or \
-                not self.sm.get_screen('invoice').auth_controller or \
-                not self.sm.get_screen('invoice').auth_controller.token:
+        if not self.auth_controller or not self.auth_controller.token:
             print("HistoryView: No auth token")
             self.show_message("Необходима авторизация для обновления списка накладных")
             return
 
-        print(f"HistoryView: Refreshing list with token: {self.sm.get_screen('invoice').auth_controller.token}")
-        self.api_controller.get_invoices(
-            success_callback=self.on_invoices_loaded,
-            error_callback=self.on_load_error
+        self._start_paged_query(self.active_filters)
+
+    def export_invoices(self, instance=None) -> None:
+        """Выгрузка PDF всех накладных за выбранный период одним ZIP-архивом."""
+        if not self.api_controller:
+            self.show_message("API контроллер не инициализирован")
+            return
+
+        if not self.validate_date_range():
+            return
+
+        # Экспорт фильтруется только по периоду
+        filters = {
+            key: value for key, value in self._collect_filters().items()
+            if key in ('created_after', 'created_before')
+        } if self.date_from_filter.text or self.date_to_filter.text else {}
+
+        export_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'generated_pdfs')
+        os.makedirs(export_dir, exist_ok=True)
+        file_path = os.path.join(export_dir, f"invoices_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip")
+
+        self.show_message("Экспорт накладных запущен...")
+        self.api_controller.export_invoices(
+            file_path,
+            success_callback=lambda path: self.show_message(f"Архив сохранен:\n{path}"),
+            error_callback=lambda error: self.show_message(f"Ошибка экспорта: {error}"),
+            filters=filters
         )
 
-    def delete_invoice(self, invoice_id: int) -> None:
-        """Удаление накладной по ID."""
+    def delete_invoice(self, invoice_id: Optional[int], local_id: Optional[int] = None) -> None:
+        """Удаление накладной: через локальное хранилище, если она в нем есть."""
         try:
+            sync = self._get_sync_controller()
+            if sync and not local_id and invoice_id:
+                local_id = sync.store.local_id_for(invoice_id)
+            if sync and local_id:
+                sync.store.delete_local(local_id)
+                if self.paged:
+                    self.remove_invoice_from_list(invoice_id)
+                else:
+                    self.load_from_store()
+                sync.sync()
+                self.show_message("Накладная удалена")
+                return
+
             def on_delete_success():
                 self.show_message("Накладная успешно удалена")
                 self.refresh_list()
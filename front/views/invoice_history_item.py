@@ -8,6 +8,7 @@ from kivy.app import App
 
 
 class InvoiceItemWidget(BoxLayout):
+    local_id = NumericProperty(0)
     number = StringProperty('')
     date = StringProperty('')
     contact = StringProperty('')
@@ -21,6 +22,11 @@ class InvoiceItemWidget(BoxLayout):
         # self.edit_button = self.ids.edit_button
         # self.delete_button = self.ids.delete_button
 
+    def invoice_ids(self):
+        """(номер на сервере, local_id); у несинхронизированных накладных номера еще нет"""
+        server_id = int(self.number) if self.number.isdigit() else None
+        return server_id, int(self.local_id) or None
+
     def edit_invoice(self, instance) -> None:
         """Редактирование накладной."""
         try:
@@ -33,7 +39,7 @@ class InvoiceItemWidget(BoxLayout):
 
             if history_view:
                 print(f"Editing invoice {self.number}")  # Отладка
-                history_view.edit_invoice(int(self.number))
+                history_view.edit_invoice(*self.invoice_ids())
             else:
                 raise ValueError("History view not found")
         except Exception as e:
@@ -79,7 +85,7 @@ class InvoiceItemWidget(BoxLayout):
 
             if history_view:
                 print(f"Deleting invoice {self.number}")  # Отладка
-                history_view.delete_invoice(int(self.number))
+                history_view.delete_invoice(*self.invoice_ids())
                 self.popup.dismiss()
             else:
                 raise ValueError("History view not found")
@@ -1,10 +1,49 @@
 # views/invoice_table.py
 from kivy.uix.boxlayout import BoxLayout
-from typing import Optional, Callable
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from typing import Any, Dict, Optional
+from front.utils.invoice_document import InvoiceDocument, LINE_ADDED, LINE_CHANGED, LINE_REMOVED, LINES_RESET
 
 
-class InvoiceTable(BoxLayout):
+class InvoiceLinesView(RecycleView):
+    """Строки InvoiceDocument; виджетов ровно столько, сколько строк видно.
+
+    data - текстовые снимки строк документа; правки из виджетов идут в
+    документ, а он через события обновляет data.
+    """
+
+    def __init__(self, **kwargs):
+        self.document: Optional[InvoiceDocument] = None
+        super().__init__(**kwargs)
+
+    def set_document(self, document: InvoiceDocument) -> None:
+        if self.document is not None:
+            self.document.remove_listener(self._on_document_event)
+        self.document = document
+        document.add_listener(self._on_document_event)
+        self.data = [line.as_dict() for line in document.lines]
+
+    def _on_document_event(self, event: str, index: Optional[int]) -> None:
+        if event == LINES_RESET:
+            self.data = [line.as_dict() for line in self.document.lines]
+        elif event == LINE_ADDED:
+            self.data.append(self.document.lines[index].as_dict())
+        elif event == LINE_REMOVED:
+            self.data.pop(index)
+        elif event == LINE_CHANGED:
+            # Словарь меняется на месте: RecycleView не перестраивает видимые строки
+            self.data[index].update(self.document.lines[index].as_dict())
+
+
+class InvoiceTable(RecycleDataViewBehavior, BoxLayout):
+    """Строка таблицы накладной; виджет переиспользуется для разных строк данных"""
+
     def __init__(self, **kwargs):
+        self.index = 0
+        self.lines_view: Optional[InvoiceLinesView] = None
+        # Пока строка заполняется из данных, изменения полей не передаются в документ
+        self._refreshing = False
         super().__init__(**kwargs)
         # Кэшируем ссылки на элементы интерфейса
         self.name_input = self.ids.name
@@ -15,38 +54,31 @@ class InvoiceTable(BoxLayout):
 
         self.bind_row_calculations()
 
-    def bind_row_calculations(self) -> None:
-        """Привязка изменений количества и цены к пересчету суммы."""
-        self.quantity_input.bind(text=self.calculate_row_sum)
-        self.price_input.bind(text=self.calculate_row_sum)
+    def refresh_view_attrs(self, rv: InvoiceLinesView, index: int, data: Dict[str, Any]) -> None:
+        """Заполнение виджета строкой index"""
+        self.index = index
+        self.lines_view = rv
+        self._refreshing = True
+        try:
+            self.number_label.text = str(index + 1)
+            self.name_input.text = data.get('name', '')
+            self.quantity_input.text = data.get('quantity', '')
+            self.price_input.text = data.get('price', '')
+            self.sum_label.text = data.get('amount', '0.00')
+        finally:
+            self._refreshing = False
 
-    def bind_total_update(self, callback: Callable) -> None:
-        """Привязка изменений количества и цены к обновлению общей суммы."""
-        self.quantity_input.bind(text=callback)
-        self.price_input.bind(text=callback)
+    def bind_row_calculations(self) -> None:
+        """Передача изменений полей в документ накладной."""
+        self.name_input.bind(text=lambda instance, value: self._store('name', value))
+        self.quantity_input.bind(text=lambda instance, value: self._store('quantity', value))
+        self.price_input.bind(text=lambda instance, value: self._store('price', value))
 
-    def calculate_row_sum(self, instance: Optional[object] = None, value: Optional[str] = None) -> None:
-        """Вычисление суммы строки на основе количества и цены."""
-        try:
-            quantity = float(self.quantity_input.text)
-            price = float(self.price_input.text)
-            total = quantity * price
-            self.sum_label.text = f'{total:.2f}'
-        except ValueError:
-            self.sum_label.text = '0.00'
-
-    def total_sum(self) -> float:
-        """Возвращает сумму строки как float."""
-        try:
-            return float(self.sum_label.text)
-        except ValueError:
-            return 0.0
-
-    def reset_values(self) -> None:
-        """Сброс значений полей строки."""
-        self.name_input.text = ""
-        self.quantity_input.text = ''
-        self.price_input.text = ''
-        self.quantity_input.hint_text = '0.0'
-        self.price_input.hint_text = '0.0'
-        self.calculate_row_sum()
+    def _store(self, field: str, value: str) -> None:
+        if self._refreshing or self.lines_view is None or self.lines_view.document is None:
+            return
+        document = self.lines_view.document
+        if self.index >= len(document):
+            return
+        document.set_field(self.index, field, value)
+        self.sum_label.text = self.lines_view.data[self.index]['amount']
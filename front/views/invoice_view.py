@@ -5,11 +5,16 @@ from datetime import datetime, timedelta
 from typing import Dict, Any
 from kivy.properties import ObjectProperty, StringProperty
 from kivy.uix.screenmanager import Screen
-from front.views.invoice_table import InvoiceTable
+from front.utils.invoice_document import InvoiceDocument, TOTAL_CHANGED, format_money
 from front.controllers.invoice_api_controller import InvoiceAPIController, logger
+from front.controllers.sync_controller import get_sync_controller
 from front.utils.invoice_acions import InvoiceActionsMixin
 
 
+# Сколько пустых строк показывается в новой накладной
+MIN_ROWS = 10
+
+
 def handle_error(error: str) -> None:
     print(f"Error updating invoice number: {error}")  # Debugging
 
@@ -24,6 +29,8 @@ class InvoiceView(Screen, InvoiceActionsMixin):
         self.sm = screen_manager
         self.sm.add_widget(self)
         self.editing_invoice = None
+        # Ключ накладной в локальном хранилище (есть и у еще не синхронизированных)
+        self.editing_local_id = None
         self.payment_status_value = 0
         self.api_controller = None
         Clock.schedule_once(self._initialize_view)
@@ -34,6 +41,10 @@ class InvoiceView(Screen, InvoiceActionsMixin):
         self.payment_button = self.ids.payment_button
         self.table_content = self.ids.table_content
         self.total_sum_label = self.ids.total_sum
+        # Строки и сумма накладной живут в документе, таблица и итог только отображают его
+        self.document = InvoiceDocument()
+        self.document.add_listener(self._on_document_event)
+        self.table_content.set_document(self.document)
 
     def on_auth_controller(self, instance, value):
         if value and value.token:  # Проверяем наличие токена
@@ -41,7 +52,7 @@ class InvoiceView(Screen, InvoiceActionsMixin):
                 auth_controller=value,
                 base_url="http://localhost:8000"  # Убедитесь, что URL совпадает
             )
-            logger.info(f"API controller initialized with auth token: {value.token}")
+            logger.info("API controller initialized with auth token")
         else:
             logger.warning("Auth controller set but no token available")
 
@@ -52,44 +63,29 @@ class InvoiceView(Screen, InvoiceActionsMixin):
         self.payment_button.text = 'Не оплачено!'
 
 
-    def add_initial_rows(self, count: int = 10) -> None:
+    def add_initial_rows(self, count: int = MIN_ROWS) -> None:
 
-        for _ in range(count):
-            self.add_row()
+        self.document.clear(min_lines=count)
+        self.update_total()
 
     def add_row(self) -> None:
-        table_row = InvoiceTable()
-        row_count = len(self.table_content.children) + 1
-        table_row.number_label.text = str(row_count)
-        table_row.bind_total_update(self.update_total)
-        self.table_content.add_widget(table_row)
-        self.update_total()
+        self.document.append_line()
 
     def del_row(self) -> None:
 
-        if not self.table_content.children:
-            return
-
-        self.table_content.remove_widget(self.table_content.children[0])  # Remove the first added row
-        self._renumber_rows()
-        self.update_total()
+        self.document.pop_line()  # Удаляем последнюю строку
 
-    def _renumber_rows(self) -> None:
-
-        for i, row in enumerate(reversed(self.table_content.children), 1):
-            row.number_label.text = str(i)
+    def _on_document_event(self, event: str, index) -> None:
+        if event == TOTAL_CHANGED:
+            self.update_total()
 
     def update_total(self, *args) -> None:
 
-        total = sum(child.total_sum() for child in self.table_content.children)
-        self.total_sum_label.text = f'{total:.2f}'
+        self.total_sum_label.text = format_money(self.document.total)
 
     def calculate_total(self) -> float:
 
-        try:
-            return float(self.total_sum_label.text)
-        except ValueError:
-            return 0.0
+        return float(self.document.total)
 
     def update_date_time(self) -> None:
         current_time = datetime.now()
@@ -110,9 +106,22 @@ class InvoiceView(Screen, InvoiceActionsMixin):
             self.payment_button.text = 'Не оплачено!'
             self.payment_status_value = 0
 
-        if self.editing_invoice:
+        if self.editing_invoice or self.editing_local_id:
             self.update_invoice_status()
 
+    def _sync_controller(self):
+        """Локальное хранилище с синхронизацией, если пользователь вошел"""
+        return get_sync_controller(self.auth_controller) if self.auth_controller else None
+
+    def _history_view(self):
+        """Экран истории, если он уже создан (непостроенный экран загрузит данные сам)"""
+        return self.sm.get_screen('history') if self.sm.has_screen('history') else None
+
+    def _refresh_history(self):
+        history_view = self._history_view()
+        if hasattr(history_view, 'on_store_changed'):
+            history_view.on_store_changed()
+
     def on_save_error(self, error):
 
         self.show_message(f"Ошибка при сохранении накладной: {error}")
@@ -124,16 +133,7 @@ class InvoiceView(Screen, InvoiceActionsMixin):
             "total": self.calculate_total(),
             "is_paid": self.payment_status_value == 1,
             "created_at": self.date_label.text,
-            "items": [
-                {
-                    "name": row.name_input.text,
-                    "quantity": float(row.quantity_input.text),
-                    "price": float(row.price_input.text),
-                    "sum": float(row.sum_label.text)
-                }
-                for row in self.table_content.children
-                if row.quantity_input.text and row.price_input.text
-            ]
+            "items": self.document.to_items()
         }
 
     def clear_invoice_form(self) -> None:
@@ -142,14 +142,14 @@ class InvoiceView(Screen, InvoiceActionsMixin):
         self.contact_input.text = ''
         self.additional_info_input.text = ''
 
-        for row in self.table_content.children:
-            row.reset_values()
+        self.document.clear(min_lines=MIN_ROWS)
 
         self.payment_status_value = 0
 
         self.payment_button.text = 'Не оплачено!'
 
         self.editing_invoice = None
+        self.editing_local_id = None
         self.update_total()
         self.update_date_time()
 
@@ -159,8 +159,9 @@ class InvoiceView(Screen, InvoiceActionsMixin):
             print(f"Loading invoice data: {invoice_data}")  # Debugging
 
             self.editing_invoice = invoice_data.get('id')
+            self.editing_local_id = invoice_data.get('local_id')
 
-            self.invoice_number_input.text = str(invoice_data.get('id', ''))
+            self.invoice_number_input.text = str(invoice_data.get('id') or '')
             self.contact_input.text = invoice_data.get('contact_info', '')
             self.additional_info_input.text = invoice_data.get('additional_info', '')
             self.date_label.text = invoice_data.get('created_at', '').split('T')[0]
@@ -173,24 +174,9 @@ class InvoiceView(Screen, InvoiceActionsMixin):
 
                 self.payment_button.text = 'Не оплачено!'
 
-            self.table_content.clear_widgets()
-
-            items = invoice_data.get('items', [])
-            for item in items:
-                table_row = InvoiceTable()
-
-                table_row.name_input.text = item.get('name', '')
-                table_row.quantity_input.text = str(item.get('quantity', '0'))
-                table_row.price_input.text = str(item.get('price', '0'))
-
-                table_row.bind_total_update(self.update_total)
-
-                self.table_content.add_widget(table_row)
-
-            for _ in range(10 - len(self.table_content.children)):
-                self.add_row()
-
-            self._renumber_rows()
+            # Строки заменяются одним присваиванием данных: виджеты создаются
+            # только для видимой части таблицы, сколько бы позиций ни было
+            self.document.set_lines(invoice_data.get('items', []), min_lines=MIN_ROWS)
             self.update_total()
 
             print("Invoice data loaded successfully")
@@ -201,6 +187,18 @@ class InvoiceView(Screen, InvoiceActionsMixin):
 
     def update_invoice_status(self):
 
+        sync = self._sync_controller()
+        if sync and self.editing_local_id:
+            # Статус сохраняется локально сразу, на сервер уходит через outbox
+            try:
+                sync.store.save_local(self._collect_invoice_data(), local_id=self.editing_local_id)
+                sync.sync()
+                self._refresh_history()
+            except Exception as e:
+                print(f"Error in update_invoice_status: {e}")  # Debugging
+                self._on_status_update_error(str(e))
+            return
+
         if not self.api_controller:
             self.show_message("Ошибка: API контроллер не инициализирован")
             return
@@ -228,7 +226,7 @@ class InvoiceView(Screen, InvoiceActionsMixin):
 
         print(f"Status update success: {result}")
 
-        history_view = self.sm.get_screen('history')
+        history_view = self._history_view()
         if hasattr(history_view, 'update_invoice_in_list'):
             history_view.update_invoice_in_list(result)
 
@@ -272,6 +270,19 @@ class InvoiceView(Screen, InvoiceActionsMixin):
             self.show_message("Ошибка: добавьте хотя бы одну позицию в накладную")
             return
 
+        sync = self._sync_controller()
+        if sync:
+            try:
+                sync.store.save_local(invoice_data, local_id=self.editing_local_id)
+            except Exception as e:
+                self.on_save_error(str(e))
+                return
+            sync.sync()
+            self.show_message("Накладная сохранена")
+            self.clear_invoice_form()
+            self.sm.current = 'history'
+            return
+
         if self.editing_invoice:
             self.api_controller.update_invoice(
                 self.editing_invoice,
@@ -290,18 +301,9 @@ class InvoiceView(Screen, InvoiceActionsMixin):
 
         self.show_message("Накладная успешно сохранена")
 
-        history_view = self.sm.get_screen('history')
-
-        new_invoice_data = {
-            'number': str(result.get('id', '')),
-            'date': result.get('created_at', '').split('T')[0],
-            'contact': result.get('contact_info', ''),
-            'total': result.get('total_amount', 0.0),
-            'is_paid': result.get('is_paid', False)
-        }
+        history_view = self._history_view()
 
-        if hasattr(history_view, 'ids') and hasattr(history_view.ids, 'invoice_list'):
-            current_data = history_view.ids.invoice_list.data
-            history_view.ids.invoice_list.data = [new_invoice_data] + current_data
+        if hasattr(history_view, 'add_invoice_to_list'):
+            history_view.add_invoice_to_list(result)
         self.clear_invoice_form()
         self.sm.current = 'history'
\ No newline at end of file
@@ -0,0 +1,71 @@
+# views/telemetry_overlay.py
+from kivy.clock import Clock
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.popup import Popup
+from kivy.uix.scrollview import ScrollView
+
+from front.controllers.telemetry import get_telemetry
+
+# Частота обновления таблицы, пока окно открыто, секунды
+REFRESH_INTERVAL = 1.0
+
+
+class TelemetryOverlay(Popup):
+    """Отладочное окно: перцентили времени запросов по эндпоинтам.
+
+    Открывается по F12; сохраняет буфер телеметрии в JSON-файл.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(title='Запросы к серверу', size_hint=(0.95, 0.7), **kwargs)
+        self.telemetry = get_telemetry()
+        self._refresh_event = None
+
+        content = BoxLayout(orientation='vertical', spacing=5, padding=5)
+        self.table = Label(font_name='RobotoMono-Regular', font_size='10dp',
+                           halign='left', valign='top', size_hint=(None, None))
+        self.table.bind(texture_size=self.table.setter('size'))
+        scroll = ScrollView(do_scroll_x=True)
+        scroll.add_widget(self.table)
+        content.add_widget(scroll)
+
+        self.status = Label(text='мс; ttfb - server = сеть, cb - обработка ответа в клиенте',
+                            size_hint_y=None, height=25, font_size='10dp')
+        content.add_widget(self.status)
+
+        buttons = BoxLayout(size_hint_y=None, height=40, spacing=5)
+        for text, action in (('Сохранить в файл', self.dump),
+                             ('Очистить', self.clear),
+                             ('Закрыть', self.dismiss)):
+            button = Button(text=text)
+            button.bind(on_release=lambda instance, action=action: action())
+            buttons.add_widget(button)
+        content.add_widget(buttons)
+        self.content = content
+
+    def on_open(self):
+        self.refresh()
+        self._refresh_event = Clock.schedule_interval(lambda dt: self.refresh(), REFRESH_INTERVAL)
+
+    def on_dismiss(self):
+        if self._refresh_event is not None:
+            self._refresh_event.cancel()
+            self._refresh_event = None
+
+    def refresh(self) -> None:
+        self.table.text = self.telemetry.format_summary()
+        self.title = f"Запросы к серверу ({len(self.telemetry)})"
+
+    def dump(self) -> None:
+        try:
+            path = self.telemetry.dump()
+        except OSError as e:
+            self.status.text = f"Не удалось сохранить: {e}"
+            return
+        self.status.text = f"Сохранено: {path}"
+
+    def clear(self) -> None:
+        self.telemetry.clear()
+        self.refresh()